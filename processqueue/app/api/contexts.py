@@ -1,8 +1,31 @@
 import asyncio
+import os
+from typing import Optional
 
 from aiohttp import web
 
+from app.broker.client import BrokerConnection
+from app.data.events import TaskStatusEventBroadcaster
 from app.domain.listener import ITaskQueueListener
+from app.domain.repository import ITaskRepository
+from app.execution.cache import ResultCache
+from app.execution.lease import TaskLeaseManager
+from app.execution.storage import AsyncExecutorTaskDataStorage
+from app.metrics import Histogram
+from app.metrics import monitor_event_loop_lag
+
+
+async def broker_connection_context(app: web.Application) -> None:
+    broker_connection: Optional[BrokerConnection] = app.get("broker_connection")
+
+    if broker_connection is not None:
+        # the broker is started by gunicorn together with workers, so it may be not ready yet
+        await broker_connection.connect(timeout=float(os.getenv("BROKER_CONNECT_TIMEOUT", "10")))
+
+    yield
+
+    if broker_connection is not None:
+        await broker_connection.close()
 
 
 async def task_queue_context(app: web.Application) -> None:
@@ -15,5 +38,70 @@ async def task_queue_context(app: web.Application) -> None:
 
     yield
 
+    # running tasks are stopped by the listener when it is cancelled
     listen_task.cancel()
+    await asyncio.wait({listen_task})
     task_queue_listener.stop()
+
+
+async def task_repository_context(app: web.Application) -> None:
+    task_repository: ITaskRepository = app.get("task_repository")
+
+    yield
+
+    task_repository.close()
+
+
+async def result_cache_context(app: web.Application) -> None:
+    result_cache: Optional[ResultCache] = app.get("result_cache")
+
+    yield
+
+    if result_cache is not None:
+        result_cache.close()
+
+
+async def task_lease_manager_context(app: web.Application) -> None:
+    task_lease_manager: Optional[TaskLeaseManager] = app.get("task_lease_manager")
+    if task_lease_manager is None:
+        yield
+        return
+
+    loop = asyncio.get_running_loop()
+    expire_task = loop.create_task(
+        task_lease_manager.expire_leases()
+    )
+
+    yield
+
+    expire_task.cancel()
+    await asyncio.wait({expire_task})
+    task_lease_manager.close()
+
+
+async def executor_task_data_storage_context(app: web.Application) -> None:
+    executor_task_data_storage: AsyncExecutorTaskDataStorage = app.get("executor_task_data_storage")
+
+    yield
+
+    executor_task_data_storage.close()
+
+
+async def event_loop_lag_context(app: web.Application) -> None:
+    event_loop_lag: Histogram = app.get("event_loop_lag")
+
+    loop = asyncio.get_running_loop()
+    monitor_task = loop.create_task(
+        monitor_event_loop_lag(event_loop_lag)
+    )
+
+    yield
+
+    monitor_task.cancel()
+    await asyncio.wait({monitor_task})
+
+
+async def close_task_status_events(app: web.Application) -> None:
+    # open event streams would keep the server from shutting down
+    task_status_event_broadcaster: TaskStatusEventBroadcaster = app.get("task_status_event_broadcaster")
+    task_status_event_broadcaster.close()
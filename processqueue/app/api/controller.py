@@ -1,24 +1,192 @@
+import asyncio
+import math
+from pathlib import Path
+from typing import List
+from typing import Optional
+from typing import Set
+
+from app.api.model import Percentiles
+from app.api.model import TaskBatchItemInfo
+from app.api.model import TaskCounts
+from app.api.model import TaskIdBatch
 from app.api.model import TaskInfo
+from app.api.model import TaskInfoBatch
 from app.api.model import TaskInputData
+from app.api.model import TaskInputDataBatch
+from app.api.model import TaskLeaseBatch
+from app.api.model import TaskLeaseCompletion
+from app.api.model import TaskLeaseFailure
+from app.api.model import TaskLeaseHeartbeat
+from app.api.model import TaskLeaseInfo
+from app.api.model import TaskLeaseRequest
+from app.api.model import TaskList
 from app.api.model import TaskOutputData
+from app.api.model import TaskPosition
+from app.api.model import TaskStats
+from app.api.model import TaskStatsSummary
+from app.data.events import TaskStatusSubscription
+from app.data.waiter import TaskStatusWaiter
+from app.domain.listener import ITaskQueueListener
+from app.domain.model import Task
+from app.domain.model import TaskResourceUsage
 from app.domain.model import TaskStatus
 from app.domain.queue import ITaskQueue
+from app.domain.queue import TaskQueueItem
 from app.domain.repository import ITaskRepository
 from app.exceptions import IncorrectTaskOperationException
+from app.exceptions import NoSuchTaskException
+from app.exceptions import NoTaskProfileException
+from app.exceptions import NoTaskResourceUsageException
+from app.execution.cache import ResultCache
+from app.execution.coalescing import TaskCoalescer
+from app.execution.lease import TaskLeaseManager
+from app.execution.profiling import render_profile
+from app.execution.storage import AsyncExecutorTaskDataStorage
+from app.execution.storage import UploadedInput
+from app.metrics import MetricsRegistry
+
+# tasks which have been run by a worker end up in these statuses
+EXECUTED_TASK_STATUSES = (TaskStatus.SUCCESS, TaskStatus.FAILURE)
 
 
 async def create_task(task_repository: ITaskRepository, task_input_data: TaskInputData) -> TaskInfo:
-    task = await task_repository.create_task(task_input_data.input_data)
+    task = await task_repository.create_task(
+        task_input_data.input_data,
+        priority=task_input_data.priority,
+        tenant=task_input_data.tenant
+    )
     return TaskInfo(
         task_id=task.task_id,
         status=task.status.value
     )
 
 
-async def run_task(task_repository: ITaskRepository, task_queue: ITaskQueue, task_id: int) -> TaskInfo:
-    task_status = await task_repository.get_task_status(task_id)
-    if task_status is TaskStatus.CREATED or task_status is TaskStatus.CANCELLED:
-        await task_queue.put(task_id)
+async def create_uploaded_task(
+        task_repository: ITaskRepository,
+        uploaded_input: UploadedInput,
+        priority: int = 0,
+        tenant: Optional[str] = None
+) -> TaskInfo:
+    tasks = await task_repository.create_tasks([
+        Task(
+            input_path=uploaded_input.path,
+            input_size=uploaded_input.size,
+            input_checksum=uploaded_input.checksum,
+            priority=priority,
+            tenant=tenant
+        )
+    ])
+    return TaskInfo(
+        task_id=tasks[0].task_id,
+        status=tasks[0].status.value
+    )
+
+
+async def create_tasks(
+        task_repository: ITaskRepository,
+        task_input_data_batch: TaskInputDataBatch
+) -> TaskInfoBatch:
+    tasks = await task_repository.create_tasks([
+        Task(
+            input_data=task_input_data.input_data,
+            priority=task_input_data.priority,
+            tenant=task_input_data.tenant
+        )
+        for task_input_data in task_input_data_batch.tasks
+    ])
+    return TaskInfoBatch(
+        tasks=[
+            TaskBatchItemInfo(
+                task_id=task.task_id,
+                status=task.status.value
+            )
+            for task in tasks
+        ]
+    )
+
+
+async def hash_task_input(
+        result_cache: Optional[ResultCache],
+        task_coalescer: Optional[TaskCoalescer],
+        task: Task
+) -> bool:
+    """
+    Sets the input hash of the task when outputs are cached or coalesced, returns whether it has to be stored.
+    """
+    if result_cache is not None:
+        if task.input_checksum is not None:
+            input_hash = result_cache.get_checksum_key(task.input_checksum)
+        else:
+            input_hash = await result_cache.get_key(task.input_data)
+    elif task_coalescer is not None:
+        if task.input_checksum is not None:
+            input_hash = task_coalescer.get_checksum_key(task.input_checksum)
+        else:
+            input_hash = await task_coalescer.get_key(task.input_data)
+    else:
+        return False
+    # task which is run again after cancellation keeps the hash of the same input
+    if input_hash == task.input_hash:
+        return False
+    task.input_hash = input_hash
+    return True
+
+
+async def prepare_task_run(
+        task_repository: ITaskRepository,
+        result_cache: Optional[ResultCache],
+        task_coalescer: Optional[TaskCoalescer],
+        task: Task
+) -> Optional[TaskStatus]:
+    """
+    Completes the task with the cached output of the same input or attaches it to the identical task in flight,
+    returns the new status of the task or `None` when the task has to be queued.
+    Input hash of the task is set by `hash_task_input` beforehand.
+    """
+    if result_cache is not None:
+        output_path = await result_cache.restore(task.task_id, task.input_hash)
+        if output_path is not None:
+            await task_repository.add_task_output_path(task.task_id, str(output_path))
+            await task_repository.set_task_status(task.task_id, TaskStatus.SUCCESS)
+            return TaskStatus.SUCCESS
+
+    if task_coalescer is not None:
+        status = task_coalescer.attach(task)
+        if status is not None:
+            await task_repository.set_task_status(task.task_id, status)
+            return status
+
+    return None
+
+
+async def run_task(
+        task_repository: ITaskRepository,
+        task_queue: ITaskQueue,
+        task_id: int,
+        priority: Optional[int] = None,
+        result_cache: Optional[ResultCache] = None,
+        task_coalescer: Optional[TaskCoalescer] = None,
+        profile: bool = False,
+        timeout: Optional[float] = None
+) -> TaskInfo:
+    task = await task_repository.get_task(task_id)
+    if task.status is TaskStatus.CREATED or task.status is TaskStatus.CANCELLED:
+        if await hash_task_input(result_cache, task_coalescer, task):
+            await task_repository.set_task_input_hash(task_id, task.input_hash)
+        status = await prepare_task_run(task_repository, result_cache, task_coalescer, task)
+        if status is not None:
+            return TaskInfo(
+                task_id=task_id,
+                status=status.value
+            )
+
+        if priority is None:
+            priority = task.priority
+        if profile != task.profile:
+            await task_repository.set_task_profile(task_id, profile)
+        if timeout != task.timeout:
+            await task_repository.set_task_timeout(task_id, timeout)
+        await task_queue.put(task_id, priority=priority, tenant=task.tenant)
         await task_repository.set_task_status(task_id, TaskStatus.QUEUED)
         return TaskInfo(
             task_id=task_id,
@@ -28,17 +196,153 @@ async def run_task(task_repository: ITaskRepository, task_queue: ITaskQueue, tas
         raise IncorrectTaskOperationException(task_id)
 
 
-async def cancel_task(task_repository: ITaskRepository, task_queue: ITaskQueue, task_id: int) -> TaskInfo:
+async def run_tasks(
+        task_repository: ITaskRepository,
+        task_queue: ITaskQueue,
+        task_id_batch: TaskIdBatch,
+        result_cache: Optional[ResultCache] = None,
+        task_coalescer: Optional[TaskCoalescer] = None
+) -> TaskInfoBatch:
+    task_ids = task_id_batch.task_ids
+    tasks = await task_repository.get_tasks(task_ids)
+
+    runnable_tasks = {
+        task_id: task
+        for task_id, task in tasks.items()
+        if task.status is TaskStatus.CREATED or task.status is TaskStatus.CANCELLED
+    }
+    are_input_hashes_changed = await asyncio.gather(*(
+        hash_task_input(result_cache, task_coalescer, task)
+        for task in runnable_tasks.values()
+    ))
+    input_hashes = {
+        task_id: task.input_hash
+        for (task_id, task), is_input_hash_changed in zip(runnable_tasks.items(), are_input_hashes_changed)
+        if is_input_hash_changed
+    }
+    if input_hashes:
+        await task_repository.set_tasks_input_hash(input_hashes)
+    statuses = await asyncio.gather(*(
+        prepare_task_run(task_repository, result_cache, task_coalescer, task)
+        for task in runnable_tasks.values()
+    ))
+    prepared_statuses = {
+        task_id: status
+        for task_id, status in zip(runnable_tasks, statuses)
+        if status is not None
+    }
+
+    items: List[TaskBatchItemInfo] = []
+    queue_items: List[TaskQueueItem] = []
+    handled_task_ids: Set[int] = set()
+    for task_id in task_ids:
+        task = tasks.get(task_id)
+        if task is None:
+            error = NoSuchTaskException(task_id).message
+            items.append(TaskBatchItemInfo(task_id=task_id, error=error))
+        elif task_id in handled_task_ids or task_id not in runnable_tasks:
+            error = IncorrectTaskOperationException(task_id).message
+            items.append(TaskBatchItemInfo(task_id=task_id, error=error))
+        elif task_id in prepared_statuses:
+            handled_task_ids.add(task_id)
+            items.append(TaskBatchItemInfo(task_id=task_id, status=prepared_statuses[task_id].value))
+        else:
+            handled_task_ids.add(task_id)
+            queue_items.append(TaskQueueItem(task_id, priority=task.priority, tenant=task.tenant))
+            items.append(TaskBatchItemInfo(task_id=task_id, status=TaskStatus.QUEUED.value))
+
+    await task_queue.put_many(queue_items)
+    await task_repository.set_tasks_status([item.task_id for item in queue_items], TaskStatus.QUEUED)
+    return TaskInfoBatch(tasks=items)
+
+
+async def cancel_task(
+        task_repository: ITaskRepository,
+        task_queue: ITaskQueue,
+        task_queue_listener: ITaskQueueListener,
+        task_id: int,
+        task_coalescer: Optional[TaskCoalescer] = None,
+        task_lease_manager: Optional[TaskLeaseManager] = None
+) -> TaskInfo:
     status = await task_repository.get_task_status(task_id)
-    if status is TaskStatus.QUEUED:
-        await task_queue.cancel(task_id)
-        await task_repository.set_task_status(task_id, TaskStatus.CANCELLED)
-        return TaskInfo(
-            task_id=task_id,
-            status=TaskStatus.CANCELLED.value
-        )
-    else:
-        raise IncorrectTaskOperationException(task_id)
+    # follower is neither queued nor executed by itself, so it is enough to detach it from the leader
+    if task_coalescer is None or not task_coalescer.detach(task_id):
+        if status is TaskStatus.QUEUED:
+            await task_queue.cancel(task_id)
+        elif status is TaskStatus.RUNNING:
+            is_task_cancelled = await task_queue_listener.cancel_task(task_id)
+            # task leased by a remote worker is stopped by the worker when its heartbeat is rejected
+            if not is_task_cancelled and task_lease_manager is not None:
+                is_task_cancelled = task_lease_manager.revoke(task_id)
+            if not is_task_cancelled:
+                raise IncorrectTaskOperationException(task_id)
+        else:
+            raise IncorrectTaskOperationException(task_id)
+
+    await task_repository.set_task_status(task_id, TaskStatus.CANCELLED)
+    return TaskInfo(
+        task_id=task_id,
+        status=TaskStatus.CANCELLED.value
+    )
+
+
+async def lease_tasks(task_lease_manager: TaskLeaseManager, task_lease_request: TaskLeaseRequest) -> TaskLeaseBatch:
+    leases = await task_lease_manager.lease(
+        task_lease_request.worker_id,
+        task_lease_request.count,
+        task_lease_request.visibility_timeout,
+        task_lease_request.wait
+    )
+    return TaskLeaseBatch(
+        leases=[
+            TaskLeaseInfo(
+                lease_id=lease.lease_id,
+                task_id=lease.task.task_id,
+                visibility_timeout=lease.visibility_timeout,
+                input_data=lease.task.input_data
+            )
+            for lease in leases
+        ]
+    )
+
+
+async def heartbeat_task_lease(
+        task_lease_manager: TaskLeaseManager,
+        task_lease_heartbeat: TaskLeaseHeartbeat
+) -> TaskLeaseInfo:
+    lease = task_lease_manager.heartbeat(task_lease_heartbeat.lease_id, task_lease_heartbeat.visibility_timeout)
+    return TaskLeaseInfo(
+        lease_id=lease.lease_id,
+        task_id=lease.task.task_id,
+        visibility_timeout=lease.visibility_timeout
+    )
+
+
+async def complete_task_lease(
+        task_lease_manager: TaskLeaseManager,
+        task_lease_completion: TaskLeaseCompletion
+) -> TaskInfo:
+    task = await task_lease_manager.complete(
+        task_lease_completion.lease_id,
+        task_lease_completion.output_data,
+        task_lease_completion.resource_usage
+    )
+    return TaskInfo(
+        task_id=task.task_id,
+        status=TaskStatus.SUCCESS.value
+    )
+
+
+async def fail_task_lease(task_lease_manager: TaskLeaseManager, task_lease_failure: TaskLeaseFailure) -> TaskInfo:
+    task = await task_lease_manager.fail(
+        task_lease_failure.lease_id,
+        task_lease_failure.error,
+        task_lease_failure.resource_usage
+    )
+    return TaskInfo(
+        task_id=task.task_id,
+        status=TaskStatus.FAILURE.value
+    )
 
 
 async def get_task_status(task_repository: ITaskRepository, task_id: int) -> TaskInfo:
@@ -49,6 +353,182 @@ async def get_task_status(task_repository: ITaskRepository, task_id: int) -> Tas
     )
 
 
+async def wait_for_task_status(task_status_waiter: TaskStatusWaiter, task_id: int, timeout: float) -> TaskInfo:
+    status = await task_status_waiter.wait_for_terminal_status(task_id, timeout)
+    return TaskInfo(
+        task_id=task_id,
+        status=status.value
+    )
+
+
+async def get_task_status_events(subscription: TaskStatusSubscription) -> List[TaskInfo]:
+    events = await subscription.get()
+    return [
+        TaskInfo(
+            task_id=task_id,
+            status=status.value
+        )
+        for task_id, status in events
+    ]
+
+
+async def get_task_position(
+        task_repository: ITaskRepository,
+        task_queue: ITaskQueue,
+        task_id: int
+) -> TaskPosition:
+    status = await task_repository.get_task_status(task_id)
+    position = await task_queue.get_position(task_id)
+    if status is not TaskStatus.QUEUED or position is None:
+        raise IncorrectTaskOperationException(task_id)
+
+    return TaskPosition(
+        task_id=task_id,
+        position=position
+    )
+
+
+async def get_tasks_statuses(
+        task_repository: ITaskRepository,
+        task_id_batch: TaskIdBatch
+) -> TaskInfoBatch:
+    statuses = await task_repository.get_tasks_statuses(task_id_batch.task_ids)
+
+    items: List[TaskBatchItemInfo] = []
+    for task_id in task_id_batch.task_ids:
+        status = statuses.get(task_id)
+        if status is None:
+            error = NoSuchTaskException(task_id).message
+            items.append(TaskBatchItemInfo(task_id=task_id, error=error))
+        else:
+            items.append(TaskBatchItemInfo(task_id=task_id, status=status.value))
+    return TaskInfoBatch(tasks=items)
+
+
+async def list_tasks(
+        task_repository: ITaskRepository,
+        status: TaskStatus,
+        limit: int,
+        since: Optional[float] = None,
+        cursor: Optional[int] = None
+) -> TaskList:
+    task_page = await task_repository.query_tasks(status, limit, since, cursor)
+    return TaskList(
+        tasks=[
+            TaskInfo(
+                task_id=task_id,
+                status=status.value
+            )
+            for task_id in task_page.task_ids
+        ],
+        next_cursor=str(task_page.next_cursor) if task_page.next_cursor is not None else None
+    )
+
+
+async def count_tasks(task_repository: ITaskRepository) -> TaskCounts:
+    counts = await task_repository.count_tasks()
+    return TaskCounts(
+        counts={
+            status.value: count
+            for status, count in counts.items()
+        }
+    )
+
+
+async def get_task_stats(task_repository: ITaskRepository, task_id: int) -> TaskStats:
+    task = await task_repository.get_task(task_id)
+    resource_usage = task.resource_usage
+    if resource_usage is None:
+        raise NoTaskResourceUsageException(task_id)
+
+    return TaskStats(
+        task_id=task_id,
+        status=task.status.value,
+        wall_time=resource_usage.wall_time,
+        cpu_user_time=resource_usage.cpu_user_time,
+        cpu_system_time=resource_usage.cpu_system_time,
+        max_rss=resource_usage.max_rss,
+        read_bytes=resource_usage.read_bytes,
+        write_bytes=resource_usage.write_bytes
+    )
+
+
+def compute_percentiles(values: List[float]) -> Percentiles:
+    if not values:
+        return Percentiles(p50=0., p90=0., p95=0., p99=0., max=0.)
+
+    values = sorted(values)
+
+    def nearest_rank(quantile: float) -> float:
+        return float(values[max(0, math.ceil(quantile * len(values)) - 1)])
+
+    return Percentiles(
+        p50=nearest_rank(0.5),
+        p90=nearest_rank(0.9),
+        p95=nearest_rank(0.95),
+        p99=nearest_rank(0.99),
+        max=float(values[-1])
+    )
+
+
+def get_cpu_utilization(resource_usage: TaskResourceUsage) -> float:
+    if resource_usage.wall_time <= 0:
+        return 0.
+    return (resource_usage.cpu_user_time + resource_usage.cpu_system_time) / resource_usage.wall_time
+
+
+async def get_task_stats_summary(task_repository: ITaskRepository, limit: int) -> TaskStatsSummary:
+    task_ids: List[int] = []
+    for status in EXECUTED_TASK_STATUSES:
+        task_page = await task_repository.query_tasks(status, limit)
+        task_ids.extend(task_page.task_ids)
+    tasks = await task_repository.get_tasks(task_ids)
+
+    executed_tasks = sorted(
+        (task for task in tasks.values() if task.resource_usage is not None),
+        key=lambda task: task.status_changed_at or 0.,
+        reverse=True
+    )[:limit]
+    resource_usages = [task.resource_usage for task in executed_tasks]
+    return TaskStatsSummary(
+        task_count=len(resource_usages),
+        wall_time=compute_percentiles([usage.wall_time for usage in resource_usages]),
+        cpu_time=compute_percentiles([usage.cpu_user_time + usage.cpu_system_time for usage in resource_usages]),
+        cpu_utilization=compute_percentiles([get_cpu_utilization(usage) for usage in resource_usages]),
+        max_rss=compute_percentiles([usage.max_rss for usage in resource_usages]),
+        read_bytes=compute_percentiles([usage.read_bytes for usage in resource_usages]),
+        write_bytes=compute_percentiles([usage.write_bytes for usage in resource_usages])
+    )
+
+
+async def get_task_profile_path(
+        task_repository: ITaskRepository,
+        executor_task_data_storage: AsyncExecutorTaskDataStorage,
+        task_id: int
+) -> Path:
+    task = await task_repository.get_task(task_id)
+    # a file of a task which had the same id before a restart mustn't be served
+    if not task.profile:
+        raise NoTaskProfileException(task_id)
+    return await executor_task_data_storage.get_profile_path(task_id)
+
+
+async def render_task_profile(profile_path: Path, limit: int) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(None, render_profile, profile_path, limit)
+
+
+async def render_metrics(metrics_registry: MetricsRegistry) -> str:
+    return await metrics_registry.render()
+
+
+async def get_task_output_path(task_repository: ITaskRepository, task_id: int) -> Optional[Path]:
+    output_path = await task_repository.get_task_output_path(task_id)
+    if output_path is None:
+        return None
+    return Path(output_path)
+
+
 async def get_task_output_data(task_repository: ITaskRepository, task_id: int) -> TaskOutputData:
     output_data = await task_repository.get_task_output_data(task_id)
     return TaskOutputData(
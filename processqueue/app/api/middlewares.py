@@ -0,0 +1,26 @@
+import time
+
+from aiohttp import web
+
+from app.metrics import HistogramFamily
+
+__all__ = [
+    "build_request_latency_middleware",
+]
+
+UNMATCHED_ROUTE = "unmatched"
+
+
+def build_request_latency_middleware(request_latency: HistogramFamily):
+    @web.middleware
+    async def request_latency_middleware(request: web.Request, handler):
+        started_at = time.perf_counter()
+        try:
+            return await handler(request)
+        finally:
+            # route pattern, not the path, so ids don't produce a histogram per task
+            resource = request.match_info.route.resource
+            route = resource.canonical if resource is not None else UNMATCHED_ROUTE
+            request_latency.labels(request.method, route).observe(time.perf_counter() - started_at)
+
+    return request_latency_middleware
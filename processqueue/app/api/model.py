@@ -1,8 +1,12 @@
 from dataclasses import dataclass
+from typing import Dict
+from typing import List
 from typing import Optional
 
 from dataclasses_json import dataclass_json
 
+from app.domain.model import TaskResourceUsage
+
 
 @dataclass_json
 @dataclass
@@ -15,6 +19,112 @@ class TaskInfo:
 @dataclass
 class TaskInputData:
     input_data: str
+    priority: int = 0
+    tenant: Optional[str] = None
+
+
+@dataclass_json
+@dataclass
+class TaskInputDataBatch:
+    tasks: List[TaskInputData]
+
+
+@dataclass_json
+@dataclass
+class TaskRunData:
+    task_id: int
+    # priority given on creation is used when it is not set
+    priority: Optional[int] = None
+    # the run is executed under the profiler, the profile is served by `/tasks/{task_id}/profile`
+    profile: bool = False
+    # seconds the run may take before it is killed with `TIMEOUT` status, the server default is used when it is not set
+    timeout: Optional[float] = None
+
+
+@dataclass_json
+@dataclass
+class TaskId:
+    task_id: int
+
+
+@dataclass_json
+@dataclass
+class TaskIdBatch:
+    task_ids: List[int]
+
+
+@dataclass_json
+@dataclass
+class TaskBatchItemInfo:
+    task_id: int
+    status: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass_json
+@dataclass
+class TaskInfoBatch:
+    tasks: List[TaskBatchItemInfo]
+
+
+@dataclass_json
+@dataclass
+class TaskList:
+    tasks: List[TaskInfo]
+    # it is passed as `cursor` to get the next page, `None` on the last page
+    next_cursor: Optional[str] = None
+
+
+@dataclass_json
+@dataclass
+class TaskCounts:
+    counts: Dict[str, int]
+
+
+@dataclass_json
+@dataclass
+class TaskStats:
+    task_id: int
+    status: str
+    # seconds
+    wall_time: float
+    cpu_user_time: float
+    cpu_system_time: float
+    # bytes
+    max_rss: int
+    read_bytes: int
+    write_bytes: int
+
+
+@dataclass_json
+@dataclass
+class Percentiles:
+    p50: float
+    p90: float
+    p95: float
+    p99: float
+    max: float
+
+
+@dataclass_json
+@dataclass
+class TaskStatsSummary:
+    # amount of the most recently finished tasks the percentiles are computed over
+    task_count: int
+    wall_time: Percentiles
+    cpu_time: Percentiles
+    # cpu time divided by wall time, a value close to 1 means the task keeps a core busy
+    cpu_utilization: Percentiles
+    max_rss: Percentiles
+    read_bytes: Percentiles
+    write_bytes: Percentiles
+
+
+@dataclass_json
+@dataclass
+class TaskPosition:
+    task_id: int
+    position: int
 
 
 @dataclass_json
@@ -24,6 +134,57 @@ class TaskOutputData:
     output_data: str
 
 
+@dataclass_json
+@dataclass
+class TaskLeaseRequest:
+    # it is only logged, so operators can tell which worker holds a task
+    worker_id: str
+    count: int = 1
+    # seconds the tasks stay leased without a heartbeat, the server default is used when it is not set
+    visibility_timeout: Optional[float] = None
+    # seconds to wait for a queued task when there are none
+    wait: float = 0.
+
+
+@dataclass_json
+@dataclass
+class TaskLeaseInfo:
+    lease_id: str
+    task_id: int
+    visibility_timeout: float
+    # it is sent only on leasing
+    input_data: Optional[str] = None
+
+
+@dataclass_json
+@dataclass
+class TaskLeaseBatch:
+    leases: List[TaskLeaseInfo]
+
+
+@dataclass_json
+@dataclass
+class TaskLeaseHeartbeat:
+    lease_id: str
+    visibility_timeout: Optional[float] = None
+
+
+@dataclass_json
+@dataclass
+class TaskLeaseCompletion:
+    lease_id: str
+    output_data: str
+    resource_usage: Optional[TaskResourceUsage] = None
+
+
+@dataclass_json
+@dataclass
+class TaskLeaseFailure:
+    lease_id: str
+    error: Optional[str] = None
+    resource_usage: Optional[TaskResourceUsage] = None
+
+
 @dataclass_json
 @dataclass
 class Error:
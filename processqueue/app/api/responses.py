@@ -1,17 +1,38 @@
+from pathlib import Path
+from typing import Any
+from typing import List
+
 from aiohttp import web
 
 from app.api.model import Error
+from app.api.model import TaskCounts
 from app.api.model import TaskInfo
+from app.api.model import TaskInfoBatch
+from app.api.model import TaskLeaseBatch
+from app.api.model import TaskLeaseInfo
+from app.api.model import TaskList
 from app.api.model import TaskOutputData
+from app.api.model import TaskPosition
+from app.api.model import TaskStats
+from app.api.model import TaskStatsSummary
+from app.api.serialization import Codec
+from app.api.serialization import JSON_CODEC
+from app.api.serialization import encode_body
 from app.api.serialization import serialize
+from app.metrics import CONTENT_TYPE_METRICS
 
 HTTP_STATUS_OK = 200
 HTTP_STATUS_CREATED = 201
 HTTP_STATUS_BAD_REQUEST = 400
 HTTP_STATUS_NOT_FOUND = 404
+HTTP_STATUS_CONFLICT = 409
+HTTP_STATUS_REQUEST_ENTITY_TOO_LARGE = 413
+HTTP_STATUS_SERVICE_UNAVAILABLE = 503
 
 CONTENT_TYPE_PLAIN_TEXT = "plain/text"
-CONTENT_TYPE_APPLICATION_JSON = "application/json"
+CONTENT_TYPE_EVENT_STREAM = "text/event-stream"
+CONTENT_TYPE_TEXT = "text/plain; charset=utf-8"
+CONTENT_TYPE_OCTET_STREAM = "application/octet-stream"
 
 
 class HealthCheckResponse(web.Response):
@@ -25,48 +46,174 @@ class HealthCheckResponse(web.Response):
         )
 
 
-class CreateTaskResponse(web.Response):
-    def __init__(self, task_info: TaskInfo):
+class EncodedResponse(web.Response):
+    def __init__(self, status: int, data: Any, codec: Codec):
         super().__init__(
-            status=HTTP_STATUS_CREATED,
+            status=status,
             headers={
-                "content-type": CONTENT_TYPE_APPLICATION_JSON
+                "content-type": codec.content_type
             },
-            body=serialize(task_info)
+            body=encode_body(data, codec)
         )
 
 
-class TaskInfoResponse(web.Response):
-    def __init__(self, task_info: TaskInfo):
+class CreateTaskResponse(EncodedResponse):
+    def __init__(self, task_info: TaskInfo, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_CREATED, task_info, codec)
+
+
+class TaskInfoResponse(EncodedResponse):
+    def __init__(self, task_info: TaskInfo, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_OK, task_info, codec)
+
+
+class CreateTasksBatchResponse(EncodedResponse):
+    def __init__(self, task_info_batch: TaskInfoBatch, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_CREATED, task_info_batch, codec)
+
+
+class TaskInfoBatchResponse(EncodedResponse):
+    def __init__(self, task_info_batch: TaskInfoBatch, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_OK, task_info_batch, codec)
+
+
+class TaskListResponse(EncodedResponse):
+    def __init__(self, task_list: TaskList, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_OK, task_list, codec)
+
+
+class TaskCountsResponse(EncodedResponse):
+    def __init__(self, task_counts: TaskCounts, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_OK, task_counts, codec)
+
+
+class TaskStatsResponse(EncodedResponse):
+    def __init__(self, task_stats: TaskStats, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_OK, task_stats, codec)
+
+
+class TaskStatsSummaryResponse(EncodedResponse):
+    def __init__(self, task_stats_summary: TaskStatsSummary, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_OK, task_stats_summary, codec)
+
+
+class TaskPositionResponse(EncodedResponse):
+    def __init__(self, task_position: TaskPosition, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_OK, task_position, codec)
+
+
+class TaskLeaseBatchResponse(EncodedResponse):
+    def __init__(self, task_lease_batch: TaskLeaseBatch, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_OK, task_lease_batch, codec)
+
+
+class TaskLeaseResponse(EncodedResponse):
+    def __init__(self, task_lease_info: TaskLeaseInfo, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_OK, task_lease_info, codec)
+
+
+class TaskOutputDataResponse(EncodedResponse):
+    def __init__(self, task_output_data: TaskOutputData, codec: Codec = JSON_CODEC):
+        super().__init__(HTTP_STATUS_OK, task_output_data, codec)
+
+
+class TaskOutputTextResponse(web.Response):
+    def __init__(self, output_data: str):
         super().__init__(
             status=HTTP_STATUS_OK,
             headers={
-                "content-type": CONTENT_TYPE_APPLICATION_JSON
+                "content-type": CONTENT_TYPE_TEXT
             },
-            body=serialize(task_info)
+            body=output_data
         )
 
 
-class TaskOutputDataResponse(web.Response):
-    def __init__(self, task_output_data: TaskOutputData):
+class MetricsResponse(web.Response):
+    def __init__(self, metrics: str):
         super().__init__(
             status=HTTP_STATUS_OK,
             headers={
-                "content-type": CONTENT_TYPE_APPLICATION_JSON
+                "content-type": CONTENT_TYPE_METRICS
             },
-            body=serialize(task_output_data)
+            body=metrics.encode()
         )
 
 
-class BaseErrorResponse(web.Response):
-    def __init__(self, error: Error):
+class TaskOutputFileResponse(web.FileResponse):
+    """
+    Sends the output file with `sendfile` and supports `Range` requests.
+    """
+
+    def __init__(self, output_path: Path):
+        super().__init__(
+            output_path,
+            headers={
+                "content-type": CONTENT_TYPE_TEXT
+            }
+        )
+
+
+class TaskProfileTextResponse(web.Response):
+    def __init__(self, profile: str):
         super().__init__(
-            status=error.code,
+            status=HTTP_STATUS_OK,
             headers={
-                "content-type": CONTENT_TYPE_APPLICATION_JSON
+                "content-type": CONTENT_TYPE_TEXT
             },
-            body=serialize(error)
+            body=profile
+        )
+
+
+class TaskProfileFileResponse(web.FileResponse):
+    """
+    Sends the profile in `pstats` format, it is loaded by `pstats.Stats` or viewers like `snakeviz`.
+    """
+
+    def __init__(self, profile_path: Path):
+        super().__init__(
+            profile_path,
+            headers={
+                "content-type": CONTENT_TYPE_OCTET_STREAM,
+                "content-disposition": f'attachment; filename="{profile_path.name}"'
+            }
+        )
+
+
+class TaskStatusEventStreamResponse(web.StreamResponse):
+    """
+    Server-Sent Events stream of task status transitions.
+    """
+
+    def __init__(self):
+        super().__init__(
+            status=HTTP_STATUS_OK,
+            headers={
+                "content-type": CONTENT_TYPE_EVENT_STREAM,
+                "cache-control": "no-cache",
+            }
+        )
+
+    async def write_task_infos(self, task_infos: List[TaskInfo]):
+        await self.write("".join(
+            f"event: status\ndata: {serialize(task_info)}\n\n"
+            for task_info in task_infos
+        ).encode())
+
+    async def write_keep_alive(self):
+        await self.write(b": keep-alive\n\n")
+
+    async def write_error(self, message: str):
+        error = Error(
+            code=HTTP_STATUS_SERVICE_UNAVAILABLE,
+            message=message,
+            description=None
         )
+        await self.write(f"event: error\ndata: {serialize(error)}\n\n".encode())
+
+
+class BaseErrorResponse(EncodedResponse):
+    def __init__(self, error: Error):
+        super().__init__(error.code, error, JSON_CODEC)
 
 
 class NoSuchTaskResponse(BaseErrorResponse):
@@ -89,6 +236,86 @@ class IncorrectTaskOperationResponse(BaseErrorResponse):
         super().__init__(error)
 
 
+class IncorrectParameterResponse(BaseErrorResponse):
+    def __init__(self, name: str, value: str):
+        error = Error(
+            code=HTTP_STATUS_BAD_REQUEST,
+            message=f"Parameter `{name}` has incorrect value `{value}`.",
+            description=None
+        )
+        super().__init__(error)
+
+
+class IncorrectRequestBodyResponse(BaseErrorResponse):
+    def __init__(self, reason: str):
+        error = Error(
+            code=HTTP_STATUS_BAD_REQUEST,
+            message="Request body is incorrect.",
+            description=reason
+        )
+        super().__init__(error)
+
+
+class InputDataTooLargeResponse(BaseErrorResponse):
+    def __init__(self, max_size: int):
+        error = Error(
+            code=HTTP_STATUS_REQUEST_ENTITY_TOO_LARGE,
+            message=f"Input data is larger than `{max_size}` bytes.",
+            description=None
+        )
+        super().__init__(error)
+
+
+class BatchTooLargeResponse(BaseErrorResponse):
+    def __init__(self, max_batch_size: int):
+        error = Error(
+            code=HTTP_STATUS_BAD_REQUEST,
+            message=f"Batch has more than `{max_batch_size}` tasks.",
+            description=None
+        )
+        super().__init__(error)
+
+
+class NoTaskProfileResponse(BaseErrorResponse):
+    def __init__(self, task_id: int):
+        error = Error(
+            code=HTTP_STATUS_NOT_FOUND,
+            message=f"There is no profile for task id=`{task_id}`, it hasn't been run with profiling.",
+            description=None
+        )
+        super().__init__(error)
+
+
+class NoTaskResourceUsageResponse(BaseErrorResponse):
+    def __init__(self, task_id: int):
+        error = Error(
+            code=HTTP_STATUS_NOT_FOUND,
+            message=f"There is no resource usage for task id=`{task_id}`, it hasn't been executed yet.",
+            description=None
+        )
+        super().__init__(error)
+
+
+class TaskLeaseExpiredResponse(BaseErrorResponse):
+    def __init__(self, lease_id: str):
+        error = Error(
+            code=HTTP_STATUS_CONFLICT,
+            message=f"Lease `{lease_id}` has expired or has been revoked, the task mustn't be continued.",
+            description=None
+        )
+        super().__init__(error)
+
+
+class RemoteWorkersDisabledResponse(BaseErrorResponse):
+    def __init__(self):
+        error = Error(
+            code=HTTP_STATUS_SERVICE_UNAVAILABLE,
+            message="Remote workers are disabled, they are enabled by `REMOTE_WORKERS=enabled`.",
+            description=None
+        )
+        super().__init__(error)
+
+
 class NoTaskOutputDataResponse(BaseErrorResponse):
     def __init__(self, task_id: int):
         error = Error(
@@ -1,12 +1,210 @@
+import dataclasses
+import json
+import typing
+from functools import lru_cache
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Optional
 from typing import Type
 from typing import TypeVar
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
 T = TypeVar('T')
 
+__all__ = [
+    "Codec",
+    "DecodingError",
+    "JSON_CODEC",
+    "MSGPACK_CODEC",
+    "decode_body",
+    "deserialize",
+    "encode_body",
+    "get_request_codec",
+    "get_response_codec",
+    "serialize",
+]
+
+CONTENT_TYPE_APPLICATION_JSON = "application/json"
+CONTENT_TYPE_APPLICATION_MSGPACK = "application/msgpack"
+
+Converter = Callable[[Any], Any]
+
+
+class DecodingError(ValueError):
+    pass
+
+
+@dataclasses.dataclass(frozen=True)
+class Codec:
+    content_type: str
+    dumps: Callable[[Any], bytes]
+    loads: Callable[[bytes], Any]
+
+
+def _json_dumps(data: Any) -> bytes:
+    return json.dumps(data, separators=(",", ":"), ensure_ascii=False).encode()
+
+
+# orjson is used when it is installed, the standard library is the fallback
+JSON_CODEC = Codec(
+    content_type=CONTENT_TYPE_APPLICATION_JSON,
+    dumps=orjson.dumps if orjson is not None else _json_dumps,
+    loads=orjson.loads if orjson is not None else json.loads,
+)
+
+MSGPACK_CODEC: Optional[Codec] = Codec(
+    content_type=CONTENT_TYPE_APPLICATION_MSGPACK,
+    dumps=lambda data: msgpack.packb(data, use_bin_type=True),
+    loads=lambda data: msgpack.unpackb(data, raw=False),
+) if msgpack is not None else None
+
+
+def get_request_codec(content_type: str) -> Codec:
+    if MSGPACK_CODEC is not None and content_type == CONTENT_TYPE_APPLICATION_MSGPACK:
+        return MSGPACK_CODEC
+    return JSON_CODEC
+
+
+def get_response_codec(accept: str) -> Codec:
+    if MSGPACK_CODEC is not None and CONTENT_TYPE_APPLICATION_MSGPACK in accept:
+        return MSGPACK_CODEC
+    return JSON_CODEC
+
+
+def _build_encoder(field_type: Any) -> Optional[Converter]:
+    """
+    Returns `None` for values which are encoded as is.
+    """
+    if dataclasses.is_dataclass(field_type):
+        return get_encoder(field_type)
+
+    origin = getattr(field_type, "__origin__", None)
+    arguments = getattr(field_type, "__args__", ())
+    if origin is typing.Union:
+        encoders = [_build_encoder(argument) for argument in arguments if argument is not type(None)]
+        encoder = encoders[0] if len(encoders) == 1 else None
+        return (lambda value: None if value is None else encoder(value)) if encoder is not None else None
+    if origin is list:
+        encoder = _build_encoder(arguments[0])
+        return (lambda values: [encoder(value) for value in values]) if encoder is not None else None
+    return None
+
+
+def _build_decoder(field_type: Any) -> Converter:
+    if dataclasses.is_dataclass(field_type):
+        return get_decoder(field_type)
+
+    origin = getattr(field_type, "__origin__", None)
+    arguments = getattr(field_type, "__args__", ())
+    if origin is typing.Union:
+        decoders = [_build_decoder(argument) for argument in arguments if argument is not type(None)]
+        decoder = decoders[0] if len(decoders) == 1 else lambda value: value
+        return lambda value: None if value is None else decoder(value)
+    if origin is list:
+        decoder = _build_decoder(arguments[0])
+
+        def decode_list(values):
+            if not isinstance(values, list):
+                raise DecodingError(f"Expected list, got `{values!r}`.")
+            return [decoder(value) for value in values]
+
+        return decode_list
+    if field_type is float:
+        def decode_float(value):
+            # json has no separate integer type, `5` is a valid float
+            if not isinstance(value, (int, float)) or isinstance(value, bool):
+                raise DecodingError(f"Expected float, got `{value!r}`.")
+            return float(value)
+
+        return decode_float
+    if field_type in (int, str, bool):
+        def decode_primitive(value):
+            # bool is a subclass of int, but it isn't a valid int here
+            if not isinstance(value, field_type) or isinstance(value, bool) and field_type is not bool:
+                raise DecodingError(f"Expected {field_type.__name__}, got `{value!r}`.")
+            return value
+
+        return decode_primitive
+    return lambda value: value
+
+
+@lru_cache(maxsize=None)
+def get_encoder(data_type: type) -> Converter:
+    """
+    Builds the function converting the dataclass to builtin types once per dataclass.
+    """
+    type_hints = typing.get_type_hints(data_type)
+    fields = [
+        (field.name, _build_encoder(type_hints[field.name]))
+        for field in dataclasses.fields(data_type)
+    ]
+
+    def encode(data) -> Dict[str, Any]:
+        return {
+            name: getattr(data, name) if encoder is None else encoder(getattr(data, name))
+            for name, encoder in fields
+        }
+
+    return encode
+
+
+@lru_cache(maxsize=None)
+def get_decoder(data_type: type) -> Converter:
+    """
+    Builds the function converting builtin types to the dataclass once per dataclass.
+    """
+    type_hints = typing.get_type_hints(data_type)
+    fields = [
+        (
+            field.name,
+            _build_decoder(type_hints[field.name]),
+            field.default is dataclasses.MISSING and field.default_factory is dataclasses.MISSING
+        )
+        for field in dataclasses.fields(data_type)
+    ]
+
+    def decode(data):
+        if not isinstance(data, dict):
+            raise DecodingError(f"Expected object, got `{data!r}`.")
+        arguments = {}
+        for name, decoder, is_required in fields:
+            if name in data:
+                arguments[name] = decoder(data[name])
+            elif is_required:
+                raise DecodingError(f"Field `{name}` is required.")
+        return data_type(**arguments)
+
+    return decode
+
+
+def encode_body(data: Any, codec: Codec = JSON_CODEC) -> bytes:
+    return codec.dumps(get_encoder(type(data))(data))
+
+
+def decode_body(data_type: Type[T], body: bytes, codec: Codec = JSON_CODEC) -> T:
+    try:
+        data = codec.loads(body)
+        if isinstance(data, str) and codec is JSON_CODEC:
+            # clients used to send json documents encoded as json strings
+            data = codec.loads(data)
+    except ValueError as exception:
+        raise DecodingError(str(exception))
+    return get_decoder(data_type)(data)
+
 
 def serialize(data: T) -> str:
-    return type(data).schema().dumps(data)
+    return encode_body(data).decode()
 
 
 def deserialize(data_type: Type[T], json_data: str) -> T:
-    return data_type.schema().loads(json_data)
+    return decode_body(data_type, json_data.encode())
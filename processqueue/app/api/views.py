@@ -1,77 +1,533 @@
+import asyncio
+from typing import AsyncIterator
+from typing import Optional
+from typing import Set
+from typing import Type
+from typing import TypeVar
+
+from aiohttp import hdrs
 from aiohttp import web
 
 from app.api import controller
+from app.api.model import TaskId
+from app.api.model import TaskIdBatch
 from app.api.model import TaskInputData
+from app.api.model import TaskInputDataBatch
+from app.api.model import TaskLeaseCompletion
+from app.api.model import TaskLeaseFailure
+from app.api.model import TaskLeaseHeartbeat
+from app.api.model import TaskLeaseRequest
+from app.api.model import TaskRunData
+from app.api.responses import BatchTooLargeResponse
 from app.api.responses import CreateTaskResponse
+from app.api.responses import CreateTasksBatchResponse
 from app.api.responses import HealthCheckResponse
+from app.api.responses import IncorrectParameterResponse
+from app.api.responses import IncorrectRequestBodyResponse
 from app.api.responses import IncorrectTaskOperationResponse
+from app.api.responses import InputDataTooLargeResponse
+from app.api.responses import MetricsResponse
 from app.api.responses import NoSuchTaskResponse
+from app.api.responses import NoTaskOutputDataResponse
+from app.api.responses import NoTaskProfileResponse
+from app.api.responses import NoTaskResourceUsageResponse
+from app.api.responses import RemoteWorkersDisabledResponse
+from app.api.responses import TaskCountsResponse
+from app.api.responses import TaskInfoBatchResponse
 from app.api.responses import TaskInfoResponse
+from app.api.responses import TaskLeaseBatchResponse
+from app.api.responses import TaskLeaseExpiredResponse
+from app.api.responses import TaskLeaseResponse
+from app.api.responses import TaskListResponse
 from app.api.responses import TaskOutputDataResponse
-from app.api.serialization import deserialize
+from app.api.responses import TaskOutputFileResponse
+from app.api.responses import TaskOutputTextResponse
+from app.api.responses import TaskPositionResponse
+from app.api.responses import TaskProfileFileResponse
+from app.api.responses import TaskProfileTextResponse
+from app.api.responses import TaskStatsResponse
+from app.api.responses import TaskStatsSummaryResponse
+from app.api.responses import TaskStatusEventStreamResponse
+from app.api.serialization import Codec
+from app.api.serialization import DecodingError
+from app.api.serialization import decode_body
+from app.api.serialization import get_request_codec
+from app.api.serialization import get_response_codec
+from app.data.events import TaskStatusEventBroadcaster
+from app.data.waiter import TaskStatusWaiter
+from app.domain.listener import ITaskQueueListener
+from app.domain.model import TaskStatus
 from app.domain.queue import ITaskQueue
 from app.domain.repository import ITaskRepository
 from app.exceptions import IncorrectTaskOperationException
+from app.exceptions import InputDataTooLargeException
 from app.exceptions import NoSuchTaskException
+from app.exceptions import NoTaskOutputDataException
+from app.exceptions import NoTaskProfileException
+from app.exceptions import NoTaskResourceUsageException
+from app.exceptions import TaskEventsOverflowException
+from app.exceptions import TaskLeaseExpiredException
+from app.execution.cache import ResultCache
+from app.execution.coalescing import TaskCoalescer
+from app.execution.lease import TaskLeaseManager
+from app.execution.storage import AsyncExecutorTaskDataStorage
+from app.execution.storage import UploadedInput
+from app.metrics import MetricsRegistry
+
+T = TypeVar('T')
+
+DEFAULT_WAIT_TIMEOUT = 30.
+MAX_WAIT_TIMEOUT = 300.
+# comment line is sent when there are no events, so proxies don't close the idle stream
+EVENT_STREAM_KEEP_ALIVE_INTERVAL = 15.
+OUTPUT_FORMAT_JSON = "json"
+OUTPUT_FORMAT_RAW = "raw"
+DEFAULT_TASK_LIST_LIMIT = 100
+MAX_TASK_LIST_LIMIT = 1000
+DEFAULT_TASK_STATS_LIMIT = 1000
+MAX_TASK_STATS_LIMIT = 10000
+PROFILE_FORMAT_TEXT = "text"
+PROFILE_FORMAT_PSTATS = "pstats"
+# amount of the most expensive functions in the text profile
+DEFAULT_PROFILE_LIMIT = 50
+CONTENT_TYPE_OCTET_STREAM = "application/octet-stream"
+CONTENT_TYPE_MULTIPART_FORM_DATA = "multipart/form-data"
+UPLOAD_CHUNK_SIZE = 256 * 1024
+UPLOAD_PART_NAME = "input_data"
 
 
 async def healthcheck(_: web.Request) -> HealthCheckResponse:
     return HealthCheckResponse()
 
 
+async def read_body(request: web.Request, data_type: Type[T]) -> T:
+    # body is decoded by the codec of its content type right into the dataclass
+    codec = get_request_codec(request.content_type)
+    return decode_body(data_type, await request.read(), codec)
+
+
+def get_codec(request: web.Request) -> Codec:
+    return get_response_codec(request.headers.get("Accept", ""))
+
+
+async def iter_part_chunks(part) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await part.read_chunk(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            return
+        yield chunk
+
+
+async def upload_input_data(request: web.Request, max_size: int) -> UploadedInput:
+    executor_task_data_storage: AsyncExecutorTaskDataStorage = request.app.get("executor_task_data_storage")
+    if request.content_type == CONTENT_TYPE_OCTET_STREAM:
+        return await executor_task_data_storage.upload_input_data(
+            request.content.iter_chunked(UPLOAD_CHUNK_SIZE), max_size
+        )
+
+    reader = await request.multipart()
+    async for part in reader:
+        if part.name == UPLOAD_PART_NAME:
+            return await executor_task_data_storage.upload_input_data(iter_part_chunks(part), max_size)
+    raise DecodingError(f"Part `{UPLOAD_PART_NAME}` is required.")
+
+
+async def create_uploaded_task(request: web.Request):
+    # input data is the body or the `input_data` part of the form, the rest is passed in the query
+    priority = request.query.get("priority", "0")
+    try:
+        priority_value = int(priority)
+    except ValueError:
+        return IncorrectParameterResponse("priority", priority)
+    tenant = request.query.get("tenant")
+
+    max_input_data_size: int = request.app.get("max_input_data_size")
+    try:
+        uploaded_input = await upload_input_data(request, max_input_data_size)
+    except InputDataTooLargeException:
+        return InputDataTooLargeResponse(max_input_data_size)
+    except (DecodingError, ValueError) as exception:
+        return IncorrectRequestBodyResponse(str(exception))
+    task_repository: ITaskRepository = request.app.get("task_repository")
+    task_info = await controller.create_uploaded_task(task_repository, uploaded_input, priority_value, tenant)
+    return CreateTaskResponse(task_info, get_codec(request))
+
+
+def is_upload(request: web.Request) -> bool:
+    # aiohttp reports `application/octet-stream` when there is no header, such bodies are decoded as before
+    if hdrs.CONTENT_TYPE not in request.headers:
+        return False
+    return request.content_type in (CONTENT_TYPE_OCTET_STREAM, CONTENT_TYPE_MULTIPART_FORM_DATA)
+
+
 async def create_task(request: web.Request):
-    data = await request.json()
-    task_input_data = deserialize(TaskInputData, data)
+    if is_upload(request):
+        return await create_uploaded_task(request)
+    try:
+        task_input_data = await read_body(request, TaskInputData)
+    except DecodingError as exception:
+        return IncorrectRequestBodyResponse(str(exception))
     task_repository: ITaskRepository = request.app.get("task_repository")
     task_info = await controller.create_task(task_repository, task_input_data)
-    return CreateTaskResponse(task_info)
+    return CreateTaskResponse(task_info, get_codec(request))
+
+
+async def create_tasks_batch(request: web.Request):
+    try:
+        task_input_data_batch = await read_body(request, TaskInputDataBatch)
+    except DecodingError as exception:
+        return IncorrectRequestBodyResponse(str(exception))
+    max_batch_size: int = request.app.get("max_batch_size")
+    if len(task_input_data_batch.tasks) > max_batch_size:
+        return BatchTooLargeResponse(max_batch_size)
+    task_repository: ITaskRepository = request.app.get("task_repository")
+    task_info_batch = await controller.create_tasks(task_repository, task_input_data_batch)
+    return CreateTasksBatchResponse(task_info_batch, get_codec(request))
 
 
 async def run_task(request: web.Request):
-    data = await request.json()
-    task_id = data.get("task_id", "")
+    try:
+        task_run_data = await read_body(request, TaskRunData)
+    except DecodingError as exception:
+        return IncorrectRequestBodyResponse(str(exception))
+    task_id = task_run_data.task_id
+    priority = task_run_data.priority
+    profile = task_run_data.profile
+    timeout = task_run_data.timeout
+    if timeout is not None and timeout <= 0:
+        return IncorrectParameterResponse("timeout", str(timeout))
     task_queue: ITaskQueue = request.app.get("task_queue")
     task_repository: ITaskRepository = request.app.get("task_repository")
+    result_cache: Optional[ResultCache] = request.app.get("result_cache")
+    task_coalescer: Optional[TaskCoalescer] = request.app.get("task_coalescer")
     try:
-        task_info = await controller.run_task(task_repository, task_queue, task_id)
-        return TaskInfoResponse(task_info)
+        task_info = await controller.run_task(
+            task_repository, task_queue, task_id, priority, result_cache, task_coalescer, profile, timeout
+        )
+        return TaskInfoResponse(task_info, get_codec(request))
     except NoSuchTaskException:
         return NoSuchTaskResponse(task_id)
     except IncorrectTaskOperationException:
         return IncorrectTaskOperationResponse(task_id)
 
 
+async def run_tasks_batch(request: web.Request):
+    try:
+        task_id_batch = await read_body(request, TaskIdBatch)
+    except DecodingError as exception:
+        return IncorrectRequestBodyResponse(str(exception))
+    max_batch_size: int = request.app.get("max_batch_size")
+    if len(task_id_batch.task_ids) > max_batch_size:
+        return BatchTooLargeResponse(max_batch_size)
+    task_queue: ITaskQueue = request.app.get("task_queue")
+    task_repository: ITaskRepository = request.app.get("task_repository")
+    result_cache: Optional[ResultCache] = request.app.get("result_cache")
+    task_coalescer: Optional[TaskCoalescer] = request.app.get("task_coalescer")
+    task_info_batch = await controller.run_tasks(
+        task_repository, task_queue, task_id_batch, result_cache, task_coalescer
+    )
+    return TaskInfoBatchResponse(task_info_batch, get_codec(request))
+
+
 async def cancel_task(request: web.Request):
-    data = await request.json()
-    task_id = data.get("task_id", "")
+    try:
+        task_id = (await read_body(request, TaskId)).task_id
+    except DecodingError as exception:
+        return IncorrectRequestBodyResponse(str(exception))
     task_queue: ITaskQueue = request.app.get("task_queue")
     task_repository: ITaskRepository = request.app.get("task_repository")
+    task_queue_listener: ITaskQueueListener = request.app.get("task_queue_listener")
+    task_coalescer: Optional[TaskCoalescer] = request.app.get("task_coalescer")
+    task_lease_manager: Optional[TaskLeaseManager] = request.app.get("task_lease_manager")
     try:
-        task_info = await controller.cancel_task(task_repository, task_queue, task_id)
-        return TaskInfoResponse(task_info)
+        task_info = await controller.cancel_task(
+            task_repository, task_queue, task_queue_listener, task_id, task_coalescer, task_lease_manager
+        )
+        return TaskInfoResponse(task_info, get_codec(request))
     except NoSuchTaskException:
         return NoSuchTaskResponse(task_id)
     except IncorrectTaskOperationException:
         return IncorrectTaskOperationResponse(task_id)
 
 
+async def lease_tasks(request: web.Request):
+    task_lease_manager: Optional[TaskLeaseManager] = request.app.get("task_lease_manager")
+    if task_lease_manager is None:
+        return RemoteWorkersDisabledResponse()
+    try:
+        task_lease_request = await read_body(request, TaskLeaseRequest)
+    except DecodingError as exception:
+        return IncorrectRequestBodyResponse(str(exception))
+    if task_lease_request.count < 0:
+        return IncorrectParameterResponse("count", str(task_lease_request.count))
+    if not 0 <= task_lease_request.wait <= MAX_WAIT_TIMEOUT:
+        return IncorrectParameterResponse("wait", str(task_lease_request.wait))
+    if task_lease_request.visibility_timeout is not None and task_lease_request.visibility_timeout <= 0:
+        return IncorrectParameterResponse("visibility_timeout", str(task_lease_request.visibility_timeout))
+    task_lease_batch = await controller.lease_tasks(task_lease_manager, task_lease_request)
+    return TaskLeaseBatchResponse(task_lease_batch, get_codec(request))
+
+
+async def heartbeat_task_lease(request: web.Request):
+    task_lease_manager: Optional[TaskLeaseManager] = request.app.get("task_lease_manager")
+    if task_lease_manager is None:
+        return RemoteWorkersDisabledResponse()
+    try:
+        task_lease_heartbeat = await read_body(request, TaskLeaseHeartbeat)
+    except DecodingError as exception:
+        return IncorrectRequestBodyResponse(str(exception))
+    if task_lease_heartbeat.visibility_timeout is not None and task_lease_heartbeat.visibility_timeout <= 0:
+        return IncorrectParameterResponse("visibility_timeout", str(task_lease_heartbeat.visibility_timeout))
+    try:
+        task_lease_info = await controller.heartbeat_task_lease(task_lease_manager, task_lease_heartbeat)
+        return TaskLeaseResponse(task_lease_info, get_codec(request))
+    except TaskLeaseExpiredException:
+        return TaskLeaseExpiredResponse(task_lease_heartbeat.lease_id)
+
+
+async def complete_task_lease(request: web.Request):
+    task_lease_manager: Optional[TaskLeaseManager] = request.app.get("task_lease_manager")
+    if task_lease_manager is None:
+        return RemoteWorkersDisabledResponse()
+    try:
+        task_lease_completion = await read_body(request, TaskLeaseCompletion)
+    except DecodingError as exception:
+        return IncorrectRequestBodyResponse(str(exception))
+    try:
+        task_info = await controller.complete_task_lease(task_lease_manager, task_lease_completion)
+        return TaskInfoResponse(task_info, get_codec(request))
+    except TaskLeaseExpiredException:
+        return TaskLeaseExpiredResponse(task_lease_completion.lease_id)
+
+
+async def fail_task_lease(request: web.Request):
+    task_lease_manager: Optional[TaskLeaseManager] = request.app.get("task_lease_manager")
+    if task_lease_manager is None:
+        return RemoteWorkersDisabledResponse()
+    try:
+        task_lease_failure = await read_body(request, TaskLeaseFailure)
+    except DecodingError as exception:
+        return IncorrectRequestBodyResponse(str(exception))
+    try:
+        task_info = await controller.fail_task_lease(task_lease_manager, task_lease_failure)
+        return TaskInfoResponse(task_info, get_codec(request))
+    except TaskLeaseExpiredException:
+        return TaskLeaseExpiredResponse(task_lease_failure.lease_id)
+
+
 async def get_task_status(request: web.Request):
     task_id = int(request.match_info["task_id"])
     task_repository: ITaskRepository = request.app.get("task_repository")
     try:
         task_info = await controller.get_task_status(task_repository, task_id)
-        return TaskInfoResponse(task_info)
+        return TaskInfoResponse(task_info, get_codec(request))
+    except NoSuchTaskException:
+        return NoSuchTaskResponse(task_id)
+
+
+async def wait_for_task_status(request: web.Request):
+    task_id = int(request.match_info["task_id"])
+    timeout = request.query.get("timeout", str(DEFAULT_WAIT_TIMEOUT))
+    try:
+        timeout_seconds = float(timeout)
+    except ValueError:
+        return IncorrectParameterResponse("timeout", timeout)
+    if not 0 <= timeout_seconds <= MAX_WAIT_TIMEOUT:
+        return IncorrectParameterResponse("timeout", timeout)
+
+    task_status_waiter: TaskStatusWaiter = request.app.get("task_status_waiter")
+    try:
+        task_info = await controller.wait_for_task_status(task_status_waiter, task_id, timeout_seconds)
+        return TaskInfoResponse(task_info, get_codec(request))
+    except NoSuchTaskException:
+        return NoSuchTaskResponse(task_id)
+
+
+async def stream_task_status_events(request: web.Request):
+    # filters are comma-separated: `?task_ids=1,2,3&statuses=SUCCESS,FAILURE`
+    task_ids: Optional[Set[int]] = None
+    statuses: Optional[Set[TaskStatus]] = None
+    try:
+        if "task_ids" in request.query:
+            task_ids = {int(task_id) for task_id in request.query["task_ids"].split(",")}
+    except ValueError:
+        return IncorrectParameterResponse("task_ids", request.query["task_ids"])
+    try:
+        if "statuses" in request.query:
+            statuses = {TaskStatus(status) for status in request.query["statuses"].split(",")}
+    except ValueError:
+        return IncorrectParameterResponse("statuses", request.query["statuses"])
+
+    task_status_event_broadcaster: TaskStatusEventBroadcaster = request.app.get("task_status_event_broadcaster")
+    subscription = task_status_event_broadcaster.subscribe(task_ids, statuses)
+    response = TaskStatusEventStreamResponse()
+    try:
+        await response.prepare(request)
+        while not subscription.is_closed:
+            try:
+                task_infos = await asyncio.wait_for(
+                    controller.get_task_status_events(subscription),
+                    EVENT_STREAM_KEEP_ALIVE_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                await response.write_keep_alive()
+                continue
+            except TaskEventsOverflowException as exception:
+                await response.write_error(exception.message)
+                break
+            await response.write_task_infos(task_infos)
+    finally:
+        task_status_event_broadcaster.unsubscribe(subscription)
+    return response
+
+
+async def list_tasks(request: web.Request):
+    # `?status=FAILURE&since=<unix time>&limit=100&cursor=<next_cursor of the previous page>`
+    status = request.query.get("status", "")
+    try:
+        task_status = TaskStatus(status)
+    except ValueError:
+        return IncorrectParameterResponse("status", status)
+    limit = request.query.get("limit", str(DEFAULT_TASK_LIST_LIMIT))
+    try:
+        limit_value = int(limit)
+    except ValueError:
+        return IncorrectParameterResponse("limit", limit)
+    if not 0 < limit_value <= MAX_TASK_LIST_LIMIT:
+        return IncorrectParameterResponse("limit", limit)
+    since: Optional[float] = None
+    try:
+        if "since" in request.query:
+            since = float(request.query["since"])
+    except ValueError:
+        return IncorrectParameterResponse("since", request.query["since"])
+    cursor: Optional[int] = None
+    try:
+        if "cursor" in request.query:
+            cursor = int(request.query["cursor"])
+    except ValueError:
+        return IncorrectParameterResponse("cursor", request.query["cursor"])
+
+    task_repository: ITaskRepository = request.app.get("task_repository")
+    task_list = await controller.list_tasks(task_repository, task_status, limit_value, since, cursor)
+    return TaskListResponse(task_list, get_codec(request))
+
+
+async def count_tasks(request: web.Request):
+    task_repository: ITaskRepository = request.app.get("task_repository")
+    task_counts = await controller.count_tasks(task_repository)
+    return TaskCountsResponse(task_counts, get_codec(request))
+
+
+async def get_task_stats(request: web.Request):
+    task_id = int(request.match_info["task_id"])
+    task_repository: ITaskRepository = request.app.get("task_repository")
+    try:
+        task_stats = await controller.get_task_stats(task_repository, task_id)
+        return TaskStatsResponse(task_stats, get_codec(request))
+    except NoSuchTaskException:
+        return NoSuchTaskResponse(task_id)
+    except NoTaskResourceUsageException:
+        return NoTaskResourceUsageResponse(task_id)
+
+
+async def get_task_stats_summary(request: web.Request):
+    # percentiles over `limit` most recently finished tasks
+    limit = request.query.get("limit", str(DEFAULT_TASK_STATS_LIMIT))
+    try:
+        limit_value = int(limit)
+    except ValueError:
+        return IncorrectParameterResponse("limit", limit)
+    if not 0 < limit_value <= MAX_TASK_STATS_LIMIT:
+        return IncorrectParameterResponse("limit", limit)
+
+    task_repository: ITaskRepository = request.app.get("task_repository")
+    task_stats_summary = await controller.get_task_stats_summary(task_repository, limit_value)
+    return TaskStatsSummaryResponse(task_stats_summary, get_codec(request))
+
+
+async def get_task_profile(request: web.Request):
+    task_id = int(request.match_info["task_id"])
+    # `text` is a summary sorted by cumulative time, `pstats` is the file for `pstats.Stats`
+    profile_format = request.query.get("format", PROFILE_FORMAT_TEXT)
+    if profile_format not in (PROFILE_FORMAT_TEXT, PROFILE_FORMAT_PSTATS):
+        return IncorrectParameterResponse("format", profile_format)
+    limit = request.query.get("limit", str(DEFAULT_PROFILE_LIMIT))
+    try:
+        limit_value = int(limit)
+    except ValueError:
+        return IncorrectParameterResponse("limit", limit)
+    if limit_value <= 0:
+        return IncorrectParameterResponse("limit", limit)
+
+    task_repository: ITaskRepository = request.app.get("task_repository")
+    executor_task_data_storage: AsyncExecutorTaskDataStorage = request.app.get("executor_task_data_storage")
+    try:
+        profile_path = await controller.get_task_profile_path(task_repository, executor_task_data_storage, task_id)
+    except NoSuchTaskException:
+        return NoSuchTaskResponse(task_id)
+    except NoTaskProfileException:
+        return NoTaskProfileResponse(task_id)
+
+    if profile_format == PROFILE_FORMAT_PSTATS:
+        return TaskProfileFileResponse(profile_path)
+    profile = await controller.render_task_profile(profile_path, limit_value)
+    return TaskProfileTextResponse(profile)
+
+
+async def get_metrics(request: web.Request):
+    metrics_registry: MetricsRegistry = request.app.get("metrics_registry")
+    metrics = await controller.render_metrics(metrics_registry)
+    return MetricsResponse(metrics)
+
+
+async def get_task_position(request: web.Request):
+    task_id = int(request.match_info["task_id"])
+    task_queue: ITaskQueue = request.app.get("task_queue")
+    task_repository: ITaskRepository = request.app.get("task_repository")
+    try:
+        task_position = await controller.get_task_position(task_repository, task_queue, task_id)
+        return TaskPositionResponse(task_position, get_codec(request))
     except NoSuchTaskException:
         return NoSuchTaskResponse(task_id)
+    except IncorrectTaskOperationException:
+        return IncorrectTaskOperationResponse(task_id)
+
+
+async def get_tasks_statuses(request: web.Request):
+    try:
+        task_id_batch = await read_body(request, TaskIdBatch)
+    except DecodingError as exception:
+        return IncorrectRequestBodyResponse(str(exception))
+    max_batch_size: int = request.app.get("max_batch_size")
+    if len(task_id_batch.task_ids) > max_batch_size:
+        return BatchTooLargeResponse(max_batch_size)
+    task_repository: ITaskRepository = request.app.get("task_repository")
+    task_info_batch = await controller.get_tasks_statuses(task_repository, task_id_batch)
+    return TaskInfoBatchResponse(task_info_batch, get_codec(request))
 
 
 async def get_task_output_data(request: web.Request):
     task_id = int(request.match_info["task_id"])
+    # `raw` output is streamed from disk as is, `json` output is wrapped into `TaskOutputData`
+    output_format = request.query.get("format", OUTPUT_FORMAT_JSON)
+    if output_format not in (OUTPUT_FORMAT_JSON, OUTPUT_FORMAT_RAW):
+        return IncorrectParameterResponse("format", output_format)
+
     task_repository: ITaskRepository = request.app.get("task_repository")
     try:
+        if output_format == OUTPUT_FORMAT_JSON:
+            output_data = await controller.get_task_output_data(task_repository, task_id)
+            return TaskOutputDataResponse(output_data, get_codec(request))
+
+        output_path = await controller.get_task_output_path(task_repository, task_id)
+        if output_path is not None:
+            return TaskOutputFileResponse(output_path)
         output_data = await controller.get_task_output_data(task_repository, task_id)
-        return TaskOutputDataResponse(output_data)
+        return TaskOutputTextResponse(output_data.output_data)
     except NoSuchTaskException:
         return NoSuchTaskResponse(task_id)
+    except NoTaskOutputDataException:
+        return NoTaskOutputDataResponse(task_id)
     except IncorrectTaskOperationException:
         return IncorrectTaskOperationResponse(task_id)
@@ -1,61 +1,334 @@
 import os
+from dataclasses import dataclass
+from typing import Dict
+from typing import Optional
 
 from aiohttp import web
 
+from app.api.contexts import broker_connection_context
+from app.api.contexts import close_task_status_events
+from app.api.contexts import event_loop_lag_context
+from app.api.contexts import executor_task_data_storage_context
+from app.api.contexts import result_cache_context
+from app.api.contexts import task_lease_manager_context
 from app.api.contexts import task_queue_context
+from app.api.contexts import task_repository_context
+from app.api.middlewares import build_request_latency_middleware
 from app.api.views import cancel_task
+from app.api.views import complete_task_lease
+from app.api.views import count_tasks
 from app.api.views import create_task
+from app.api.views import create_tasks_batch
+from app.api.views import fail_task_lease
+from app.api.views import get_metrics
 from app.api.views import get_task_output_data
+from app.api.views import get_task_position
+from app.api.views import get_task_profile
+from app.api.views import get_task_stats
+from app.api.views import get_task_stats_summary
 from app.api.views import get_task_status
+from app.api.views import get_tasks_statuses
 from app.api.views import healthcheck
+from app.api.views import heartbeat_task_lease
+from app.api.views import lease_tasks
+from app.api.views import list_tasks
 from app.api.views import run_task
+from app.api.views import run_tasks_batch
+from app.api.views import stream_task_status_events
+from app.api.views import wait_for_task_status
+from app.broker.client import BrokerConnection
+from app.broker.client import RemoteTaskQueue
+from app.broker.client import RemoteTaskQueueListener
+from app.broker.client import RemoteTaskRepository
+from app.data import TaskRepositoryConfig
 from app.data import build_task_repository
+from app.data.events import TaskStatusEventBroadcaster
+from app.data.metrics import TaskMetrics
+from app.data.sqlite import SqliteRepositoryTaskDataStorageConfig
+from app.data.storage import RetentionConfig
+from app.data.waiter import TaskStatusWaiter
 from app.domain.listener import ITaskQueueListener
+from app.domain.queue import IConsumableTaskQueue
 from app.domain.queue import ITaskQueue
 from app.domain.repository import ITaskRepository
+from app.execution.cache import ResultCache
+from app.execution.cache import ResultCacheConfig
+from app.execution.cache import build_result_cache
+from app.execution.coalescing import TaskCoalescer
+from app.execution.coalescing import build_task_coalescer
 from app.execution.executor import ExecutionConfig
+from app.execution.executor import WorkloadConfig
+from app.execution.lease import TaskLeaseConfig
+from app.execution.lease import TaskLeaseManager
+from app.execution.lease import build_task_lease_manager
 from app.execution.listener import ListenerConfig
 from app.execution.listener import build_task_queue_listener
+from app.execution.queue import TaskQueueConfig
 from app.execution.queue import build_task_queue
+from app.execution.storage import AsyncExecutorTaskDataStorage
 from app.execution.storage import ExecutorTaskDataStorageConfig
+from app.execution.storage import build_async_executor_task_data_storage
+from app.logger import get_logger
+from app.metrics import LAG_BUCKETS
+from app.metrics import MetricsRegistry
 
+logger = get_logger(__name__)
 
-def configure_dependencies(app: web.Application) -> None:
-    max_running_tasks = int(os.getenv("MAX_RUNNING_TASKS", "2"))
-    executor_task_data_storage_config = ExecutorTaskDataStorageConfig()
-    execution_config = ExecutionConfig(executor_task_data_storage_config)
+
+def parse_tenant_weights(tenant_weights: str) -> Dict[str, float]:
+    # format is `tenant=weight,tenant=weight`
+    result = {}
+    for tenant_weight in filter(None, tenant_weights.split(",")):
+        tenant, weight = tenant_weight.split("=")
+        result[tenant.strip()] = float(weight)
+    return result
+
+
+@dataclass
+class Backend:
+    task_repository: ITaskRepository
+    task_queue: ITaskQueue
+    task_queue_listener: ITaskQueueListener
+    result_cache: Optional[ResultCache]
+    task_coalescer: Optional[TaskCoalescer]
+    task_lease_manager: Optional[TaskLeaseManager]
+
+
+def read_executor_task_data_storage_config() -> ExecutorTaskDataStorageConfig:
+    task_data_folder = os.getenv("TASK_DATA_FOLDER")
+    task_data_io_threads = int(os.getenv("TASK_DATA_IO_THREADS", "4"))
+    return ExecutorTaskDataStorageConfig(
+        root_data_folder=task_data_folder,
+        io_threads=task_data_io_threads,
+    )
+
+
+def read_execution_config(executor_task_data_storage_config: ExecutorTaskDataStorageConfig) -> ExecutionConfig:
+    task_input_transport = os.getenv("TASK_INPUT_TRANSPORT", "file")
+    task_profiling_sample_rate = float(os.getenv("TASK_PROFILING_SAMPLE_RATE", "0"))
+    task_workload_sleep = float(os.getenv("TASK_WORKLOAD_SLEEP", "2.0"))
+    task_workload_cpu_time = float(os.getenv("TASK_WORKLOAD_CPU_TIME", "0"))
+    task_workload_io_bytes = int(os.getenv("TASK_WORKLOAD_IO_BYTES", "0"))
+    task_timeout = os.getenv("TASK_TIMEOUT")
+    return ExecutionConfig(
+        executor_task_data_storage_config,
+        input_transport=task_input_transport,
+        profiling_sample_rate=task_profiling_sample_rate,
+        workload=WorkloadConfig(
+            sleep=task_workload_sleep,
+            cpu_time=task_workload_cpu_time,
+            io_bytes=task_workload_io_bytes,
+        ),
+        default_timeout=float(task_timeout) if task_timeout else None,
+    )
+
+
+def read_max_running_tasks() -> int:
+    # the limit of the listener, it is the same for the broker when workers share it
+    return int(os.getenv("MAX_RUNNING_TASKS", "2"))
+
+
+def build_local_backend(
+        executor_task_data_storage_config: ExecutorTaskDataStorageConfig,
+        executor_task_data_storage: AsyncExecutorTaskDataStorage,
+        max_running_tasks: int
+) -> Backend:
+    max_tasks_per_worker = os.getenv("MAX_TASKS_PER_WORKER")
+    cancel_grace_period = float(os.getenv("CANCEL_GRACE_PERIOD", "5.0"))
+    tenant_weights = parse_tenant_weights(os.getenv("TENANT_WEIGHTS", ""))
+    task_storage_type = os.getenv("TASK_STORAGE", "memory")
+    sqlite_database_path = os.getenv("SQLITE_DATABASE_PATH", "tasks.sqlite3")
+    sqlite_group_commit_window = float(os.getenv("SQLITE_GROUP_COMMIT_WINDOW", "0.002"))
+    result_cache_enabled = os.getenv("RESULT_CACHE", "") == "enabled"
+    result_cache_folder = os.getenv("RESULT_CACHE_FOLDER")
+    result_cache_ttl = os.getenv("RESULT_CACHE_TTL")
+    task_coalescing_enabled = os.getenv("TASK_COALESCING", "") == "enabled"
+    task_retention_ttl = os.getenv("TASK_RETENTION_TTL")
+    task_retention_max_payload_bytes = os.getenv("TASK_RETENTION_MAX_PAYLOAD_BYTES")
+    task_retention_max_tasks = os.getenv("TASK_RETENTION_MAX_TASKS")
+    task_retention_spill_folder = os.getenv("TASK_RETENTION_SPILL_FOLDER")
+    # remote workers lease tasks from the same queue, `MAX_RUNNING_TASKS=0` leaves all execution to them
+    remote_workers_enabled = os.getenv("REMOTE_WORKERS", "") == "enabled"
+    lease_visibility_timeout = float(os.getenv("LEASE_VISIBILITY_TIMEOUT", "30"))
+    lease_max_visibility_timeout = float(os.getenv("LEASE_MAX_VISIBILITY_TIMEOUT", "600"))
     listener_config = ListenerConfig(
-        execution_config=execution_config,
+        execution_config=read_execution_config(executor_task_data_storage_config),
         max_running_tasks=max_running_tasks,
+        max_tasks_per_worker=int(max_tasks_per_worker) if max_tasks_per_worker else None,
+        cancel_grace_period=cancel_grace_period,
     )
+    task_repository_config = TaskRepositoryConfig(
+        storage_type=task_storage_type,
+        sqlite_config=SqliteRepositoryTaskDataStorageConfig(
+            database_path=sqlite_database_path,
+            group_commit_window=sqlite_group_commit_window,
+        ),
+        retention_config=RetentionConfig(
+            ttl=float(task_retention_ttl) if task_retention_ttl else None,
+            max_payload_bytes=int(task_retention_max_payload_bytes) if task_retention_max_payload_bytes else None,
+            max_tasks=int(task_retention_max_tasks) if task_retention_max_tasks else None,
+            spill_folder=task_retention_spill_folder,
+        ),
+    )
+    task_repository: ITaskRepository = build_task_repository(task_repository_config)
+    task_queue_config = TaskQueueConfig(tenant_weights=tenant_weights)
+    task_queue: IConsumableTaskQueue = build_task_queue(task_queue_config)
+
+    result_cache_config = ResultCacheConfig(
+        enabled=result_cache_enabled,
+        cache_folder=result_cache_folder,
+        ttl=float(result_cache_ttl) if result_cache_ttl else None,
+    )
+    result_cache = build_result_cache(result_cache_config, executor_task_data_storage_config)
 
-    task_repository: ITaskRepository = build_task_repository()
-    task_queue: ITaskQueue = build_task_queue()
+    task_coalescer: Optional[TaskCoalescer] = None
+    if task_coalescing_enabled:
+        task_coalescer = build_task_coalescer(task_repository, task_queue, executor_task_data_storage)
 
     task_queue_listener: ITaskQueueListener = build_task_queue_listener(
         task_repository,
         task_queue,
-        listener_config
+        listener_config,
+        result_cache
+    )
+
+    task_lease_manager: Optional[TaskLeaseManager] = None
+    if remote_workers_enabled:
+        task_lease_config = TaskLeaseConfig(
+            default_visibility_timeout=lease_visibility_timeout,
+            max_visibility_timeout=lease_max_visibility_timeout,
+        )
+        task_lease_manager = build_task_lease_manager(
+            task_repository,
+            task_queue,
+            executor_task_data_storage_config,
+            task_lease_config,
+            result_cache
+        )
+
+    return Backend(
+        task_repository,
+        task_queue,
+        task_queue_listener,
+        result_cache,
+        task_coalescer,
+        task_lease_manager
     )
 
+
+def build_remote_backend(broker_connection: BrokerConnection) -> Backend:
+    if any(os.getenv(name, "") == "enabled" for name in ("RESULT_CACHE", "TASK_COALESCING", "REMOTE_WORKERS")):
+        # all of them keep their state in the memory of one process
+        logger.warning(
+            "Result cache, task coalescing and remote workers aren't supported with the broker, they are disabled."
+        )
+
+    task_repository = RemoteTaskRepository(broker_connection)
+    task_queue = RemoteTaskQueue(broker_connection)
+    task_queue_listener = RemoteTaskQueueListener(task_repository, task_queue, broker_connection)
+    return Backend(task_repository, task_queue, task_queue_listener, None, None, None)
+
+
+def configure_dependencies(app: web.Application) -> None:
+    max_running_tasks = read_max_running_tasks()
+    max_buffered_task_events = int(os.getenv("MAX_BUFFERED_TASK_EVENTS", "1024"))
+    max_input_data_size = int(os.getenv("MAX_INPUT_DATA_SIZE", str(1024 * 1024 * 1024)))
+    # tasks of a batch are created and run in one go, so it is limited like input data
+    max_batch_size = int(os.getenv("MAX_BATCH_SIZE", "10000"))
+    # HTTP workers share the repository, the queue and the listener of the broker listening on the socket
+    broker_socket = os.getenv("BROKER_SOCKET")
+    executor_task_data_storage_config = read_executor_task_data_storage_config()
+    # uploaded inputs are written by the api, not by the listener
+    executor_task_data_storage = build_async_executor_task_data_storage(executor_task_data_storage_config)
+
+    broker_connection: Optional[BrokerConnection] = None
+    if broker_socket:
+        broker_connection = BrokerConnection(broker_socket)
+        backend = build_remote_backend(broker_connection)
+    else:
+        backend = build_local_backend(executor_task_data_storage_config, executor_task_data_storage, max_running_tasks)
+    task_repository = backend.task_repository
+    task_queue = backend.task_queue
+    task_queue_listener = backend.task_queue_listener
+    result_cache = backend.result_cache
+    task_coalescer = backend.task_coalescer
+    task_lease_manager = backend.task_lease_manager
+
+    metrics_registry = MetricsRegistry()
+
+    app["broker_connection"] = broker_connection
     app["task_queue"] = task_queue
     app["task_repository"] = task_repository
+    app["task_status_waiter"] = TaskStatusWaiter(task_repository)
+    app["task_status_event_broadcaster"] = TaskStatusEventBroadcaster(task_repository, max_buffered_task_events)
     app["task_queue_listener"] = task_queue_listener
+    app["result_cache"] = result_cache
+    app["task_coalescer"] = task_coalescer
+    app["task_lease_manager"] = task_lease_manager
+    app["executor_task_data_storage"] = executor_task_data_storage
+    app["max_input_data_size"] = max_input_data_size
+    app["max_batch_size"] = max_batch_size
+    app["metrics_registry"] = metrics_registry
+    app["task_metrics"] = TaskMetrics(
+        metrics_registry,
+        task_repository,
+        task_queue,
+        task_queue_listener,
+        max_running_tasks
+    )
+    app["request_latency"] = metrics_registry.histogram(
+        "processqueue_http_request_duration_seconds",
+        "Time of handling of a request.",
+        ("method", "route")
+    )
+    app["event_loop_lag"] = metrics_registry.histogram(
+        "processqueue_event_loop_lag_seconds",
+        "Delay of wake up of a sleeping coroutine.",
+        buckets=LAG_BUCKETS
+    ).labels()
 
 
 def configure_context(app: web.Application) -> None:
+    app.cleanup_ctx.append(broker_connection_context)
+    # storage is shared with the task coalescer, so it is closed after it
+    app.cleanup_ctx.append(executor_task_data_storage_context)
+    app.cleanup_ctx.append(task_repository_context)
     app.cleanup_ctx.append(task_queue_context)
+    app.cleanup_ctx.append(task_lease_manager_context)
+    app.cleanup_ctx.append(result_cache_context)
+    app.cleanup_ctx.append(event_loop_lag_context)
+    app.on_shutdown.append(close_task_status_events)
+
+
+def configure_middlewares(app: web.Application) -> None:
+    app.middlewares.append(build_request_latency_middleware(app["request_latency"]))
 
 
 def configure_routes(app: web.Application) -> None:
     routes = [
         web.get("/", healthcheck),
         web.get("/healthcheck", healthcheck),
+        web.get("/metrics", get_metrics, allow_head=False),
         web.post("/tasks/create", create_task),
         web.post("/tasks/run", run_task),
         web.post("/tasks/cancel", cancel_task),
+        web.post("/tasks/create_batch", create_tasks_batch),
+        web.post("/tasks/run_batch", run_tasks_batch),
+        web.post("/tasks/status", get_tasks_statuses),
+        web.get("/tasks", list_tasks, allow_head=False),
+        web.get("/tasks/counts", count_tasks, allow_head=False),
+        web.get("/tasks/stats", get_task_stats_summary, allow_head=False),
+        web.get("/tasks/events", stream_task_status_events, allow_head=False),
         web.get("/tasks/{task_id:[0-9]+}/status", get_task_status, allow_head=False),
         web.get("/tasks/{task_id:[0-9]+}/output", get_task_output_data, allow_head=False),
+        web.get("/tasks/{task_id:[0-9]+}/position", get_task_position, allow_head=False),
+        web.get("/tasks/{task_id:[0-9]+}/stats", get_task_stats, allow_head=False),
+        web.get("/tasks/{task_id:[0-9]+}/profile", get_task_profile, allow_head=False),
+        web.get("/tasks/{task_id:[0-9]+}/wait", wait_for_task_status, allow_head=False),
+        web.post("/workers/lease", lease_tasks),
+        web.post("/workers/heartbeat", heartbeat_task_lease),
+        web.post("/workers/complete", complete_task_lease),
+        web.post("/workers/fail", fail_task_lease),
     ]
 
     app.add_routes(routes)
@@ -66,6 +339,7 @@ async def startup_app() -> web.Application:
 
     configure_dependencies(app)
     configure_context(app)
+    configure_middlewares(app)
     configure_routes(app)
 
     return app
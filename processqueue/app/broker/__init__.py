@@ -0,0 +1,7 @@
+from app.broker.client import BrokerConnection
+from app.broker.server import BrokerServer
+
+__all__ = [
+    "BrokerConnection",
+    "BrokerServer",
+]
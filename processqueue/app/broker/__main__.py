@@ -0,0 +1,54 @@
+import asyncio
+import os
+import signal
+
+from app.app import build_local_backend
+from app.app import read_executor_task_data_storage_config
+from app.app import read_max_running_tasks
+from app.broker.server import BrokerServer
+from app.execution.storage import build_async_executor_task_data_storage
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+async def serve(socket_path: str) -> None:
+    executor_task_data_storage_config = read_executor_task_data_storage_config()
+    executor_task_data_storage = build_async_executor_task_data_storage(executor_task_data_storage_config)
+    backend = build_local_backend(
+        executor_task_data_storage_config,
+        executor_task_data_storage,
+        read_max_running_tasks()
+    )
+    broker_server = BrokerServer(
+        backend.task_repository,
+        backend.task_queue,
+        backend.task_queue_listener,
+        socket_path
+    )
+
+    loop = asyncio.get_running_loop()
+    stopped = asyncio.Event()
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, stopped.set)
+
+    await broker_server.start()
+    listen_task = loop.create_task(backend.task_queue_listener.listen())
+    try:
+        await stopped.wait()
+    finally:
+        logger.info("Broker is stopping.")
+        await broker_server.close()
+        listen_task.cancel()
+        await asyncio.wait({listen_task})
+        backend.task_queue_listener.stop()
+        backend.task_repository.close()
+        if backend.result_cache is not None:
+            backend.result_cache.close()
+        if backend.task_lease_manager is not None:
+            backend.task_lease_manager.close()
+        executor_task_data_storage.close()
+
+
+if __name__ == '__main__':
+    asyncio.run(serve(os.environ["BROKER_SOCKET"]))
@@ -0,0 +1,275 @@
+import asyncio
+import itertools
+import time
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from app.broker.protocol import MESSAGE_REQUEST
+from app.broker.protocol import MESSAGE_RESPONSE
+from app.broker.protocol import MESSAGE_STATUS_EVENT
+from app.broker.protocol import read_message
+from app.broker.protocol import write_message
+from app.broker.server import TARGET_LISTENER
+from app.broker.server import TARGET_QUEUE
+from app.broker.server import TARGET_REPOSITORY
+from app.domain.listener import ITaskQueueListener
+from app.domain.model import Task
+from app.domain.model import TaskPage
+from app.domain.model import TaskResourceUsage
+from app.domain.model import TaskStatus
+from app.domain.queue import ITaskQueue
+from app.domain.queue import TaskQueueItem
+from app.domain.repository import ITaskRepository
+from app.domain.repository import TaskStatusListener
+from app.exceptions import BrokerUnavailableException
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "BrokerConnection",
+    "RemoteTaskQueue",
+    "RemoteTaskQueueListener",
+    "RemoteTaskRepository",
+]
+
+# workers may start before the broker has created its socket
+CONNECT_RETRY_INTERVAL = 0.1
+
+
+class BrokerConnection:
+    """
+    Connection of an HTTP worker to the broker.
+
+    Calls of all coroutines share one connection and are matched with responses by request id.
+    The connection is restored on the next call after the broker has restarted.
+    """
+
+    def __init__(self, socket_path: str):
+        self._socket_path = socket_path
+        self._request_ids = itertools.count()
+        self._responses: Dict[int, asyncio.Future] = {}
+        self._status_listeners: List[TaskStatusListener] = []
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._read_task: Optional[asyncio.Task] = None
+        self._connect_lock = asyncio.Lock()
+
+    async def connect(self, timeout: float = 0.) -> None:
+        """
+        Opens the connection, the broker is waited for `timeout` seconds.
+        """
+        async with self._connect_lock:
+            if self._writer is not None:
+                return
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    reader, self._writer = await asyncio.open_unix_connection(self._socket_path)
+                    break
+                except OSError:
+                    if time.monotonic() >= deadline:
+                        raise BrokerUnavailableException(self._socket_path)
+                    await asyncio.sleep(CONNECT_RETRY_INTERVAL)
+            self._read_task = asyncio.get_running_loop().create_task(self._read(reader))
+
+    async def call(self, target: str, method: str, *args, **kwargs) -> Any:
+        if self._writer is None:
+            await self.connect()
+
+        request_id = next(self._request_ids)
+        response = asyncio.get_running_loop().create_future()
+        self._responses[request_id] = response
+        try:
+            write_message(self._writer, (MESSAGE_REQUEST, request_id, target, method, args, kwargs))
+            return await response
+        finally:
+            self._responses.pop(request_id, None)
+
+    def subscribe(self, listener: TaskStatusListener) -> None:
+        self._status_listeners.append(listener)
+
+    def unsubscribe(self, listener: TaskStatusListener) -> None:
+        self._status_listeners.remove(listener)
+
+    async def close(self) -> None:
+        self._disconnect()
+        if self._read_task is not None:
+            self._read_task.cancel()
+            try:
+                await self._read_task
+            except asyncio.CancelledError:
+                pass
+            self._read_task = None
+
+    async def _read(self, reader: asyncio.StreamReader):
+        try:
+            while True:
+                kind, *message = await read_message(reader)
+                if kind == MESSAGE_RESPONSE:
+                    self._on_response(*message)
+                elif kind == MESSAGE_STATUS_EVENT:
+                    self._on_task_status_changed(*message)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            logger.error(f"Connection to the broker at `{self._socket_path}` is lost.")
+        finally:
+            self._disconnect()
+
+    def _on_response(self, request_id: int, is_success: bool, payload: Any):
+        response = self._responses.get(request_id)
+        if response is None or response.done():
+            return
+        if is_success:
+            response.set_result(payload)
+        else:
+            response.set_exception(payload)
+
+    def _on_task_status_changed(self, task_id: int, status: TaskStatus):
+        # listeners may unsubscribe while being notified
+        for listener in tuple(self._status_listeners):
+            try:
+                listener(task_id, status)
+            except Exception:
+                logger.exception(f"Status listener has failed on task id=`{task_id}`.")
+
+    def _disconnect(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for response in self._responses.values():
+            if not response.done():
+                response.set_exception(BrokerUnavailableException(self._socket_path))
+
+
+class RemoteTaskRepository(ITaskRepository):
+    def __init__(self, broker_connection: BrokerConnection):
+        self._broker_connection = broker_connection
+
+    async def create_task(self, input_data: str, priority: int = 0, tenant: Optional[str] = None) -> Task:
+        return await self._call("create_task", input_data, priority, tenant)
+
+    async def create_tasks(self, tasks: List[Task]) -> List[Task]:
+        return await self._call("create_tasks", tasks)
+
+    async def get_task(self, task_id: int) -> Task:
+        return await self._call("get_task", task_id)
+
+    async def get_tasks(self, task_ids: List[int]) -> Dict[int, Task]:
+        return await self._call("get_tasks", task_ids)
+
+    async def add_task_output_data(self, task_id: int, output_data: str) -> None:
+        await self._call("add_task_output_data", task_id, output_data)
+
+    async def add_task_output_path(self, task_id: int, output_path: str) -> None:
+        await self._call("add_task_output_path", task_id, output_path)
+
+    async def set_task_input_hash(self, task_id: int, input_hash: str) -> None:
+        await self._call("set_task_input_hash", task_id, input_hash)
+
+    async def set_tasks_input_hash(self, input_hashes: Dict[int, str]) -> None:
+        await self._call("set_tasks_input_hash", input_hashes)
+
+    async def set_task_profile(self, task_id: int, profile: bool) -> None:
+        await self._call("set_task_profile", task_id, profile)
+
+    async def set_task_timeout(self, task_id: int, timeout: Optional[float]) -> None:
+        await self._call("set_task_timeout", task_id, timeout)
+
+    async def set_task_resource_usage(self, task_id: int, resource_usage: TaskResourceUsage) -> None:
+        await self._call("set_task_resource_usage", task_id, resource_usage)
+
+    async def get_task_status(self, task_id: int) -> TaskStatus:
+        return await self._call("get_task_status", task_id)
+
+    async def get_tasks_statuses(self, task_ids: List[int]) -> Dict[int, TaskStatus]:
+        return await self._call("get_tasks_statuses", task_ids)
+
+    async def set_task_status(self, task_id: int, status: TaskStatus) -> None:
+        await self._call("set_task_status", task_id, status)
+
+    async def set_tasks_status(self, task_ids: List[int], status: TaskStatus) -> None:
+        await self._call("set_tasks_status", task_ids, status)
+
+    async def get_task_input_data(self, task_id: int) -> str:
+        return await self._call("get_task_input_data", task_id)
+
+    async def get_task_output_data(self, task_id: int) -> str:
+        return await self._call("get_task_output_data", task_id)
+
+    async def get_task_output_path(self, task_id: int) -> Optional[str]:
+        return await self._call("get_task_output_path", task_id)
+
+    async def query_tasks(
+            self,
+            status: TaskStatus,
+            limit: int,
+            since: Optional[float] = None,
+            cursor: Optional[int] = None
+    ) -> TaskPage:
+        return await self._call("query_tasks", status, limit, since, cursor)
+
+    async def count_tasks(self) -> Dict[TaskStatus, int]:
+        return await self._call("count_tasks")
+
+    def subscribe(self, listener: TaskStatusListener) -> None:
+        self._broker_connection.subscribe(listener)
+
+    def unsubscribe(self, listener: TaskStatusListener) -> None:
+        self._broker_connection.unsubscribe(listener)
+
+    def close(self) -> None:
+        # connection is shared with the queue and the listener, it is closed by its own context
+        pass
+
+    async def _call(self, method: str, *args) -> Any:
+        return await self._broker_connection.call(TARGET_REPOSITORY, method, *args)
+
+
+class RemoteTaskQueue(ITaskQueue):
+    def __init__(self, broker_connection: BrokerConnection):
+        self._broker_connection = broker_connection
+
+    async def put(self, task_id: int, priority: int = 0, tenant: Optional[str] = None) -> None:
+        await self._call("put", task_id, priority, tenant)
+
+    async def put_many(self, items: List[TaskQueueItem]) -> None:
+        await self._call("put_many", items)
+
+    async def cancel(self, task_id: int) -> None:
+        await self._call("cancel", task_id)
+
+    async def get_position(self, task_id: int) -> Optional[int]:
+        return await self._call("get_position", task_id)
+
+    async def size(self) -> int:
+        return await self._call("size")
+
+    async def is_empty(self) -> bool:
+        return await self._call("is_empty")
+
+    async def _call(self, method: str, *args) -> Any:
+        return await self._broker_connection.call(TARGET_QUEUE, method, *args)
+
+
+class RemoteTaskQueueListener(ITaskQueueListener):
+    """
+    Tasks are executed by the listener of the broker, so the limit of running tasks is shared by all workers.
+    """
+
+    def __init__(self, task_repository: ITaskRepository, task_queue: ITaskQueue, broker_connection: BrokerConnection):
+        self._task_repository = task_repository
+        self._task_queue = task_queue
+        self._broker_connection = broker_connection
+
+    async def listen(self):
+        pass
+
+    def stop(self):
+        pass
+
+    async def get_running_tasks_count(self) -> int:
+        return await self._broker_connection.call(TARGET_LISTENER, "get_running_tasks_count")
+
+    async def cancel_task(self, task_id: int) -> bool:
+        return await self._broker_connection.call(TARGET_LISTENER, "cancel_task", task_id)
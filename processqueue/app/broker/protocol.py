@@ -0,0 +1,34 @@
+import asyncio
+import pickle
+import struct
+from typing import Any
+
+__all__ = [
+    "MESSAGE_REQUEST",
+    "MESSAGE_RESPONSE",
+    "MESSAGE_STATUS_EVENT",
+    "read_message",
+    "write_message",
+]
+
+# every message is a pickled tuple prefixed by its length, the first item is the kind of the message:
+# `(MESSAGE_REQUEST, request_id, target, method, args, kwargs)`
+# `(MESSAGE_RESPONSE, request_id, is_success, result or exception)`
+# `(MESSAGE_STATUS_EVENT, task_id, status)`
+MESSAGE_REQUEST = 0
+MESSAGE_RESPONSE = 1
+MESSAGE_STATUS_EVENT = 2
+
+HEADER = struct.Struct("!I")
+
+
+async def read_message(reader: asyncio.StreamReader) -> tuple:
+    header = await reader.readexactly(HEADER.size)
+    (size,) = HEADER.unpack(header)
+    return pickle.loads(await reader.readexactly(size))
+
+
+def write_message(writer: asyncio.StreamWriter, message: Any) -> None:
+    # socket of the broker is accessible by its owner only, so pickle is safe here
+    body = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    writer.write(HEADER.pack(len(body)) + body)
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import pickle
+from typing import Dict
+from typing import FrozenSet
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from app.broker.protocol import MESSAGE_REQUEST
+from app.broker.protocol import MESSAGE_RESPONSE
+from app.broker.protocol import MESSAGE_STATUS_EVENT
+from app.broker.protocol import read_message
+from app.broker.protocol import write_message
+from app.domain.listener import ITaskQueueListener
+from app.domain.model import TaskStatus
+from app.domain.queue import ITaskQueue
+from app.domain.repository import ITaskRepository
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "BrokerServer",
+]
+
+SOCKET_MODE = 0o600
+
+TARGET_REPOSITORY = "repository"
+TARGET_QUEUE = "queue"
+TARGET_LISTENER = "listener"
+
+# methods which clients are allowed to call, the queue is consumed by the listener of the broker only
+REPOSITORY_METHODS = frozenset({
+    "create_task",
+    "create_tasks",
+    "get_task",
+    "get_tasks",
+    "add_task_output_data",
+    "add_task_output_path",
+    "set_task_input_hash",
+    "set_tasks_input_hash",
+    "set_task_profile",
+    "set_task_timeout",
+    "set_task_resource_usage",
+    "get_task_status",
+    "get_tasks_statuses",
+    "set_task_status",
+    "set_tasks_status",
+    "get_task_input_data",
+    "get_task_output_data",
+    "get_task_output_path",
+    "query_tasks",
+    "count_tasks",
+})
+QUEUE_METHODS = frozenset({"put", "put_many", "cancel", "get_position", "size", "is_empty"})
+LISTENER_METHODS = frozenset({"cancel_task", "get_running_tasks_count"})
+
+
+class BrokerServer:
+    """
+    Serves the repository, the queue and the listener of one process to HTTP workers over a Unix socket.
+
+    Every status change is pushed to all connected clients, so their waiters and event streams
+    see tasks changed by any worker. Requests of a connection are handled concurrently.
+    """
+
+    def __init__(
+            self,
+            task_repository: ITaskRepository,
+            task_queue: ITaskQueue,
+            task_queue_listener: ITaskQueueListener,
+            socket_path: str
+    ):
+        self._task_repository = task_repository
+        self._socket_path = socket_path
+        self._targets: Dict[str, Tuple[object, FrozenSet[str]]] = {
+            TARGET_REPOSITORY: (task_repository, REPOSITORY_METHODS),
+            TARGET_QUEUE: (task_queue, QUEUE_METHODS),
+            TARGET_LISTENER: (task_queue_listener, LISTENER_METHODS),
+        }
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._writers: Set[asyncio.StreamWriter] = set()
+        self._connections: Set[asyncio.Task] = set()
+        self._requests: Set[asyncio.Task] = set()
+
+    async def start(self) -> None:
+        # socket file of a previous broker is left when it was killed
+        try:
+            os.unlink(self._socket_path)
+        except FileNotFoundError:
+            pass
+        self._server = await asyncio.start_unix_server(self._handle_connection, path=self._socket_path)
+        # messages are unpickled, so only processes of the same user may connect
+        os.chmod(self._socket_path, SOCKET_MODE)
+        self._task_repository.subscribe(self._on_task_status_changed)
+        logger.info(f"Broker is listening on `{self._socket_path}`.")
+
+    async def close(self) -> None:
+        self._task_repository.unsubscribe(self._on_task_status_changed)
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        tasks = self._connections | self._requests
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            os.unlink(self._socket_path)
+        except FileNotFoundError:
+            pass
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._writers.add(writer)
+        self._connections.add(asyncio.current_task())
+        loop = asyncio.get_running_loop()
+        try:
+            while True:
+                kind, *request = await read_message(reader)
+                if kind != MESSAGE_REQUEST:
+                    logger.error(f"Broker has received unexpected message of kind `{kind}`.")
+                    break
+                handle_task = loop.create_task(self._handle_request(writer, *request))
+                self._requests.add(handle_task)
+                handle_task.add_done_callback(self._requests.discard)
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            self._connections.discard(asyncio.current_task())
+            self._writers.discard(writer)
+            writer.close()
+
+    async def _handle_request(
+            self,
+            writer: asyncio.StreamWriter,
+            request_id: int,
+            target: str,
+            method: str,
+            args: tuple,
+            kwargs: dict
+    ):
+        try:
+            instance, methods = self._targets[target]
+            if method not in methods:
+                raise AttributeError(f"Method `{target}.{method}` isn't served by the broker.")
+            response = (MESSAGE_RESPONSE, request_id, True, await getattr(instance, method)(*args, **kwargs))
+        except Exception as exception:
+            response = (MESSAGE_RESPONSE, request_id, False, exception)
+
+        if writer.is_closing():
+            return
+        try:
+            write_message(writer, response)
+        except (pickle.PicklingError, TypeError, AttributeError) as exception:
+            logger.exception(f"Unable to send response of `{target}.{method}`.")
+            write_message(writer, (MESSAGE_RESPONSE, request_id, False, RuntimeError(str(exception))))
+
+    def _on_task_status_changed(self, task_id: int, status: TaskStatus):
+        for writer in self._writers:
+            if not writer.is_closing():
+                write_message(writer, (MESSAGE_STATUS_EVENT, task_id, status))
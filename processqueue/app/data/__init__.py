@@ -1,5 +1,7 @@
+from app.data.repository import TaskRepositoryConfig
 from app.data.repository import build_task_repository
 
 __all__ = [
-    "build_task_repository"
+    "build_task_repository",
+    "TaskRepositoryConfig",
 ]
@@ -0,0 +1,142 @@
+import asyncio
+from collections import OrderedDict
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+
+from app.domain.model import TaskStatus
+from app.domain.repository import ITaskRepository
+from app.exceptions import TaskEventsOverflowException
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "TaskStatusEventBroadcaster",
+    "TaskStatusSubscription",
+]
+
+TaskStatusEvent = Tuple[int, TaskStatus]
+
+
+class TaskStatusSubscription:
+    """
+    Bounded buffer of status transitions for one subscriber.
+
+    Transitions of a task which hasn't been consumed yet are coalesced into the latest one.
+    When the buffer is full the subscription is overflowed and has to be dropped.
+    """
+
+    def __init__(
+            self,
+            task_ids: Optional[Set[int]],
+            statuses: Optional[Set[TaskStatus]],
+            max_buffered_events: int
+    ):
+        self.task_ids = task_ids
+        self.statuses = statuses
+        self._max_buffered_events = max_buffered_events
+        self._events: "OrderedDict[int, TaskStatus]" = OrderedDict()
+        self._has_events = asyncio.Event()
+        self.is_overflowed = False
+        self.is_closed = False
+
+    def push(self, task_id: int, status: TaskStatus) -> bool:
+        """
+        Returns `False` when the event doesn't fit into the buffer.
+        """
+        if self.statuses is not None and status not in self.statuses:
+            return True
+
+        if task_id not in self._events and len(self._events) >= self._max_buffered_events:
+            self.is_overflowed = True
+            self._has_events.set()
+            return False
+
+        self._events[task_id] = status
+        self._has_events.set()
+        return True
+
+    def close(self):
+        self.is_closed = True
+        self._has_events.set()
+
+    async def get(self) -> List[TaskStatusEvent]:
+        """
+        Waits for events and returns all buffered ones.
+
+        Returns an empty list when the subscription is closed.
+        """
+        await self._has_events.wait()
+        if self.is_overflowed:
+            raise TaskEventsOverflowException(self._max_buffered_events)
+
+        events = list(self._events.items())
+        self._events.clear()
+        if not self.is_closed:
+            self._has_events.clear()
+        return events
+
+
+class TaskStatusEventBroadcaster:
+    """
+    Fans status transitions from the repository out to many subscribers.
+
+    Publishing never waits for subscribers: slow ones are dropped when their buffer overflows.
+    """
+
+    def __init__(self, task_repository: ITaskRepository, max_buffered_events: int = 1024):
+        self._task_repository = task_repository
+        self._max_buffered_events = max_buffered_events
+        self._subscriptions_by_task_id: Dict[int, Set[TaskStatusSubscription]] = {}
+        self._all_tasks_subscriptions: Set[TaskStatusSubscription] = set()
+        self._task_repository.subscribe(self._on_task_status_changed)
+
+    def subscribe(
+            self,
+            task_ids: Optional[Set[int]] = None,
+            statuses: Optional[Set[TaskStatus]] = None
+    ) -> TaskStatusSubscription:
+        subscription = TaskStatusSubscription(task_ids, statuses, self._max_buffered_events)
+        if task_ids is None:
+            self._all_tasks_subscriptions.add(subscription)
+        else:
+            for task_id in task_ids:
+                self._subscriptions_by_task_id.setdefault(task_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: TaskStatusSubscription):
+        if subscription.task_ids is None:
+            self._all_tasks_subscriptions.discard(subscription)
+            return
+
+        for task_id in subscription.task_ids:
+            subscriptions = self._subscriptions_by_task_id.get(task_id)
+            if subscriptions is None:
+                continue
+            subscriptions.discard(subscription)
+            if not subscriptions:
+                del self._subscriptions_by_task_id[task_id]
+
+    def close(self):
+        for subscription in self._all_subscriptions():
+            subscription.close()
+
+    def _all_subscriptions(self) -> Set[TaskStatusSubscription]:
+        subscriptions = set(self._all_tasks_subscriptions)
+        for task_subscriptions in self._subscriptions_by_task_id.values():
+            subscriptions.update(task_subscriptions)
+        return subscriptions
+
+    def _on_task_status_changed(self, task_id: int, status: TaskStatus):
+        overflowed = [
+            subscription
+            for subscriptions in (self._all_tasks_subscriptions, self._subscriptions_by_task_id.get(task_id, ()))
+            for subscription in subscriptions
+            if not subscription.push(task_id, status)
+        ]
+        for subscription in overflowed:
+            logger.warning("Dropping slow subscriber of task status events.")
+            self.unsubscribe(subscription)
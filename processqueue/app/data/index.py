@@ -0,0 +1,143 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from app.domain.model import TaskPage
+from app.domain.model import TaskStatus
+
+__all__ = [
+    "build_task_status_index",
+    "TaskStatusIndex",
+]
+
+# status of a task is kept in one byte, zero means the task isn't indexed
+STATUSES = (None,) + tuple(TaskStatus)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES) if status is not None}
+# logs with less stale entries aren't compacted
+MIN_COMPACTED_STALE_ENTRIES = 1024
+
+
+class StatusLog:
+    """
+    Entries of tasks in order of entering the status.
+
+    Entry becomes stale when its task leaves the status, stale entries are skipped by queries
+    and dropped when they take more than half of the log.
+    """
+
+    def __init__(self):
+        self.sequence_numbers = array("q")
+        self.task_ids = array("q")
+        self.changed_at = array("d")
+        self.stale_count = 0
+
+    def append(self, sequence_number: int, task_id: int, changed_at: float):
+        self.sequence_numbers.append(sequence_number)
+        self.task_ids.append(task_id)
+        self.changed_at.append(changed_at)
+
+    def compact(self, task_sequence_numbers: array):
+        sequence_numbers = array("q")
+        task_ids = array("q")
+        changed_at = array("d")
+        for index, task_id in enumerate(self.task_ids):
+            if task_sequence_numbers[task_id] == self.sequence_numbers[index]:
+                sequence_numbers.append(self.sequence_numbers[index])
+                task_ids.append(task_id)
+                changed_at.append(self.changed_at[index])
+        self.sequence_numbers = sequence_numbers
+        self.task_ids = task_ids
+        self.changed_at = changed_at
+        self.stale_count = 0
+
+
+class TaskStatusIndex:
+    """
+    Per-status secondary index of tasks.
+
+    Every status change appends an entry with a growing sequence number to the log of the new status,
+    so queries walk only entries of the requested status from the newest one and cost O(result size).
+    Sequence number of the last entry is the cursor of the next page.
+    """
+
+    def __init__(self):
+        self._sequence_number = 0
+        self._logs: Dict[TaskStatus, StatusLog] = {status: StatusLog() for status in TaskStatus}
+        self._counts: Dict[TaskStatus, int] = {status: 0 for status in TaskStatus}
+        # current entry and status of every task, indexed by task id
+        self._task_sequence_numbers = array("q")
+        self._task_statuses = bytearray()
+
+    def set_status(self, task_id: int, status: TaskStatus, changed_at: float) -> None:
+        if task_id >= len(self._task_statuses):
+            missing = task_id + 1 - len(self._task_statuses)
+            self._task_statuses.extend(bytes(missing))
+            self._task_sequence_numbers.frombytes(bytes(missing * self._task_sequence_numbers.itemsize))
+
+        self._remove_entry(task_id)
+        self._sequence_number += 1
+        self._logs[status].append(self._sequence_number, task_id, changed_at)
+        self._task_sequence_numbers[task_id] = self._sequence_number
+        self._task_statuses[task_id] = STATUS_CODES[status]
+        self._counts[status] += 1
+
+    def remove(self, task_id: int) -> None:
+        if task_id < len(self._task_statuses):
+            self._remove_entry(task_id)
+
+    def count(self) -> Dict[TaskStatus, int]:
+        return dict(self._counts)
+
+    def query(
+            self,
+            status: TaskStatus,
+            limit: int,
+            since: Optional[float] = None,
+            cursor: Optional[int] = None
+    ) -> TaskPage:
+        """
+        Returns the tasks which entered the status at `since` or later, the most recent first.
+        """
+        log = self._logs[status]
+        position = len(log.sequence_numbers) if cursor is None else bisect_left(log.sequence_numbers, cursor)
+        task_ids: List[int] = []
+        last_sequence_number: Optional[int] = None
+        while position > 0 and len(task_ids) < limit:
+            position -= 1
+            if since is not None and log.changed_at[position] < since:
+                return TaskPage(task_ids, None)
+            task_id = log.task_ids[position]
+            if self._task_sequence_numbers[task_id] != log.sequence_numbers[position]:
+                continue
+            task_ids.append(task_id)
+            last_sequence_number = log.sequence_numbers[position]
+
+        next_cursor = last_sequence_number if position > 0 and len(task_ids) == limit else None
+        return TaskPage(task_ids, next_cursor)
+
+    def _remove_entry(self, task_id: int):
+        code = self._task_statuses[task_id]
+        if not code:
+            return
+
+        status = STATUSES[code]
+        self._counts[status] -= 1
+        self._task_statuses[task_id] = 0
+        self._task_sequence_numbers[task_id] = 0
+        log = self._logs[status]
+        log.stale_count += 1
+        if log.stale_count > MIN_COMPACTED_STALE_ENTRIES and log.stale_count * 2 > len(log.task_ids):
+            log.compact(self._task_sequence_numbers)
+
+
+def build_task_status_index(statuses: List[Tuple[int, TaskStatus, float]]) -> TaskStatusIndex:
+    """
+    Builds the index of tasks restored from a storage, the earliest status change is indexed first.
+    """
+    index = TaskStatusIndex()
+    for task_id, status, changed_at in sorted(statuses, key=lambda item: (item[2], item[0])):
+        index.set_status(task_id, status, changed_at)
+    return index
@@ -0,0 +1,93 @@
+import time
+from typing import Dict
+
+from app.domain.listener import ITaskQueueListener
+from app.domain.model import TaskStatus
+from app.domain.queue import ITaskQueue
+from app.domain.repository import ITaskRepository
+from app.metrics import MetricsRegistry
+
+__all__ = [
+    "TaskMetrics",
+]
+
+
+class TaskMetrics:
+    """
+    Records latencies of tasks from their status changes and collects gauges of the queue, slots and statuses.
+
+    Only the time of queueing and of the start of execution of tasks in flight is kept.
+    """
+
+    def __init__(
+            self,
+            metrics_registry: MetricsRegistry,
+            task_repository: ITaskRepository,
+            task_queue: ITaskQueue,
+            task_queue_listener: ITaskQueueListener,
+            max_running_tasks: int
+    ):
+        self._task_repository = task_repository
+        self._task_queue = task_queue
+        self._task_queue_listener = task_queue_listener
+        self._max_running_tasks = max_running_tasks
+
+        self._queue_wait_time = metrics_registry.histogram(
+            "processqueue_task_queue_wait_seconds",
+            "Time from queueing of a task to the start of its execution."
+        ).labels()
+        self._execution_time = metrics_registry.histogram(
+            "processqueue_task_execution_seconds",
+            "Time from the start of execution of a task to its final status.",
+            ("status",)
+        )
+        self._end_to_end_time = metrics_registry.histogram(
+            "processqueue_task_end_to_end_seconds",
+            "Time from queueing of a task to its final status.",
+            ("status",)
+        )
+        self._queue_depth = metrics_registry.gauge(
+            "processqueue_queue_depth",
+            "Amount of queued tasks."
+        )
+        self._slots = metrics_registry.gauge(
+            "processqueue_running_task_slots",
+            "Slots for running tasks.",
+            ("state",)
+        )
+        self._tasks = metrics_registry.gauge(
+            "processqueue_tasks",
+            "Amount of tasks by status.",
+            ("status",)
+        )
+        self._queued_at: Dict[int, float] = {}
+        self._started_at: Dict[int, float] = {}
+
+        metrics_registry.add_collect_callback(self._collect)
+        self._task_repository.subscribe(self._on_task_status_changed)
+
+    def _on_task_status_changed(self, task_id: int, status: TaskStatus):
+        now = time.monotonic()
+        if status is TaskStatus.QUEUED:
+            self._queued_at[task_id] = now
+            self._started_at.pop(task_id, None)
+        elif status is TaskStatus.RUNNING:
+            queued_at = self._queued_at.get(task_id)
+            if queued_at is not None:
+                self._queue_wait_time.observe(now - queued_at)
+            self._started_at[task_id] = now
+        elif status.is_terminal:
+            queued_at = self._queued_at.pop(task_id, None)
+            if queued_at is not None:
+                self._end_to_end_time.labels(status.value).observe(now - queued_at)
+            started_at = self._started_at.pop(task_id, None)
+            if started_at is not None:
+                self._execution_time.labels(status.value).observe(now - started_at)
+
+    async def _collect(self):
+        self._queue_depth.set(await self._task_queue.size())
+        running_tasks_count = await self._task_queue_listener.get_running_tasks_count()
+        self._slots.set(running_tasks_count, "used")
+        self._slots.set(self._max_running_tasks - running_tasks_count, "free")
+        for status, count in (await self._task_repository.count_tasks()).items():
+            self._tasks.set(count, status.value)
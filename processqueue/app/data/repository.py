@@ -1,51 +1,201 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from dataclasses import field
+from dataclasses import replace
+from pathlib import Path
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+from app.data.index import TaskStatusIndex
+from app.data.index import build_task_status_index
+from app.data.sqlite import SqliteRepositoryTaskDataStorage
+from app.data.sqlite import SqliteRepositoryTaskDataStorageConfig
 from app.data.storage import IRepositoryTaskDataStorage
 from app.data.storage import InMemoryRepositoryTaskDataStorage
+from app.data.storage import RetentionConfig
 from app.domain.model import Task
+from app.domain.model import TaskPage
+from app.domain.model import TaskResourceUsage
 from app.domain.model import TaskStatus
 from app.domain.repository import ITaskRepository
+from app.domain.repository import TaskStatusListener
 from app.exceptions import NoTaskOutputDataException
 from app.logger import get_logger
 
 logger = get_logger(__name__)
 
 __all__ = [
-    "build_task_repository"
+    "build_task_repository",
+    "TaskRepositoryConfig",
 ]
 
+STORAGE_TYPE_MEMORY = "memory"
+STORAGE_TYPE_SQLITE = "sqlite"
+
+
+@dataclass
+class TaskRepositoryConfig:
+    storage_type: str = STORAGE_TYPE_MEMORY
+    sqlite_config: SqliteRepositoryTaskDataStorageConfig = field(
+        default_factory=SqliteRepositoryTaskDataStorageConfig
+    )
+    # it is applied to the in-memory storage only
+    retention_config: RetentionConfig = field(default_factory=RetentionConfig)
+
+
+class TaskLocks:
+    """
+    Serializes read-modify-write of the same task, storages replace the whole task on every write.
+
+    Lock of a task exists only while somebody holds or waits for it.
+    """
 
-class InMemoryTaskRepository(ITaskRepository):
+    def __init__(self):
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._users: Dict[int, int] = {}
+
+    @asynccontextmanager
+    async def acquire(self, task_ids: Iterable[int]):
+        # locks are always taken in the same order, so batches never deadlock
+        acquired: List[int] = []
+        try:
+            for task_id in sorted(set(task_ids)):
+                lock = self._locks.get(task_id)
+                if lock is None:
+                    lock = self._locks[task_id] = asyncio.Lock()
+                self._users[task_id] = self._users.get(task_id, 0) + 1
+                try:
+                    await lock.acquire()
+                except BaseException:
+                    self._release_user(task_id)
+                    raise
+                acquired.append(task_id)
+            yield
+        finally:
+            for task_id in acquired:
+                self._locks[task_id].release()
+                self._release_user(task_id)
+
+    def _release_user(self, task_id: int):
+        self._users[task_id] -= 1
+        if not self._users[task_id]:
+            del self._users[task_id]
+            del self._locks[task_id]
+
+
+class TaskRepository(ITaskRepository):
     def __init__(self, task_data_storage: IRepositoryTaskDataStorage):
-        self._counter = 0
+        # counter is restored from the storage on the first task creation
+        self._counter: Optional[int] = None
         self._task_data_storage = task_data_storage
+        self._status_listeners: List[TaskStatusListener] = []
+        # index is restored from the storage on the first use
+        self._index: Optional[TaskStatusIndex] = None
+        self._task_locks = TaskLocks()
+        self._task_data_storage.set_removal_listener(self._on_tasks_removed)
 
-    async def create_task(self, input_data: str) -> Task:
+    async def create_task(self, input_data: str, priority: int = 0, tenant: Optional[str] = None) -> Task:
+        index = await self._get_index()
         task = Task(
-            task_id=self._counter,
+            task_id=await self._reserve_task_ids(1),
             status=TaskStatus.CREATED,
+            status_changed_at=time.time(),
             input_data=input_data,
-            output_data=None
+            output_data=None,
+            priority=priority,
+            tenant=tenant
         )
         await self._task_data_storage.put_task(task)
-        self._counter += 1
+        index.set_status(task.task_id, task.status, task.status_changed_at)
+        self._notify_status_listeners(task.task_id, task.status)
         return task
 
+    async def create_tasks(self, tasks: List[Task]) -> List[Task]:
+        index = await self._get_index()
+        first_task_id = await self._reserve_task_ids(len(tasks))
+        now = time.time()
+        for offset, task in enumerate(tasks):
+            task.task_id = first_task_id + offset
+            task.status = TaskStatus.CREATED
+            task.status_changed_at = now
+        await self._task_data_storage.put_tasks(tasks)
+        for task in tasks:
+            index.set_status(task.task_id, task.status, now)
+            self._notify_status_listeners(task.task_id, task.status)
+        return tasks
+
     async def get_task(self, task_id: int) -> Task:
         return await self._task_data_storage.get_task(task_id)
 
+    async def get_tasks(self, task_ids: List[int]) -> Dict[int, Task]:
+        return await self._task_data_storage.get_tasks(task_ids)
+
     async def add_task_output_data(self, task_id: int, output_data: str) -> None:
-        task = await self._task_data_storage.get_task(task_id)
-        task.output_data = output_data
-        await self._task_data_storage.put_task(task)
+        await self._update_task(task_id, output_data=output_data)
+
+    async def add_task_output_path(self, task_id: int, output_path: str) -> None:
+        await self._update_task(task_id, output_path=output_path)
+
+    async def set_task_input_hash(self, task_id: int, input_hash: str) -> None:
+        await self._update_task(task_id, input_hash=input_hash)
+
+    async def set_tasks_input_hash(self, input_hashes: Dict[int, str]) -> None:
+        async with self._task_locks.acquire(input_hashes):
+            tasks = await self._task_data_storage.get_tasks(list(input_hashes))
+            await self._task_data_storage.put_tasks([
+                replace(task, input_hash=input_hashes[task_id])
+                for task_id, task in tasks.items()
+            ])
+
+    async def set_task_profile(self, task_id: int, profile: bool) -> None:
+        await self._update_task(task_id, profile=profile)
+
+    async def set_task_timeout(self, task_id: int, timeout: Optional[float]) -> None:
+        await self._update_task(task_id, timeout=timeout)
+
+    async def set_task_resource_usage(self, task_id: int, resource_usage: TaskResourceUsage) -> None:
+        await self._update_task(task_id, resource_usage=resource_usage)
 
     async def get_task_status(self, task_id: int) -> TaskStatus:
         task = await self._task_data_storage.get_task(task_id)
         return task.status
 
+    async def get_tasks_statuses(self, task_ids: List[int]) -> Dict[int, TaskStatus]:
+        tasks = await self._task_data_storage.get_tasks(task_ids)
+        return {
+            task_id: task.status
+            for task_id, task in tasks.items()
+        }
+
     async def set_task_status(self, task_id: int, status: TaskStatus) -> None:
         logger.info(f"task_id={task_id}. status={status.value}")
-        task = await self._task_data_storage.get_task(task_id)
-        task.status = status
-        await self._task_data_storage.put_task(task)
+        index = await self._get_index()
+        async with self._task_locks.acquire([task_id]):
+            task = await self._task_data_storage.get_task(task_id)
+            task.status = status
+            task.status_changed_at = time.time()
+            await self._task_data_storage.put_task(task)
+            index.set_status(task_id, status, task.status_changed_at)
+        self._notify_status_listeners(task_id, status)
+
+    async def set_tasks_status(self, task_ids: List[int], status: TaskStatus) -> None:
+        logger.info(f"{len(task_ids)} tasks. status={status.value}")
+        index = await self._get_index()
+        async with self._task_locks.acquire(task_ids):
+            tasks = await self._task_data_storage.get_tasks(task_ids)
+            now = time.time()
+            for task in tasks.values():
+                task.status = status
+                task.status_changed_at = now
+            await self._task_data_storage.put_tasks(list(tasks.values()))
+            for task_id in tasks:
+                index.set_status(task_id, status, now)
+        for task_id in tasks:
+            self._notify_status_listeners(task_id, status)
 
     async def get_task_input_data(self, task_id: int) -> str:
         task = await self._task_data_storage.get_task(task_id)
@@ -53,12 +203,94 @@ class InMemoryTaskRepository(ITaskRepository):
 
     async def get_task_output_data(self, task_id: int) -> str:
         task = await self._task_data_storage.get_task(task_id)
-        if task.output_data is None:
+        if task.output_data is not None:
+            return task.output_data
+        if task.output_path is None:
             raise NoTaskOutputDataException(task_id)
 
-        return task.output_data
+        loop = asyncio.get_running_loop()
+        try:
+            return await loop.run_in_executor(None, Path(task.output_path).read_text)
+        except OSError:
+            logger.exception(f"Unable to load output data for task id=`{task_id}`.")
+            raise NoTaskOutputDataException(task_id)
+
+    async def get_task_output_path(self, task_id: int) -> Optional[str]:
+        task = await self._task_data_storage.get_task(task_id)
+        if task.output_data is None and task.output_path is None:
+            raise NoTaskOutputDataException(task_id)
+
+        return task.output_path
+
+    async def query_tasks(
+            self,
+            status: TaskStatus,
+            limit: int,
+            since: Optional[float] = None,
+            cursor: Optional[int] = None
+    ) -> TaskPage:
+        index = await self._get_index()
+        return index.query(status, limit, since, cursor)
+
+    async def count_tasks(self) -> Dict[TaskStatus, int]:
+        index = await self._get_index()
+        return index.count()
+
+    def subscribe(self, listener: TaskStatusListener) -> None:
+        self._status_listeners.append(listener)
+
+    def unsubscribe(self, listener: TaskStatusListener) -> None:
+        self._status_listeners.remove(listener)
+
+    def close(self) -> None:
+        self._task_data_storage.close()
+
+    async def _update_task(self, task_id: int, **changes) -> None:
+        async with self._task_locks.acquire([task_id]):
+            task = await self._task_data_storage.get_task(task_id)
+            await self._task_data_storage.put_task(replace(task, **changes))
+
+    def _notify_status_listeners(self, task_id: int, status: TaskStatus):
+        # listeners may unsubscribe while being notified
+        for listener in tuple(self._status_listeners):
+            try:
+                listener(task_id, status)
+            except Exception:
+                logger.exception(f"Status listener has failed on task id=`{task_id}`.")
+
+    async def _get_index(self) -> TaskStatusIndex:
+        if self._index is None:
+            task_statuses = await self._task_data_storage.get_task_statuses()
+            # another coroutine might restore the index in the meantime
+            if self._index is None:
+                self._index = build_task_status_index(task_statuses)
+        return self._index
+
+    def _on_tasks_removed(self, task_ids: List[int]):
+        if self._index is not None:
+            for task_id in task_ids:
+                self._index.remove(task_id)
+
+    async def _reserve_task_ids(self, count: int) -> int:
+        if self._counter is None:
+            last_task_id = await self._task_data_storage.get_last_task_id()
+            if self._counter is None:
+                self._counter = 0 if last_task_id is None else last_task_id + 1
+
+        # ids are reserved without any `await`, so concurrent requests never share them
+        first_task_id = self._counter
+        self._counter += count
+        return first_task_id
+
+
+def build_task_data_storage(config: TaskRepositoryConfig) -> IRepositoryTaskDataStorage:
+    if config.storage_type == STORAGE_TYPE_SQLITE:
+        return SqliteRepositoryTaskDataStorage(config.sqlite_config)
+    if config.storage_type == STORAGE_TYPE_MEMORY:
+        return InMemoryRepositoryTaskDataStorage(config.retention_config)
+    raise ValueError(f"Unknown task repository storage type `{config.storage_type}`.")
 
 
-def build_task_repository() -> ITaskRepository:
-    repository_task_data_storage = InMemoryRepositoryTaskDataStorage()
-    return InMemoryTaskRepository(repository_task_data_storage)
+def build_task_repository(config: TaskRepositoryConfig) -> ITaskRepository:
+    repository_task_data_storage = build_task_data_storage(config)
+    return TaskRepository(repository_task_data_storage)
@@ -0,0 +1,233 @@
+import asyncio
+import json
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Sequence
+from typing import Tuple
+
+from app.data.storage import IRepositoryTaskDataStorage
+from app.domain.model import Task
+from app.domain.model import TaskStatus
+from app.exceptions import NoSuchTaskException
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "SqliteRepositoryTaskDataStorage",
+    "SqliteRepositoryTaskDataStorageConfig",
+]
+
+CREATE_TASKS_TABLE = """
+CREATE TABLE IF NOT EXISTS tasks (
+    task_id INTEGER PRIMARY KEY,
+    status TEXT NOT NULL,
+    input_data TEXT,
+    output_data TEXT,
+    attributes TEXT NOT NULL
+)
+"""
+SELECT_TASK = "SELECT task_id, status, input_data, output_data, attributes FROM tasks WHERE task_id = ?"
+SELECT_LAST_TASK_ID = "SELECT MAX(task_id) FROM tasks"
+SELECT_TASK_STATUSES = (
+    "SELECT task_id, status, COALESCE(json_extract(attributes, '$.status_changed_at'), 0) FROM tasks"
+)
+UPSERT_TASK = """
+INSERT OR REPLACE INTO tasks (task_id, status, input_data, output_data, attributes)
+VALUES (?, ?, ?, ?, ?)
+"""
+# SQLite limits the number of host parameters of one statement
+MAX_SELECT_PARAMETERS = 500
+
+# columns which are stored separately, the rest of fields are stored as json
+TASK_COLUMNS = ("task_id", "status", "input_data", "output_data")
+
+TaskRow = Tuple[int, str, Optional[str], Optional[str], str]
+
+
+@dataclass
+class SqliteRepositoryTaskDataStorageConfig:
+    database_path: str = "tasks.sqlite3"
+    # writes arrived during this time after the first one are committed in one transaction
+    group_commit_window: float = 0.002
+    read_threads: int = 4
+    synchronous: str = "FULL"
+
+
+def task_to_row(task: Task) -> TaskRow:
+    attributes = task.to_dict(encode_json=True)
+    for column in TASK_COLUMNS:
+        attributes.pop(column)
+    return task.task_id, task.status.value, task.input_data, task.output_data, json.dumps(attributes)
+
+
+def row_to_task(row: TaskRow) -> Task:
+    task_id, status, input_data, output_data, attributes = row
+    task_data = json.loads(attributes)
+    task_data.update(task_id=task_id, status=status, input_data=input_data, output_data=output_data)
+    return Task.from_dict(task_data)
+
+
+class GroupCommitWriter:
+    """
+    Executes writes in a dedicated thread.
+
+    Writes which arrive while the thread waits for the group commit window
+    are committed in one transaction, so they share one fsync.
+    """
+
+    def __init__(self, config: SqliteRepositoryTaskDataStorageConfig):
+        self._config = config
+        self._writes: "queue.Queue[Optional[Tuple[Sequence[TaskRow], asyncio.Future]]]" = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="sqlite-writer", daemon=True)
+        self._thread.start()
+
+    async def write(self, rows: Sequence[TaskRow]) -> None:
+        loop = asyncio.get_running_loop()
+        committed = loop.create_future()
+        self._writes.put((rows, committed))
+        await committed
+
+    def close(self):
+        self._writes.put(None)
+        self._thread.join()
+
+    def _run(self):
+        connection = connect(self._config)
+        is_closed = False
+        while not is_closed:
+            group = [self._writes.get()]
+            deadline = time.monotonic() + self._config.group_commit_window
+            while group[-1] is not None:
+                timeout = deadline - time.monotonic()
+                try:
+                    group.append(self._writes.get(timeout=timeout) if timeout > 0 else self._writes.get_nowait())
+                except queue.Empty:
+                    break
+
+            if group[-1] is None:
+                group.pop()
+                is_closed = True
+
+            self._commit(connection, group)
+        connection.close()
+
+    def _commit(self, connection: sqlite3.Connection, group: List[Tuple[Sequence[TaskRow], asyncio.Future]]):
+        if not group:
+            return
+
+        error: Optional[Exception] = None
+        try:
+            with connection:
+                for rows, _ in group:
+                    connection.executemany(UPSERT_TASK, rows)
+        except Exception as exception:
+            logger.exception(f"Unable to commit {len(group)} writes.")
+            error = exception
+
+        for _, committed in group:
+            committed.get_loop().call_soon_threadsafe(resolve_future, committed, error)
+
+
+def resolve_future(future: asyncio.Future, error: Optional[Exception]):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+def connect(config: SqliteRepositoryTaskDataStorageConfig) -> sqlite3.Connection:
+    connection = sqlite3.connect(config.database_path, check_same_thread=False)
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute(f"PRAGMA synchronous={config.synchronous}")
+    return connection
+
+
+class SqliteRepositoryTaskDataStorage(IRepositoryTaskDataStorage):
+    """
+    Durable storage of tasks in SQLite database in WAL mode.
+
+    Reads are executed in a thread pool, writes are group-committed by `GroupCommitWriter`,
+    so the event loop never waits for the disk.
+    """
+
+    def __init__(self, config: SqliteRepositoryTaskDataStorageConfig):
+        self._config = config
+        with connect(self._config) as connection:
+            connection.execute(CREATE_TASKS_TABLE)
+        connection.close()
+
+        self._local = threading.local()
+        # connections of reader threads, they are closed together with the storage
+        self._read_connections: List[sqlite3.Connection] = []
+        self._read_connections_lock = threading.Lock()
+        self._read_executor = ThreadPoolExecutor(
+            max_workers=self._config.read_threads,
+            thread_name_prefix="sqlite-reader"
+        )
+        self._writer = GroupCommitWriter(self._config)
+
+    async def get_task(self, task_id: int) -> Task:
+        rows = await self._read(SELECT_TASK, (task_id,))
+        if not rows:
+            raise NoSuchTaskException(task_id)
+        return row_to_task(rows[0])
+
+    async def get_tasks(self, task_ids: List[int]) -> Dict[int, Task]:
+        tasks: Dict[int, Task] = {}
+        for start in range(0, len(task_ids), MAX_SELECT_PARAMETERS):
+            chunk = task_ids[start:start + MAX_SELECT_PARAMETERS]
+            placeholders = ", ".join("?" * len(chunk))
+            rows = await self._read(
+                f"SELECT task_id, status, input_data, output_data, attributes FROM tasks "
+                f"WHERE task_id IN ({placeholders})",
+                chunk
+            )
+            tasks.update((row[0], row_to_task(row)) for row in rows)
+        return tasks
+
+    async def get_last_task_id(self) -> Optional[int]:
+        rows = await self._read(SELECT_LAST_TASK_ID, ())
+        return rows[0][0]
+
+    async def get_task_statuses(self) -> List[Tuple[int, TaskStatus, float]]:
+        rows = await self._read(SELECT_TASK_STATUSES, ())
+        return [(task_id, TaskStatus(status), changed_at) for task_id, status, changed_at in rows]
+
+    async def put_task(self, task: Task):
+        await self._writer.write([task_to_row(task)])
+
+    async def put_tasks(self, tasks: List[Task]):
+        if tasks:
+            await self._writer.write([task_to_row(task) for task in tasks])
+
+    def close(self):
+        self._writer.close()
+        self._read_executor.shutdown(wait=True)
+        with self._read_connections_lock:
+            for connection in self._read_connections:
+                connection.close()
+            self._read_connections.clear()
+
+    async def _read(self, query: str, parameters: Sequence[Any]) -> List[tuple]:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, self._execute_read, query, parameters)
+
+    def _execute_read(self, query: str, parameters: Sequence[Any]) -> List[tuple]:
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = connect(self._config)
+            self._local.connection = connection
+            with self._read_connections_lock:
+                self._read_connections.append(connection)
+        return connection.execute(query, parameters).fetchall()
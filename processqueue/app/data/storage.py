@@ -1,14 +1,45 @@
 import abc
+import asyncio
+import json
+import time
+from array import array
+from collections import OrderedDict
+from dataclasses import astuple
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable
 from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
 
+from app.domain.model import TERMINAL_TASK_STATUSES
 from app.domain.model import Task
+from app.domain.model import TaskResourceUsage
+from app.domain.model import TaskStatus
+from app.exceptions import NoSuchTaskException
+from app.logger import get_logger
+
+logger = get_logger(__name__)
 
 __all__ = [
     "IRepositoryTaskDataStorage",
     "InMemoryRepositoryTaskDataStorage",
+    "RetentionConfig",
+    "TaskRemovalListener",
 ]
 
-from app.exceptions import NoSuchTaskException
+# called with ids of tasks which are removed by the storage itself
+TaskRemovalListener = Callable[[List[int]], None]
+
+# status is kept in one byte, zero means there is no task
+STATUSES = (None,) + tuple(TaskStatus)
+STATUS_CODES = {status: code for code, status in enumerate(STATUSES) if status is not None}
+STATUS_MASK = 0x7f
+# payload of the task is evicted to the spill folder
+SPILLED_FLAG = 0x80
+# only these tasks are evicted and removed, a cancelled task may be run again and needs its input
+FINAL_TASK_STATUSES = TERMINAL_TASK_STATUSES - {TaskStatus.CANCELLED}
 
 
 class IRepositoryTaskDataStorage(abc.ABC):
@@ -16,20 +47,429 @@ class IRepositoryTaskDataStorage(abc.ABC):
     async def get_task(self, task_id: int) -> Task:
         pass
 
+    @abc.abstractmethod
+    async def get_tasks(self, task_ids: List[int]) -> Dict[int, Task]:
+        pass
+
     @abc.abstractmethod
     async def put_task(self, task: Task):
         pass
 
+    @abc.abstractmethod
+    async def put_tasks(self, tasks: List[Task]):
+        pass
+
+    @abc.abstractmethod
+    async def get_last_task_id(self) -> Optional[int]:
+        pass
+
+    @abc.abstractmethod
+    async def get_task_statuses(self) -> List[Tuple[int, TaskStatus, float]]:
+        """
+        Returns id, status and the time of the last status change of every task.
+        """
+        pass
+
+    @abc.abstractmethod
+    def close(self):
+        pass
+
+    def set_removal_listener(self, listener: TaskRemovalListener) -> None:
+        # only storages which remove tasks by themselves report it
+        pass
+
+
+@dataclass
+class RetentionConfig:
+    # seconds after reaching a final status, then the payload of the task is evicted
+    ttl: Optional[float] = None
+    # payloads of the oldest finished tasks are evicted when payloads take more bytes
+    max_payload_bytes: Optional[int] = None
+    # the oldest finished tasks are removed completely when there are more tasks
+    max_tasks: Optional[int] = None
+    # evicted payloads are written to this folder instead of being dropped
+    spill_folder: Optional[str] = None
+
+
+class TaskPayload:
+    """
+    Fields of the task which may be large, they are kept only while the task is retained.
+    """
+    __slots__ = (
+        "input_data",
+        "output_data",
+        "output_path",
+        "input_path",
+        "input_size",
+        "input_checksum",
+        "input_hash",
+        "resource_usage",
+        "profile",
+        "timeout",
+        "size",
+    )
+
+    def __init__(
+            self,
+            input_data: str,
+            output_data: Optional[str],
+            output_path: Optional[str],
+            input_path: Optional[str],
+            input_size: Optional[int],
+            input_checksum: Optional[str],
+            input_hash: Optional[str],
+            # values of `TaskResourceUsage` fields, payloads spilled without it have no such item
+            resource_usage: Optional[List[float]] = None,
+            profile: bool = False,
+            timeout: Optional[float] = None
+    ):
+        self.input_data = input_data
+        self.output_data = output_data
+        self.output_path = output_path
+        self.input_path = input_path
+        self.input_size = input_size
+        self.input_checksum = input_checksum
+        self.input_hash = input_hash
+        self.resource_usage = resource_usage
+        self.profile = profile
+        self.timeout = timeout
+        self.size = sum(len(value) for value in self.to_list() if isinstance(value, str))
+
+    def to_list(self) -> list:
+        return [
+            self.input_data,
+            self.output_data,
+            self.output_path,
+            self.input_path,
+            self.input_size,
+            self.input_checksum,
+            self.input_hash,
+            self.resource_usage,
+            self.profile,
+            self.timeout,
+        ]
+
+
+def task_to_payload(task: Task) -> Optional[TaskPayload]:
+    payload = TaskPayload(
+        task.input_data,
+        task.output_data,
+        task.output_path,
+        task.input_path,
+        task.input_size,
+        task.input_checksum,
+        task.input_hash,
+        list(astuple(task.resource_usage)) if task.resource_usage is not None else None,
+        task.profile,
+        task.timeout,
+    )
+    return payload if any(payload.to_list()) else None
+
 
 class InMemoryRepositoryTaskDataStorage(IRepositoryTaskDataStorage):
-    def __init__(self):
-        self._task_id_to_task: Dict[int, Task] = {}
+    """
+    Keeps tasks in columns instead of `Task` objects.
+
+    Status, the time of its change, priority and tenant of every task are kept in arrays indexed by task id,
+    which takes 21 bytes per task.
+    Payload is kept in a dict only while the task is retained, so finished tasks with evicted payload
+    cost a few bytes each. `Task` objects are built on every read.
+    """
+
+    def __init__(self, retention_config: Optional[RetentionConfig] = None):
+        self._retention_config = retention_config or RetentionConfig()
+        self._statuses = bytearray()
+        self._priorities = array("q")
+        self._status_changed_at = array("d")
+        # tenants are repeated a lot, so tasks keep only codes of them
+        self._tenants = array("I")
+        self._tenant_names: List[Optional[str]] = [None]
+        self._tenant_codes: Dict[str, int] = {}
+        self._payloads: Dict[int, TaskPayload] = {}
+        self._payloads_size = 0
+        self._count = 0
+        # finished tasks which still hold payload, in order of finishing
+        self._finished_at: "OrderedDict[int, float]" = OrderedDict()
+        # finished tasks in order of finishing, they are kept only when the count of tasks is limited
+        self._finished_task_ids: "OrderedDict[int, None]" = OrderedDict()
+        self._is_enforcing_retention = False
+        self._removal_listener: Optional[TaskRemovalListener] = None
+        self._spill_folder = Path(self._retention_config.spill_folder) if self._retention_config.spill_folder else None
+        if self._spill_folder is not None:
+            self._spill_folder.mkdir(exist_ok=True, parents=True)
 
     async def get_task(self, task_id: int) -> Task:
-        try:
-            return self._task_id_to_task[task_id]
-        except KeyError:
-            raise NoSuchTaskException(task_id)
+        code = self._get_code(task_id)
+        payload = self._payloads.get(task_id)
+        if payload is None and code & SPILLED_FLAG:
+            loop = asyncio.get_running_loop()
+            payload = await loop.run_in_executor(None, self._load_payload, task_id)
+            # task might be changed or removed while its payload was loaded
+            code = self._get_code(task_id)
+            payload = self._payloads.get(task_id, payload)
+        return self._build_task(task_id, code, payload)
+
+    async def get_tasks(self, task_ids: List[int]) -> Dict[int, Task]:
+        tasks = {}
+        spilled_task_ids = []
+        for task_id in task_ids:
+            code = self._find_code(task_id)
+            if not code:
+                continue
+            payload = self._payloads.get(task_id)
+            if payload is None and code & SPILLED_FLAG:
+                spilled_task_ids.append(task_id)
+                continue
+            tasks[task_id] = self._build_task(task_id, code, payload)
+
+        if spilled_task_ids:
+            loop = asyncio.get_running_loop()
+            payloads = await loop.run_in_executor(None, self._load_payloads, spilled_task_ids)
+            for task_id, payload in zip(spilled_task_ids, payloads):
+                code = self._find_code(task_id)
+                if code:
+                    tasks[task_id] = self._build_task(task_id, code, self._payloads.get(task_id, payload))
+        return tasks
 
     async def put_task(self, task: Task):
-        self._task_id_to_task[task.task_id] = task
+        self._put(task, time.monotonic())
+        await self._enforce_retention()
+
+    async def put_tasks(self, tasks: List[Task]):
+        now = time.monotonic()
+        for task in tasks:
+            self._put(task, now)
+        await self._enforce_retention()
+
+    async def get_last_task_id(self) -> Optional[int]:
+        for task_id in range(len(self._statuses) - 1, -1, -1):
+            if self._statuses[task_id]:
+                return task_id
+        return None
+
+    async def get_task_statuses(self) -> List[Tuple[int, TaskStatus, float]]:
+        return [
+            (task_id, STATUSES[code & STATUS_MASK], self._status_changed_at[task_id])
+            for task_id, code in enumerate(self._statuses)
+            if code
+        ]
+
+    def close(self):
+        pass
+
+    def set_removal_listener(self, listener: TaskRemovalListener) -> None:
+        self._removal_listener = listener
+
+    def _find_code(self, task_id: int) -> int:
+        if 0 <= task_id < len(self._statuses):
+            return self._statuses[task_id]
+        return 0
+
+    def _get_code(self, task_id: int) -> int:
+        code = self._find_code(task_id)
+        if not code:
+            raise NoSuchTaskException(task_id)
+        return code
+
+    def _build_task(self, task_id: int, code: int, payload: Optional[TaskPayload]) -> Task:
+        task = Task(
+            task_id=task_id,
+            status=STATUSES[code & STATUS_MASK],
+            status_changed_at=self._status_changed_at[task_id] or None,
+            priority=self._priorities[task_id],
+            tenant=self._tenant_names[self._tenants[task_id]],
+        )
+        if payload is not None:
+            task.input_data = payload.input_data
+            task.output_data = payload.output_data
+            task.output_path = payload.output_path
+            task.input_path = payload.input_path
+            task.input_size = payload.input_size
+            task.input_checksum = payload.input_checksum
+            task.input_hash = payload.input_hash
+            if payload.resource_usage is not None:
+                task.resource_usage = TaskResourceUsage(*payload.resource_usage)
+            task.profile = payload.profile
+            task.timeout = payload.timeout
+        return task
+
+    def _put(self, task: Task, now: float):
+        task_id = task.task_id
+        if task_id >= len(self._statuses):
+            missing = task_id + 1 - len(self._statuses)
+            self._statuses.extend(bytes(missing))
+            self._priorities.frombytes(bytes(missing * self._priorities.itemsize))
+            self._status_changed_at.frombytes(bytes(missing * self._status_changed_at.itemsize))
+            self._tenants.frombytes(bytes(missing * self._tenants.itemsize))
+        code = self._statuses[task_id]
+        if not code:
+            self._count += 1
+        elif code & SPILLED_FLAG:
+            # the task comes with its whole payload, so the spilled copy is outdated
+            self._remove_payload_file(task_id)
+        self._statuses[task_id] = STATUS_CODES[task.status]
+        self._priorities[task_id] = task.priority
+        self._status_changed_at[task_id] = task.status_changed_at or 0.
+        self._tenants[task_id] = self._get_tenant_code(task.tenant)
+
+        self._drop_payload(task_id)
+        payload = task_to_payload(task)
+        if payload is not None:
+            self._payloads[task_id] = payload
+            self._payloads_size += payload.size
+        if payload is not None and task.status in FINAL_TASK_STATUSES:
+            self._finished_at.setdefault(task_id, now)
+        else:
+            self._finished_at.pop(task_id, None)
+        if task.status in FINAL_TASK_STATUSES and self._retention_config.max_tasks is not None:
+            self._finished_task_ids.setdefault(task_id, None)
+        else:
+            self._finished_task_ids.pop(task_id, None)
+
+    def _get_tenant_code(self, tenant: Optional[str]) -> int:
+        if tenant is None:
+            return 0
+        code = self._tenant_codes.get(tenant)
+        if code is None:
+            code = len(self._tenant_names)
+            self._tenant_names.append(tenant)
+            self._tenant_codes[tenant] = code
+        return code
+
+    def _drop_payload(self, task_id: int):
+        payload = self._payloads.pop(task_id, None)
+        if payload is not None:
+            self._payloads_size -= payload.size
+
+    def _remove(self, task_id: int):
+        self._statuses[task_id] = 0
+        self._priorities[task_id] = 0
+        self._status_changed_at[task_id] = 0.
+        self._tenants[task_id] = 0
+        self._drop_payload(task_id)
+        self._finished_at.pop(task_id, None)
+        self._finished_task_ids.pop(task_id, None)
+        self._count -= 1
+
+    async def _enforce_retention(self):
+        # concurrent writers leave the work to the one which is already spilling
+        if self._is_enforcing_retention:
+            return
+        self._is_enforcing_retention = True
+        try:
+            await self._evict_payloads()
+            await self._remove_tasks()
+        finally:
+            self._is_enforcing_retention = False
+
+    async def _evict_payloads(self):
+        ttl = self._retention_config.ttl
+        max_payload_bytes = self._retention_config.max_payload_bytes
+        if ttl is None and max_payload_bytes is None:
+            return
+
+        now = time.monotonic()
+        payloads_size = self._payloads_size
+        evicted: List[Tuple[int, TaskPayload]] = []
+        for task_id, finished_at in self._finished_at.items():
+            is_expired = ttl is not None and finished_at + ttl <= now
+            is_over_budget = max_payload_bytes is not None and payloads_size > max_payload_bytes
+            if not is_expired and not is_over_budget:
+                break
+            payload = self._payloads[task_id]
+            evicted.append((task_id, payload))
+            payloads_size -= payload.size
+        if not evicted:
+            return
+
+        for task_id, _ in evicted:
+            del self._finished_at[task_id]
+        if self._spill_folder is not None:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._save_payloads, evicted)
+
+        uploads = []
+        for task_id, payload in evicted:
+            # task might be changed while payloads were written, its spilled copy is outdated then
+            if self._payloads.get(task_id) is not payload:
+                if self._spill_folder is not None:
+                    self._remove_payload_file(task_id)
+                continue
+            self._drop_payload(task_id)
+            if self._spill_folder is not None:
+                self._statuses[task_id] |= SPILLED_FLAG
+            elif payload.input_path is not None:
+                uploads.append(payload.input_path)
+        logger.info(f"Payloads of {len(evicted)} finished tasks are evicted.")
+        if uploads:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._remove_files, uploads, [])
+
+    async def _remove_tasks(self):
+        max_tasks = self._retention_config.max_tasks
+        if max_tasks is None:
+            return
+
+        # tasks finished first are removed first, unfinished tasks are never removed
+        removed_task_ids = []
+        uploads = []
+        spilled_task_ids = []
+        while self._count > max_tasks and self._finished_task_ids:
+            task_id = next(iter(self._finished_task_ids))
+            payload = self._payloads.get(task_id)
+            if payload is not None and payload.input_path is not None:
+                uploads.append(payload.input_path)
+            if self._statuses[task_id] & SPILLED_FLAG:
+                spilled_task_ids.append(task_id)
+            self._remove(task_id)
+            removed_task_ids.append(task_id)
+        if not removed_task_ids:
+            return
+
+        logger.info(f"{len(removed_task_ids)} finished tasks are removed.")
+        if self._removal_listener is not None:
+            self._removal_listener(removed_task_ids)
+        if uploads or spilled_task_ids:
+            loop = asyncio.get_running_loop()
+            await loop.run_in_executor(None, self._remove_files, uploads, spilled_task_ids)
+
+    def _get_payload_path(self, task_id: int) -> Path:
+        return self._spill_folder / f"{task_id % 256:02x}" / f"{task_id}.json"
+
+    def _save_payloads(self, payloads: List[Tuple[int, TaskPayload]]):
+        for task_id, payload in payloads:
+            path_to_file = self._get_payload_path(task_id)
+            path_to_file.parent.mkdir(exist_ok=True)
+            path_to_file.write_text(json.dumps(payload.to_list()))
+
+    def _load_payload(self, task_id: int) -> Optional[TaskPayload]:
+        try:
+            return TaskPayload(*json.loads(self._get_payload_path(task_id).read_text()))
+        except OSError:
+            logger.exception(f"Unable to load payload of task id=`{task_id}`.")
+            return None
+
+    def _load_payloads(self, task_ids: List[int]) -> List[Optional[TaskPayload]]:
+        return [self._load_payload(task_id) for task_id in task_ids]
+
+    def _remove_files(self, uploads: List[str], spilled_task_ids: List[int]):
+        """
+        Removes uploaded inputs and spilled payloads which are referenced by dropped payloads only.
+        """
+        uploads = list(uploads)
+        for task_id in spilled_task_ids:
+            payload = self._load_payload(task_id)
+            if payload is not None and payload.input_path is not None:
+                uploads.append(payload.input_path)
+            self._remove_payload_file(task_id)
+        for upload in uploads:
+            try:
+                Path(upload).unlink()
+            except FileNotFoundError:
+                pass
+
+    def _remove_payload_file(self, task_id: int):
+        try:
+            self._get_payload_path(task_id).unlink()
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,62 @@
+import asyncio
+from typing import Dict
+from typing import Set
+
+from app.domain.model import TaskStatus
+from app.domain.repository import ITaskRepository
+
+__all__ = [
+    "TaskStatusWaiter"
+]
+
+
+class TaskStatusWaiter:
+    """
+    Lets many requests wait until tasks reach a terminal status.
+
+    It is notified by the repository on every status change,
+    so waiting requests neither poll the repository nor scan all waiters.
+    """
+
+    def __init__(self, task_repository: ITaskRepository):
+        self._task_repository = task_repository
+        self._waiters: Dict[int, Set[asyncio.Future]] = {}
+        self._task_repository.subscribe(self._on_task_status_changed)
+
+    async def wait_for_terminal_status(self, task_id: int, timeout: float) -> TaskStatus:
+        """
+        Returns the terminal status of the task as soon as it is reached,
+        or the current status when the timeout expires.
+        """
+        loop = asyncio.get_running_loop()
+        waiter = loop.create_future()
+        # waiter is registered before reading the status, so a change between them isn't lost
+        self._waiters.setdefault(task_id, set()).add(waiter)
+        try:
+            status = await self._task_repository.get_task_status(task_id)
+            if status.is_terminal:
+                return status
+
+            try:
+                return await asyncio.wait_for(waiter, timeout)
+            except asyncio.TimeoutError:
+                return await self._task_repository.get_task_status(task_id)
+        finally:
+            self._remove_waiter(task_id, waiter)
+
+    def _on_task_status_changed(self, task_id: int, status: TaskStatus):
+        if not status.is_terminal:
+            return
+
+        for waiter in self._waiters.pop(task_id, ()):
+            if not waiter.done():
+                waiter.set_result(status)
+
+    def _remove_waiter(self, task_id: int, waiter: asyncio.Future):
+        waiters = self._waiters.get(task_id)
+        if waiters is None:
+            return
+
+        waiters.discard(waiter)
+        if not waiters:
+            del self._waiters[task_id]
@@ -17,3 +17,15 @@ class ITaskQueueListener(abc.ABC):
     @abc.abstractmethod
     def stop(self):
         pass
+
+    @abc.abstractmethod
+    async def get_running_tasks_count(self) -> int:
+        pass
+
+    @abc.abstractmethod
+    async def cancel_task(self, task_id: int) -> bool:
+        """
+        Stops execution of a running task and frees its slot.
+        Returns `False` when the task isn't running.
+        """
+        pass
@@ -1,5 +1,6 @@
 from dataclasses import dataclass
 from enum import Enum
+from typing import List
 from typing import Optional
 
 from dataclasses_json import dataclass_json
@@ -12,6 +13,37 @@ class TaskStatus(Enum):
     CANCELLED = "CANCELLED"
     SUCCESS = "SUCCESS"
     FAILURE = "FAILURE"
+    # execution has been killed after the deadline of the task
+    TIMEOUT = "TIMEOUT"
+
+    @property
+    def is_terminal(self) -> bool:
+        return self in TERMINAL_TASK_STATUSES
+
+
+TERMINAL_TASK_STATUSES = frozenset({
+    TaskStatus.CANCELLED,
+    TaskStatus.SUCCESS,
+    TaskStatus.FAILURE,
+    TaskStatus.TIMEOUT,
+})
+
+
+@dataclass_json
+@dataclass
+class TaskResourceUsage:
+    """
+    Resources spent by a worker process on one run of the task.
+    """
+    # seconds
+    wall_time: float = 0.
+    cpu_user_time: float = 0.
+    cpu_system_time: float = 0.
+    # bytes, peak resident set size of the worker during the run
+    max_rss: int = 0
+    # bytes fetched from and sent to the storage layer
+    read_bytes: int = 0
+    write_bytes: int = 0
 
 
 @dataclass_json
@@ -19,5 +51,30 @@ class TaskStatus(Enum):
 class Task:
     task_id: int = 0
     status: TaskStatus = TaskStatus.CREATED
+    # unix time of the last status change
+    status_changed_at: Optional[float] = None
     input_data: str = ""
+    # uploaded input stays on disk, repository keeps only the path, the size and the sha256 checksum
+    input_path: Optional[str] = None
+    input_size: Optional[int] = None
+    input_checksum: Optional[str] = None
     output_data: Optional[str] = None
+    # output of executed task stays on disk, repository keeps only the path to it
+    output_path: Optional[str] = None
+    # key of the result cache, it is set when the task is run with enabled cache
+    input_hash: Optional[str] = None
+    priority: int = 0
+    tenant: Optional[str] = None
+    # the next run of the task is executed under the profiler
+    profile: bool = False
+    # seconds the run may take before it is killed, the default of the execution config is used when it is not set
+    timeout: Optional[float] = None
+    # it is set when a worker has finished the task run
+    resource_usage: Optional[TaskResourceUsage] = None
+
+
+@dataclass
+class TaskPage:
+    task_ids: List[int]
+    # `None` when there are no more tasks
+    next_cursor: Optional[int] = None
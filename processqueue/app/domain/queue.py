@@ -1,4 +1,7 @@
 import abc
+from dataclasses import dataclass
+from typing import List
+from typing import Optional
 
 from app.logger import get_logger
 
@@ -6,27 +9,60 @@ logger = get_logger(__name__)
 
 
 __all__ = [
-    "ITaskQueue"
+    "IConsumableTaskQueue",
+    "ITaskQueue",
+    "TaskQueueItem",
 ]
 
+
+@dataclass
+class TaskQueueItem:
+    task_id: int
+    # tasks with higher priority are dequeued first
+    priority: int = 0
+    # tasks of the same priority are shared fairly between tenants
+    tenant: Optional[str] = None
+
+
 class ITaskQueue(abc.ABC):
 
     @abc.abstractmethod
-    async def put(self, task_id: int) -> None:
+    async def put(self, task_id: int, priority: int = 0, tenant: Optional[str] = None) -> None:
         pass
 
     @abc.abstractmethod
-    async def get(self) -> int:
+    async def put_many(self, items: List[TaskQueueItem]) -> None:
         pass
 
     @abc.abstractmethod
     async def cancel(self, task_id: int) -> None:
+        """
+        Removes the task from the queue, it is never dequeued.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def get_position(self, task_id: int) -> Optional[int]:
+        """
+        Returns the amount of tasks which will be dequeued before the task
+        or `None` when the task isn't queued.
+        """
         pass
 
     @abc.abstractmethod
-    async def is_task_cancelled(self, task_id: int) -> bool:
+    async def size(self) -> int:
         pass
 
     @abc.abstractmethod
-    def is_empty(self) -> bool:
+    async def is_empty(self) -> bool:
+        pass
+
+
+class IConsumableTaskQueue(ITaskQueue):
+    """
+    Queue which is consumed in this process, clients of a shared queue only put and cancel tasks.
+    """
+
+    @abc.abstractmethod
+    async def get(self) -> int:
         pass
@@ -1,36 +1,98 @@
 import abc
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
 
 from app.domain.model import Task
+from app.domain.model import TaskPage
+from app.domain.model import TaskResourceUsage
 from app.domain.model import TaskStatus
 
 
 __all__ = [
-    "ITaskRepository"
+    "ITaskRepository",
+    "TaskStatusListener",
 ]
 
+# called with task id and its new status right after the status is stored
+TaskStatusListener = Callable[[int, TaskStatus], None]
+
 
 class ITaskRepository(abc.ABC):
 
     @abc.abstractmethod
-    async def create_task(self, input_data: str) -> Task:
+    async def create_task(self, input_data: str, priority: int = 0, tenant: Optional[str] = None) -> Task:
+        pass
+
+    @abc.abstractmethod
+    async def create_tasks(self, tasks: List[Task]) -> List[Task]:
+        """
+        Stores new tasks built by a caller, ids and `CREATED` status are assigned by the repository.
+        """
         pass
 
     @abc.abstractmethod
     async def get_task(self, task_id: int) -> Task:
         pass
 
+    @abc.abstractmethod
+    async def get_tasks(self, task_ids: List[int]) -> Dict[int, Task]:
+        """
+        Returns existing tasks, unknown task ids are skipped.
+        """
+        pass
+
     @abc.abstractmethod
     async def add_task_output_data(self, task_id: int, output_data: str) -> None:
         pass
 
+    @abc.abstractmethod
+    async def add_task_output_path(self, task_id: int, output_path: str) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def set_task_input_hash(self, task_id: int, input_hash: str) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def set_tasks_input_hash(self, input_hashes: Dict[int, str]) -> None:
+        """
+        Sets input hashes by task id, unknown task ids are skipped.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def set_task_profile(self, task_id: int, profile: bool) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def set_task_timeout(self, task_id: int, timeout: Optional[float]) -> None:
+        pass
+
+    @abc.abstractmethod
+    async def set_task_resource_usage(self, task_id: int, resource_usage: TaskResourceUsage) -> None:
+        pass
+
     @abc.abstractmethod
     async def get_task_status(self, task_id: int) -> TaskStatus:
         pass
 
+    @abc.abstractmethod
+    async def get_tasks_statuses(self, task_ids: List[int]) -> Dict[int, TaskStatus]:
+        """
+        Returns statuses of existing tasks, unknown task ids are skipped.
+        """
+        pass
+
     @abc.abstractmethod
     async def set_task_status(self, task_id: int, status: TaskStatus) -> None:
         pass
 
+    @abc.abstractmethod
+    async def set_tasks_status(self, task_ids: List[int], status: TaskStatus) -> None:
+        pass
+
     @abc.abstractmethod
     async def get_task_input_data(self, task_id: int) -> str:
         pass
@@ -38,3 +100,40 @@ class ITaskRepository(abc.ABC):
     @abc.abstractmethod
     async def get_task_output_data(self, task_id: int) -> str:
         pass
+
+    @abc.abstractmethod
+    async def get_task_output_path(self, task_id: int) -> Optional[str]:
+        """
+        Returns the path to the output file, `None` when output data is kept in the repository itself.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def query_tasks(
+            self,
+            status: TaskStatus,
+            limit: int,
+            since: Optional[float] = None,
+            cursor: Optional[int] = None
+    ) -> TaskPage:
+        """
+        Returns ids of tasks with the status, the most recently changed first.
+        `since` is unix time, tasks which got the status earlier are skipped.
+        """
+        pass
+
+    @abc.abstractmethod
+    async def count_tasks(self) -> Dict[TaskStatus, int]:
+        pass
+
+    @abc.abstractmethod
+    def close(self) -> None:
+        pass
+
+    @abc.abstractmethod
+    def subscribe(self, listener: TaskStatusListener) -> None:
+        pass
+
+    @abc.abstractmethod
+    def unsubscribe(self, listener: TaskStatusListener) -> None:
+        pass
@@ -11,3 +11,43 @@ class NoTaskOutputDataException(Exception):
 class IncorrectTaskOperationException(Exception):
     def __init__(self, task_id: int):
         self.message = f"Task id=`{task_id}` has incorrect status for handling this operation."
+
+
+class NoTaskProfileException(Exception):
+    def __init__(self, task_id: int):
+        self.message = f"There is no profile for task with such id = `{task_id}`."
+
+
+class NoTaskResourceUsageException(Exception):
+    def __init__(self, task_id: int):
+        self.message = f"There is no resource usage for task with such id = `{task_id}`."
+
+
+class TaskExecutionException(Exception):
+    def __init__(self, task_id: int):
+        self.message = f"Execution of task id=`{task_id}` has failed."
+
+
+class WorkerExitedException(Exception):
+    def __init__(self, task_id: int, exitcode: int):
+        self.message = f"Worker executing task id=`{task_id}` has exited with code `{exitcode}`."
+
+
+class TaskEventsOverflowException(Exception):
+    def __init__(self, max_buffered_events: int):
+        self.message = f"Subscriber has not consumed more than `{max_buffered_events}` task events in time."
+
+
+class InputDataTooLargeException(Exception):
+    def __init__(self, max_size: int):
+        self.message = f"Input data is larger than `{max_size}` bytes."
+
+
+class BrokerUnavailableException(Exception):
+    def __init__(self, socket_path: str):
+        self.message = f"Broker at `{socket_path}` is unavailable."
+
+
+class TaskLeaseExpiredException(Exception):
+    def __init__(self, lease_id: str):
+        self.message = f"Lease `{lease_id}` has expired or has been revoked."
@@ -0,0 +1,199 @@
+import asyncio
+import hashlib
+import os
+import secrets
+import shutil
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Optional
+
+from app.exceptions import NoTaskOutputDataException
+from app.execution.storage import ExecutorTaskDataStorageConfig
+from app.execution.storage import IExecutorTaskDataStorage
+from app.execution.storage import build_executor_task_data_storage
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "build_result_cache",
+    "ResultCache",
+    "ResultCacheConfig",
+    "ResultCacheStats",
+]
+
+DEFAULT_CACHE_FOLDER = Path(__file__).parent / "result_cache"
+
+
+@dataclass
+class ResultCacheConfig:
+    enabled: bool = False
+    # changes of the executor must change the version, otherwise stale results are served
+    executor_version: str = "1"
+    # `None` means `result_cache` folder next to this module
+    cache_folder: Optional[str] = None
+    disk_max_bytes: int = 1024 * 1024 * 1024
+    # `None` means results never expire
+    ttl: Optional[float] = None
+    io_threads: int = 2
+
+
+@dataclass
+class ResultCacheStats:
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+
+
+@dataclass
+class DiskEntry:
+    size: int
+    expires_at: float
+
+
+class ResultCache:
+    """
+    Cache of task outputs keyed by the hash of input data and the executor version.
+
+    Every output is kept as a file which is hard-linked into the task data folder on a hit,
+    so a hit costs no copying. Files are LRU ordered and bounded by size.
+    Index is changed only in the event loop, file operations run in a thread pool.
+    """
+
+    def __init__(self, config: ResultCacheConfig, executor_task_data_storage: IExecutorTaskDataStorage):
+        self._config = config
+        self._executor_task_data_storage = executor_task_data_storage
+        self._cache_folder = Path(config.cache_folder) if config.cache_folder else DEFAULT_CACHE_FOLDER
+        self._cache_folder.mkdir(exist_ok=True, parents=True)
+        self._executor = ThreadPoolExecutor(max_workers=config.io_threads, thread_name_prefix="result-cache")
+        self._disk_entries: "OrderedDict[str, DiskEntry]" = OrderedDict()
+        self._disk_size = 0
+        self.stats = ResultCacheStats()
+        self._load_disk_entries()
+
+    async def get_key(self, input_data: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._hash, input_data)
+
+    def get_checksum_key(self, input_checksum: str) -> str:
+        """
+        Returns the key of the input by its sha256, so uploaded inputs aren't read again.
+        """
+        digest = hashlib.sha256(self._config.executor_version.encode())
+        digest.update(b"\0")
+        digest.update(input_checksum.encode())
+        return digest.hexdigest()
+
+    async def restore(self, task_id: int, key: str) -> Optional[Path]:
+        """
+        Makes the cached output the output of the task, returns the output path or `None` on a miss.
+        """
+        loop = asyncio.get_running_loop()
+        now = time.time()
+
+        disk_entry = self._disk_entries.get(key)
+        if disk_entry is not None and disk_entry.expires_at <= now:
+            self._evict_from_disk(key)
+            disk_entry = None
+        if disk_entry is not None:
+            self._disk_entries.move_to_end(key)
+            try:
+                output_path = await loop.run_in_executor(
+                    self._executor, self._executor_task_data_storage.link_output_data, task_id, self._get_path(key)
+                )
+                self.stats.hits += 1
+                return output_path
+            except NoTaskOutputDataException:
+                # file is removed outside of the cache
+                if key in self._disk_entries:
+                    self._disk_size -= self._disk_entries.pop(key).size
+
+        self.stats.misses += 1
+        return None
+
+    async def put(self, key: str, output_path: Path) -> None:
+        loop = asyncio.get_running_loop()
+        try:
+            size = await loop.run_in_executor(self._executor, self._store, key, output_path)
+        except OSError:
+            logger.exception(f"Unable to cache output {output_path}.")
+            return
+
+        expires_at = time.time() + self._config.ttl if self._config.ttl is not None else float("inf")
+        if key in self._disk_entries:
+            self._disk_size -= self._disk_entries.pop(key).size
+        self._disk_entries[key] = DiskEntry(size, expires_at)
+        self._disk_size += size
+        while self._disk_size > self._config.disk_max_bytes and self._disk_entries:
+            self._evict_from_disk(next(iter(self._disk_entries)))
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    def _hash(self, input_data: str) -> str:
+        return self.get_checksum_key(hashlib.sha256(input_data.encode()).hexdigest())
+
+    def _get_path(self, key: str) -> Path:
+        return self._cache_folder / key[:2] / key
+
+    def _store(self, key: str, output_path: Path) -> int:
+        path_to_file = self._get_path(key)
+        path_to_file.parent.mkdir(exist_ok=True, parents=True)
+        path_to_tmp_file = path_to_file.with_name(f".{key}.{secrets.token_hex(16)}.tmp")
+        try:
+            try:
+                os.link(str(output_path), str(path_to_tmp_file))
+            except OSError:
+                shutil.copyfile(str(output_path), str(path_to_tmp_file))
+            os.replace(str(path_to_tmp_file), str(path_to_file))
+        except BaseException:
+            self._remove(path_to_tmp_file)
+            raise
+
+        return path_to_file.stat().st_size
+
+    def _evict_from_disk(self, key: str):
+        self._disk_size -= self._disk_entries.pop(key).size
+        self.stats.evictions += 1
+        try:
+            self._executor.submit(self._remove, self._get_path(key))
+        except RuntimeError:
+            # cache is closed while the output of a finishing task is being stored
+            self._remove(self._get_path(key))
+
+    def _remove(self, path_to_file: Path):
+        try:
+            path_to_file.unlink()
+        except FileNotFoundError:
+            pass
+
+    def _load_disk_entries(self):
+        # files left by the previous run, the oldest ones are evicted first
+        ttl = self._config.ttl if self._config.ttl is not None else float("inf")
+        files = [
+            (path_to_file.stat(), path_to_file)
+            for path_to_file in self._cache_folder.glob("*/*")
+            if not path_to_file.name.startswith(".")
+        ]
+        files.sort(key=lambda file: file[0].st_mtime)
+        for stat, path_to_file in files:
+            self._disk_entries[path_to_file.name] = DiskEntry(stat.st_size, stat.st_mtime + ttl)
+            self._disk_size += stat.st_size
+        # the limit might be lowered since the previous run
+        while self._disk_size > self._config.disk_max_bytes and self._disk_entries:
+            key, disk_entry = self._disk_entries.popitem(last=False)
+            self._disk_size -= disk_entry.size
+            self.stats.evictions += 1
+            self._remove(self._get_path(key))
+
+
+def build_result_cache(
+        config: ResultCacheConfig,
+        executor_task_data_storage_config: ExecutorTaskDataStorageConfig
+) -> Optional[ResultCache]:
+    if not config.enabled:
+        return None
+    return ResultCache(config, build_executor_task_data_storage(executor_task_data_storage_config))
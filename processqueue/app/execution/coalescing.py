@@ -0,0 +1,178 @@
+import asyncio
+import hashlib
+from collections import OrderedDict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+
+from app.domain.model import Task
+from app.domain.model import TaskStatus
+from app.domain.queue import ITaskQueue
+from app.domain.repository import ITaskRepository
+from app.exceptions import NoTaskOutputDataException
+from app.execution.storage import AsyncExecutorTaskDataStorage
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "build_task_coalescer",
+    "TaskCoalescer",
+]
+
+
+@dataclass
+class InFlightGroup:
+    leader_task_id: int
+    leader_status: TaskStatus = TaskStatus.QUEUED
+    # follower id -> follower task, in order of attaching
+    followers: "OrderedDict[int, Task]" = field(default_factory=OrderedDict)
+
+
+class TaskCoalescer:
+    """
+    Executes identical queued or running tasks only once.
+
+    The first task with a given input hash is the leader, it is queued and executed as usual.
+    Tasks with the same input hash run while the leader is in flight become its followers:
+    they aren't queued, their statuses mirror the status of the leader and the output
+    of the leader is linked to every follower. A cancelled follower is just detached,
+    a cancelled leader hands the execution over to the first follower.
+    """
+
+    def __init__(
+            self,
+            task_repository: ITaskRepository,
+            task_queue: ITaskQueue,
+            executor_task_data_storage: AsyncExecutorTaskDataStorage
+    ):
+        self._task_repository = task_repository
+        self._task_queue = task_queue
+        self._executor_task_data_storage = executor_task_data_storage
+        self._groups: Dict[str, InFlightGroup] = {}
+        self._leader_input_hashes: Dict[int, str] = {}
+        self._follower_input_hashes: Dict[int, str] = {}
+        self._pending_updates: Set[asyncio.Task] = set()
+        self._task_repository.subscribe(self._on_task_status_changed)
+
+    async def get_key(self, input_data: str) -> str:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self._hash, input_data)
+
+    def get_checksum_key(self, input_checksum: str) -> str:
+        # key is the sha256 of the input, uploaded inputs already have it
+        return input_checksum
+
+    def attach(self, task: Task) -> Optional[TaskStatus]:
+        """
+        Returns the current status of the leader when the task became a follower and mustn't be queued,
+        `None` when the task is the leader.
+        """
+        group = self._groups.get(task.input_hash)
+        if group is None:
+            self._groups[task.input_hash] = InFlightGroup(task.task_id)
+            self._leader_input_hashes[task.task_id] = task.input_hash
+            return None
+
+        group.followers[task.task_id] = task
+        self._follower_input_hashes[task.task_id] = task.input_hash
+        logger.info(f"Task id=`{task.task_id}` follows task id=`{group.leader_task_id}`.")
+        return group.leader_status
+
+    def detach(self, task_id: int) -> bool:
+        """
+        Returns `True` when the task was a follower, the leader isn't affected.
+        """
+        input_hash = self._follower_input_hashes.pop(task_id, None)
+        if input_hash is None:
+            return False
+
+        del self._groups[input_hash].followers[task_id]
+        return True
+
+    def _hash(self, input_data: str) -> str:
+        return hashlib.sha256(input_data.encode()).hexdigest()
+
+    def _on_task_status_changed(self, task_id: int, status: TaskStatus):
+        input_hash = self._leader_input_hashes.get(task_id)
+        if input_hash is None:
+            return
+
+        group = self._groups[input_hash]
+        if status is TaskStatus.RUNNING:
+            group.leader_status = status
+            self._schedule_update(self._set_followers_status(list(group.followers), status))
+            return
+        if not status.is_terminal:
+            return
+
+        del self._groups[input_hash]
+        del self._leader_input_hashes[task_id]
+        followers = list(group.followers.values())
+        for follower in followers:
+            del self._follower_input_hashes[follower.task_id]
+
+        if not followers:
+            return
+        if status is TaskStatus.SUCCESS:
+            self._schedule_update(self._share_output(task_id, followers))
+        elif status is TaskStatus.CANCELLED:
+            self._promote_follower(followers)
+        else:
+            self._schedule_update(self._set_followers_status([follower.task_id for follower in followers], status))
+
+    def _schedule_update(self, coroutine):
+        update = asyncio.get_running_loop().create_task(coroutine)
+        self._pending_updates.add(update)
+        update.add_done_callback(self._on_update_done)
+
+    def _on_update_done(self, update: asyncio.Task):
+        self._pending_updates.discard(update)
+        if not update.cancelled() and update.exception() is not None:
+            logger.error("Unable to update followers.", exc_info=update.exception())
+
+    async def _set_followers_status(self, follower_task_ids: List[int], status: TaskStatus):
+        await self._task_repository.set_tasks_status(follower_task_ids, status)
+
+    async def _share_output(self, leader_task_id: int, followers: List[Task]):
+        output_path = await self._task_repository.get_task_output_path(leader_task_id)
+        succeeded_task_ids = []
+        failed_task_ids = []
+        for follower in followers:
+            try:
+                follower_output_path = await self._executor_task_data_storage.link_output_data(
+                    follower.task_id, output_path
+                )
+            except NoTaskOutputDataException:
+                failed_task_ids.append(follower.task_id)
+                continue
+            await self._task_repository.add_task_output_path(follower.task_id, str(follower_output_path))
+            succeeded_task_ids.append(follower.task_id)
+
+        await self._task_repository.set_tasks_status(succeeded_task_ids, TaskStatus.SUCCESS)
+        await self._task_repository.set_tasks_status(failed_task_ids, TaskStatus.FAILURE)
+
+    def _promote_follower(self, followers: List[Task]):
+        leader = followers[0]
+        logger.info(f"Task id=`{leader.task_id}` leads instead of the cancelled task.")
+        self.attach(leader)
+        for follower in followers[1:]:
+            self.attach(follower)
+
+        self._schedule_update(self._queue_leader(leader, [follower.task_id for follower in followers]))
+
+    async def _queue_leader(self, leader: Task, task_ids: List[int]):
+        await self._task_repository.set_tasks_status(task_ids, TaskStatus.QUEUED)
+        await self._task_queue.put(leader.task_id, priority=leader.priority, tenant=leader.tenant)
+
+
+def build_task_coalescer(
+        task_repository: ITaskRepository,
+        task_queue: ITaskQueue,
+        executor_task_data_storage: AsyncExecutorTaskDataStorage
+) -> TaskCoalescer:
+    # storage of the app is shared, it is closed by the app
+    return TaskCoalescer(task_repository, task_queue, executor_task_data_storage)
@@ -0,0 +1,65 @@
+import asyncio
+import heapq
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from app.domain.model import Task
+from app.execution.executor import ExecutionConfig
+
+__all__ = [
+    "get_task_timeout",
+    "TaskDeadlines",
+]
+
+
+def get_task_timeout(execution_config: ExecutionConfig, task: Task) -> Optional[float]:
+    return task.timeout if task.timeout is not None else execution_config.default_timeout
+
+
+class TaskDeadlines:
+    """
+    Deadlines of running tasks kept in a heap, so only the earliest one is waited for.
+
+    A finished task just forgets its deadline, its heap entry is skipped when it is popped.
+    """
+
+    def __init__(self):
+        self._heap: List[Tuple[float, int]] = []
+        self._deadlines: Dict[int, float] = {}
+        self._deadline_added = asyncio.Event()
+
+    def add(self, task_id: int, timeout: float) -> None:
+        deadline = time.monotonic() + timeout
+        self._deadlines[task_id] = deadline
+        heapq.heappush(self._heap, (deadline, task_id))
+        self._deadline_added.set()
+
+    def remove(self, task_id: int) -> None:
+        self._deadlines.pop(task_id, None)
+
+    async def get_expired(self) -> List[int]:
+        """
+        Waits for the earliest deadline and returns ids of all tasks which have passed their deadlines.
+        """
+        while True:
+            self._deadline_added.clear()
+            timeout = None
+            if self._heap:
+                timeout = max(self._heap[0][0] - time.monotonic(), 0.)
+            try:
+                await asyncio.wait_for(self._deadline_added.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+            expired_task_ids = []
+            now = time.monotonic()
+            while self._heap and self._heap[0][0] <= now:
+                deadline, task_id = heapq.heappop(self._heap)
+                if self._deadlines.get(task_id) == deadline:
+                    del self._deadlines[task_id]
+                    expired_task_ids.append(task_id)
+            if expired_task_ids:
+                return expired_task_ids
@@ -1,32 +1,117 @@
 import os
+import tempfile
 import time
 import traceback
 from dataclasses import dataclass
+from dataclasses import field
+from typing import Optional
+from typing import Union
 
 from app.logger import get_logger
 from app.execution.result import Result
 from app.execution.storage import ExecutorTaskDataStorageConfig
+from app.execution.storage import IExecutorTaskDataStorage
 from app.execution.storage import build_executor_task_data_storage
+from app.execution.transport import INPUT_TRANSPORT_FILE
+from app.execution.transport import SharedMemoryInput
+from app.execution.transport import attach_shared_memory_input
 
 logger = get_logger(__name__)
 
+IO_WORKLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class WorkloadConfig:
+    """
+    Synthetic work done by every task, benchmarks replace the default sleep with CPU or disk load.
+    """
+    sleep: float = 2.
+    # seconds of CPU time burnt in a busy loop
+    cpu_time: float = 0.
+    # bytes written to a temporary file with fsync and read back
+    io_bytes: int = 0
+
+
 @dataclass
 class ExecutionConfig:
     executor_task_data_storage_config: ExecutorTaskDataStorageConfig
+    # `file` or `shared_memory`, the latter passes input data to a worker without writing it to disk
+    input_transport: str = INPUT_TRANSPORT_FILE
+    # share of task runs executed under the profiler, tasks run with `profile` flag are always profiled
+    profiling_sample_rate: float = 0.
+    workload: WorkloadConfig = field(default_factory=WorkloadConfig)
+    # seconds a task may run when its own timeout isn't set, `None` means no limit
+    default_timeout: Optional[float] = None
+
+
+def burn_cpu(cpu_time: float) -> None:
+    deadline = time.process_time() + cpu_time
+    while time.process_time() < deadline:
+        sum(range(1000))
+
+
+def write_and_read(io_bytes: int) -> None:
+    chunk = os.urandom(min(io_bytes, IO_WORKLOAD_CHUNK_SIZE))
+    with tempfile.TemporaryFile() as file:
+        written = 0
+        while written < io_bytes:
+            written += file.write(chunk[:io_bytes - written])
+        file.flush()
+        os.fsync(file.fileno())
+        file.seek(0)
+        while file.read(IO_WORKLOAD_CHUNK_SIZE):
+            pass
+
 
+def process_input_data(input_data: Union[str, memoryview], workload: WorkloadConfig) -> str:
+    # ... do something very long ...
+    if workload.cpu_time > 0:
+        burn_cpu(workload.cpu_time)
+    if workload.io_bytes > 0:
+        write_and_read(workload.io_bytes)
+    if workload.sleep > 0:
+        time.sleep(workload.sleep)
+    if isinstance(input_data, memoryview):
+        input_data = str(input_data, "utf-8")
+    return f"{input_data} - successfully executed"
 
-def execute_task(config: ExecutionConfig, task_id: int) -> Result:
+
+def run_with_input_data(
+        executor_task_data_storage: IExecutorTaskDataStorage,
+        task_id: int,
+        shared_memory_input: Optional[SharedMemoryInput],
+        workload: WorkloadConfig
+) -> str:
+    if shared_memory_input is None:
+        return process_input_data(executor_task_data_storage.get_input_data(task_id), workload)
+
+    segment = attach_shared_memory_input(shared_memory_input)
+    try:
+        input_data = segment.buf[:shared_memory_input.size]
+        try:
+            return process_input_data(input_data, workload)
+        finally:
+            # segment can't be closed while views of its buffer exist
+            input_data.release()
+    finally:
+        segment.close()
+
+
+def execute_task(
+        config: ExecutionConfig,
+        task_id: int,
+        shared_memory_input: Optional[SharedMemoryInput] = None
+) -> Result:
     try:
         logger.info(f"Executing task_id={task_id} in pid={os.getpid()}")
 
         executor_task_data_storage = build_executor_task_data_storage(
             config.executor_task_data_storage_config
         )
-        input_data = executor_task_data_storage.get_input_data(task_id)
-
-        # ... do something ...
-        time.sleep(2.)
-        output_data = f"{input_data} - successfully executed"
+        output_data = run_with_input_data(
+            executor_task_data_storage, task_id, shared_memory_input, config.workload
+        )
 
         executor_task_data_storage.set_output_data(task_id, output_data)
         logger.info(f"Executing task_id={task_id} is successfully completed.")
@@ -37,18 +122,20 @@ def execute_task(config: ExecutionConfig, task_id: int) -> Result:
         return Result.FAILURE
 
 
-def execute_long_task(config: ExecutionConfig, task_id: int):
+def execute_long_task(
+        config: ExecutionConfig,
+        task_id: int,
+        shared_memory_input: Optional[SharedMemoryInput] = None
+):
     try:
         logger.info(f"Executing task_id={task_id} in pid={os.getpid()}")
 
         executor_task_data_storage = build_executor_task_data_storage(
             config.executor_task_data_storage_config
         )
-        input_data = executor_task_data_storage.get_input_data(task_id)
-
-        # ... do something very long ...
-        time.sleep(2.)
-        output_data = f"{input_data} - successfully executed"
+        output_data = run_with_input_data(
+            executor_task_data_storage, task_id, shared_memory_input, config.workload
+        )
 
         executor_task_data_storage.set_output_data(task_id, output_data)
         logger.info(f"Executing task_id={task_id} is successfully completed.")
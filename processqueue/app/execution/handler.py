@@ -1,87 +1,181 @@
 import asyncio
-from concurrent.futures import ProcessPoolExecutor
-from dataclasses import dataclass
-from multiprocessing import Process
+from pathlib import Path
+from typing import Callable
+from typing import List
+from typing import Optional
 
+from app.domain.model import Task
+from app.domain.model import TaskResourceUsage
 from app.domain.model import TaskStatus
 from app.domain.repository import ITaskRepository
+from app.exceptions import NoSuchTaskException
+from app.exceptions import NoTaskOutputDataException
+from app.exceptions import TaskExecutionException
+from app.exceptions import WorkerExitedException
+from app.execution.cache import ResultCache
+from app.execution.deadlines import TaskDeadlines
+from app.execution.deadlines import get_task_timeout
 from app.execution.executor import ExecutionConfig
-from app.execution.executor import execute_long_task
-from app.execution.executor import execute_task
+from app.execution.pool import WorkerPool
+from app.execution.profiling import is_profiling_enabled
+from app.execution.profiling import run_profiled
 from app.execution.result import Result
-from app.execution.storage import IExecutorTaskDataStorage
+from app.execution.storage import AsyncExecutorTaskDataStorage
+from app.execution.transport import INPUT_TRANSPORT_SHARED_MEMORY
+from app.execution.transport import SharedMemoryInput
+from app.execution.transport import create_shared_memory_input
+from app.execution.transport import create_shared_memory_input_from_file
+from app.execution.transport import release_shared_memory_input
 from app.logger import get_logger
 
 logger = get_logger(__name__)
 
 
-@dataclass
-class TaskExecutionProcess:
-    task_id: int
-    process: Process
+def release_created_input(future: asyncio.Future):
+    if not future.cancelled() and future.exception() is None:
+        release_shared_memory_input(future.result())
 
 
-async def handle_cpu_bound_task(
-        task_repository: ITaskRepository,
-        executor_task_data_storage: IExecutorTaskDataStorage,
-        process_pool_executor: ProcessPoolExecutor,
+async def create_shared_memory_input_in_executor(function, *args) -> SharedMemoryInput:
+    # the thread creates the segment even when the task is cancelled meanwhile, it is released as soon as it exists
+    future = asyncio.get_running_loop().run_in_executor(None, function, *args)
+    try:
+        return await asyncio.shield(future)
+    except asyncio.CancelledError:
+        future.add_done_callback(release_created_input)
+        raise
+
+
+async def pass_input_data(
+        executor_task_data_storage: AsyncExecutorTaskDataStorage,
         execution_config: ExecutionConfig,
-        task_id: int
+        task: Task
+) -> Optional[SharedMemoryInput]:
+    if task.input_path is not None:
+        # uploaded input is already on disk
+        if execution_config.input_transport != INPUT_TRANSPORT_SHARED_MEMORY:
+            await executor_task_data_storage.link_input_data(task.task_id, Path(task.input_path))
+            return None
+        return await create_shared_memory_input_in_executor(
+            create_shared_memory_input_from_file, task.task_id, task.input_path
+        )
+
+    if execution_config.input_transport != INPUT_TRANSPORT_SHARED_MEMORY:
+        await executor_task_data_storage.set_input_data(task.task_id, task.input_data)
+        return None
+
+    return await create_shared_memory_input_in_executor(create_shared_memory_input, task.task_id, task.input_data)
+
+
+async def enable_profiling(task_repository: ITaskRepository, execution_config: ExecutionConfig, task: Task) -> bool:
+    if not is_profiling_enabled(execution_config, task):
+        return False
+    # sampled runs are marked as well, so the profile is served for them
+    if not task.profile:
+        await task_repository.set_task_profile(task.task_id, True)
+    return True
+
+
+async def store_resource_usage(
+        task_repository: ITaskRepository,
+        task_id: int,
+        resource_usages: List[TaskResourceUsage]
 ):
-    loop = asyncio.get_running_loop()
-    task = await task_repository.get_task(task_id)
+    # it is stored before the terminal status, so a client never sees a finished task without it
+    if resource_usages:
+        await task_repository.set_task_resource_usage(task_id, resource_usages[-1])
+
 
-    executor_task_data_storage.set_input_data(task.task_id, task.input_data)
+async def store_output(
+        task_repository: ITaskRepository,
+        executor_task_data_storage: AsyncExecutorTaskDataStorage,
+        result_cache: Optional[ResultCache],
+        task: Task
+):
+    try:
+        output_path = await executor_task_data_storage.get_output_path(task.task_id)
+    except NoTaskOutputDataException:
+        # the task would stay running forever otherwise
+        logger.error(f"Output of successfully executed task id=`{task.task_id}` is missing.")
+        await task_repository.set_task_status(task.task_id, TaskStatus.FAILURE)
+        return
 
-    await task_repository.set_task_status(task_id, TaskStatus.RUNNING)
+    await task_repository.add_task_output_path(task.task_id, str(output_path))
+    if result_cache is not None and task.input_hash is not None:
+        await result_cache.put(task.input_hash, output_path)
+    await task_repository.set_task_status(task.task_id, TaskStatus.SUCCESS)
 
-    # ProcessPoolExecutor can be used only when task execution doesn't last long.
-    # If task execution takes more than 30 seconds (time value when user doesn't become an angry person)
-    # then task execution should be handled different way.
-    #
-    # If task execution has started in ProcessPoolExecutor we can`t stop it.
-    # If we kill process of execution then ProcessPoolExecutor will be corrupted and we have to reinitialize it.
 
-    result = await loop.run_in_executor(
-        process_pool_executor,
-        execute_task,
-        execution_config,
-        task.task_id
-    )
+async def is_cancelled_before_start(task_repository: ITaskRepository, task_id: int) -> bool:
+    # task is cancelled while its input is passed, it has already left the queue, so only its status tells it
+    if await task_repository.get_task_status(task_id) is not TaskStatus.CANCELLED:
+        return False
+    logger.info(f"Task id=`{task_id}` is cancelled before its execution.")
+    return True
 
-    if result is Result.SUCCESS:
-        logger.info(f"Execution of task id=`{task_id}` is completed successfully.")
-        await task_repository.set_task_status(task_id, TaskStatus.SUCCESS)
-        output_data = executor_task_data_storage.get_output_data(task_id)
-        await task_repository.add_task_output_data(task_id, output_data)
-    else:
-        logger.info(f"Execution of task id=`{task_id}` is failed.")
-        await task_repository.set_task_status(task_id, TaskStatus.FAILURE)
 
+def start_deadline(task_deadlines: Optional[TaskDeadlines], execution_config: ExecutionConfig, task: Task):
+    timeout = get_task_timeout(execution_config, task)
+    if task_deadlines is not None and timeout is not None:
+        task_deadlines.add(task.task_id, timeout)
 
-async def handle_long_cpu_bound_task(
+
+async def handle_task(
         task_repository: ITaskRepository,
-        executor_task_data_storage: IExecutorTaskDataStorage,
+        executor_task_data_storage: AsyncExecutorTaskDataStorage,
+        worker_pool: WorkerPool,
         execution_config: ExecutionConfig,
-        task_id: int
-) -> TaskExecutionProcess:
+        execute: Callable,
+        task_id: int,
+        result_cache: Optional[ResultCache] = None,
+        task_deadlines: Optional[TaskDeadlines] = None
+):
+    """
+    Executes the task with `execute` in a worker of the pool, so it can be killed at any moment
+    without breaking the rest of workers. The task fails when `execute` raises or returns `Result.FAILURE`.
+    """
     task = await task_repository.get_task(task_id)
 
-    executor_task_data_storage.set_input_data(task.task_id, task.input_data)
-
-    await task_repository.set_task_status(task_id, TaskStatus.RUNNING)
-
-    args = (
-        execution_config,
-        task_id,
-    )
-    process = Process(target=execute_long_task, args=args)
-
-    task_execution_process = TaskExecutionProcess(
-        task_id,
-        process,
-    )
-
-    process.start()
-
-    return task_execution_process
+    try:
+        shared_memory_input = await pass_input_data(executor_task_data_storage, execution_config, task)
+    except (NoSuchTaskException, OSError):
+        # uploaded input is lost, the task would stay queued forever otherwise
+        logger.error(f"Unable to pass input data of task id=`{task_id}` to the worker.")
+        await task_repository.set_task_status(task_id, TaskStatus.FAILURE)
+        return
+
+    resource_usages: List[TaskResourceUsage] = []
+    # segment is released whatever happens from now on
+    try:
+        if await is_cancelled_before_start(task_repository, task_id):
+            return
+        await task_repository.set_task_status(task_id, TaskStatus.RUNNING)
+
+        # the task is wrapped only when it is profiled, so there is no overhead otherwise
+        function_args = (execute, execution_config, task_id, shared_memory_input)
+        if await enable_profiling(task_repository, execution_config, task):
+            function_args = (run_profiled,) + function_args
+        start_deadline(task_deadlines, execution_config, task)
+        result = await worker_pool.submit(
+            task_id,
+            *function_args,
+            resource_usage_listener=resource_usages.append
+        )
+    except asyncio.CancelledError:
+        # worker is already stopped by the pool, partial output must not be served
+        logger.info(f"Execution of task id=`{task_id}` is cancelled.")
+        await executor_task_data_storage.delete_output_data(task_id)
+        raise
+    except (TaskExecutionException, WorkerExitedException):
+        result = Result.FAILURE
+    finally:
+        if shared_memory_input is not None:
+            release_shared_memory_input(shared_memory_input)
+
+    await store_resource_usage(task_repository, task_id, resource_usages)
+    if result is Result.FAILURE:
+        logger.info(f"Execution of task id=`{task_id}` is failed.")
+        await task_repository.set_task_status(task_id, TaskStatus.FAILURE)
+    else:
+        logger.info(f"Execution of task id=`{task_id}` is completed successfully.")
+        await store_output(task_repository, executor_task_data_storage, result_cache, task)
@@ -0,0 +1,270 @@
+import asyncio
+import heapq
+import time
+import uuid
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from app.domain.model import Task
+from app.domain.model import TaskResourceUsage
+from app.domain.model import TaskStatus
+from app.domain.queue import IConsumableTaskQueue
+from app.domain.repository import ITaskRepository
+from app.exceptions import TaskLeaseExpiredException
+from app.execution.cache import ResultCache
+from app.execution.storage import AsyncExecutorTaskDataStorage
+from app.execution.storage import ExecutorTaskDataStorageConfig
+from app.execution.storage import build_async_executor_task_data_storage
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "build_task_lease_manager",
+    "TaskLease",
+    "TaskLeaseConfig",
+    "TaskLeaseManager",
+]
+
+
+@dataclass
+class TaskLeaseConfig:
+    # seconds a leased task stays invisible to other workers without a heartbeat
+    default_visibility_timeout: float = 30.
+    max_visibility_timeout: float = 600.
+    max_lease_count: int = 100
+
+
+@dataclass
+class TaskLease:
+    lease_id: str
+    task: Task
+    worker_id: str
+    visibility_timeout: float
+    # `time.monotonic` of the expiration
+    expires_at: float
+
+
+class TaskLeaseManager:
+    """
+    Hands queued tasks over to remote workers for a limited time.
+
+    A worker extends its lease by heartbeats and finishes it by the output or the failure of the task.
+    Expiration times are kept in a heap: a heartbeat pushes a new entry and the outdated one
+    is skipped when it is popped, so expired leases are found without scanning all of them.
+    A task of an expired lease is queued again.
+    """
+
+    def __init__(
+            self,
+            task_repository: ITaskRepository,
+            task_queue: IConsumableTaskQueue,
+            executor_task_data_storage: AsyncExecutorTaskDataStorage,
+            config: TaskLeaseConfig,
+            result_cache: Optional[ResultCache] = None
+    ):
+        self._task_repository = task_repository
+        self._task_queue = task_queue
+        self._executor_task_data_storage = executor_task_data_storage
+        self._config = config
+        self._result_cache = result_cache
+        self._leases: Dict[str, TaskLease] = {}
+        self._task_lease_ids: Dict[int, str] = {}
+        self._expirations: List[Tuple[float, str]] = []
+        self._expiration_added = asyncio.Event()
+
+    async def lease(
+            self,
+            worker_id: str,
+            count: int,
+            visibility_timeout: Optional[float] = None,
+            wait: float = 0.
+    ) -> List[TaskLease]:
+        """
+        Waits up to `wait` seconds for the first queued task, the rest are taken only when they are already queued.
+        """
+        count = min(count, self._config.max_lease_count)
+        visibility_timeout = self._get_visibility_timeout(visibility_timeout)
+
+        task_ids: List[int] = []
+        if count > 0:
+            task_id = await self._get_queued_task(wait)
+            if task_id is not None:
+                task_ids.append(task_id)
+        while len(task_ids) < count and not await self._task_queue.is_empty():
+            task_ids.append(await self._task_queue.get())
+
+        leases = []
+        try:
+            for task_id in task_ids:
+                leases.append(await self._add_lease(task_id, worker_id, visibility_timeout))
+        except BaseException:
+            # tasks taken from the queue mustn't be lost when the request is cancelled,
+            # already leased ones are queued again by the expiration
+            for task_id in task_ids[len(leases):]:
+                await self._requeue_task(task_id)
+            raise
+        return leases
+
+    def heartbeat(self, lease_id: str, visibility_timeout: Optional[float] = None) -> TaskLease:
+        lease = self._get_lease(lease_id)
+        if visibility_timeout is not None:
+            lease.visibility_timeout = self._get_visibility_timeout(visibility_timeout)
+        lease.expires_at = time.monotonic() + lease.visibility_timeout
+        self._push_expiration(lease)
+        return lease
+
+    async def complete(
+            self,
+            lease_id: str,
+            output_data: str,
+            resource_usage: Optional[TaskResourceUsage] = None
+    ) -> Task:
+        lease = self._pop_lease(lease_id)
+        task = lease.task
+        await self._executor_task_data_storage.set_output_data(task.task_id, output_data)
+        if resource_usage is not None:
+            await self._task_repository.set_task_resource_usage(task.task_id, resource_usage)
+        output_path = await self._executor_task_data_storage.get_output_path(task.task_id)
+        await self._task_repository.add_task_output_path(task.task_id, str(output_path))
+        if self._result_cache is not None and task.input_hash is not None:
+            await self._result_cache.put(task.input_hash, output_path)
+        await self._task_repository.set_task_status(task.task_id, TaskStatus.SUCCESS)
+        logger.info(f"Task id=`{task.task_id}` is completed by worker `{lease.worker_id}`.")
+        return task
+
+    async def fail(
+            self,
+            lease_id: str,
+            error: Optional[str] = None,
+            resource_usage: Optional[TaskResourceUsage] = None
+    ) -> Task:
+        lease = self._pop_lease(lease_id)
+        task = lease.task
+        if resource_usage is not None:
+            await self._task_repository.set_task_resource_usage(task.task_id, resource_usage)
+        await self._task_repository.set_task_status(task.task_id, TaskStatus.FAILURE)
+        logger.info(f"Task id=`{task.task_id}` is failed by worker `{lease.worker_id}`: {error}")
+        return task
+
+    def revoke(self, task_id: int) -> bool:
+        """
+        Drops the lease of the task, the worker finds it out on the next heartbeat.
+        Returns `False` when the task isn't leased.
+        """
+        lease_id = self._task_lease_ids.get(task_id)
+        if lease_id is None:
+            return False
+        self._pop_lease(lease_id)
+        return True
+
+    async def expire_leases(self):
+        while True:
+            self._expiration_added.clear()
+            timeout = None
+            if self._expirations:
+                timeout = max(self._expirations[0][0] - time.monotonic(), 0.)
+            try:
+                await asyncio.wait_for(self._expiration_added.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            await self._requeue_expired_tasks()
+
+    def close(self) -> None:
+        self._executor_task_data_storage.close()
+
+    async def _get_queued_task(self, wait: float) -> Optional[int]:
+        # a task taken by `get` right at the timeout isn't lost, unlike with `asyncio.wait_for`
+        get_task = asyncio.get_running_loop().create_task(self._task_queue.get())
+        try:
+            await asyncio.wait({get_task}, timeout=wait)
+        except asyncio.CancelledError:
+            if not get_task.cancel():
+                await self._requeue_task(get_task.result())
+            raise
+        if not get_task.done():
+            get_task.cancel()
+            await asyncio.wait({get_task})
+        if get_task.cancelled():
+            return None
+        return get_task.result()
+
+    async def _requeue_task(self, task_id: int):
+        task = await self._task_repository.get_task(task_id)
+        await self._task_queue.put(task_id, priority=task.priority, tenant=task.tenant)
+        await self._task_repository.set_task_status(task_id, TaskStatus.QUEUED)
+
+    async def _requeue_expired_tasks(self):
+        now = time.monotonic()
+        while self._expirations and self._expirations[0][0] <= now:
+            expires_at, lease_id = heapq.heappop(self._expirations)
+            lease = self._leases.get(lease_id)
+            # entry is outdated by a heartbeat or the lease is already finished
+            if lease is None or lease.expires_at != expires_at:
+                continue
+
+            self._pop_lease(lease_id)
+            logger.warning(f"Lease of task id=`{lease.task.task_id}` by worker `{lease.worker_id}` has expired.")
+            await self._requeue_task(lease.task.task_id)
+
+    async def _add_lease(self, task_id: int, worker_id: str, visibility_timeout: float) -> TaskLease:
+        task = await self._task_repository.get_task(task_id)
+        if task.input_path is not None:
+            # remote worker can't read the uploaded file, so the input is passed inline
+            await self._executor_task_data_storage.link_input_data(task_id, Path(task.input_path))
+            task.input_data = await self._executor_task_data_storage.get_input_data(task_id)
+
+        lease = TaskLease(
+            lease_id=uuid.uuid4().hex,
+            task=task,
+            worker_id=worker_id,
+            visibility_timeout=visibility_timeout,
+            expires_at=time.monotonic() + visibility_timeout,
+        )
+        self._leases[lease.lease_id] = lease
+        self._task_lease_ids[task.task_id] = lease.lease_id
+        self._push_expiration(lease)
+        await self._task_repository.set_task_status(task_id, TaskStatus.RUNNING)
+        logger.info(f"Task id=`{task_id}` is leased by worker `{worker_id}` for {visibility_timeout} seconds.")
+        return lease
+
+    def _push_expiration(self, lease: TaskLease):
+        heapq.heappush(self._expirations, (lease.expires_at, lease.lease_id))
+        self._expiration_added.set()
+
+    def _get_lease(self, lease_id: str) -> TaskLease:
+        lease = self._leases.get(lease_id)
+        if lease is None:
+            raise TaskLeaseExpiredException(lease_id)
+        return lease
+
+    def _pop_lease(self, lease_id: str) -> TaskLease:
+        lease = self._get_lease(lease_id)
+        del self._leases[lease_id]
+        del self._task_lease_ids[lease.task.task_id]
+        return lease
+
+    def _get_visibility_timeout(self, visibility_timeout: Optional[float]) -> float:
+        if visibility_timeout is None:
+            return self._config.default_visibility_timeout
+        return min(visibility_timeout, self._config.max_visibility_timeout)
+
+
+def build_task_lease_manager(
+        task_repository: ITaskRepository,
+        task_queue: IConsumableTaskQueue,
+        executor_task_data_storage_config: ExecutorTaskDataStorageConfig,
+        config: TaskLeaseConfig,
+        result_cache: Optional[ResultCache] = None
+) -> TaskLeaseManager:
+    return TaskLeaseManager(
+        task_repository,
+        task_queue,
+        build_async_executor_task_data_storage(executor_task_data_storage_config),
+        config,
+        result_cache
+    )
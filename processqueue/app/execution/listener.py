@@ -1,17 +1,26 @@
 import asyncio
-from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
+from typing import Dict
 from typing import List
+from typing import Optional
 
 from app.domain.listener import ITaskQueueListener
 from app.domain.model import TaskStatus
+from app.domain.queue import IConsumableTaskQueue
 from app.domain.queue import ITaskQueue
+from app.domain.queue import TaskQueueItem
 from app.domain.repository import ITaskRepository
+from app.execution.cache import ResultCache
+from app.execution.deadlines import TaskDeadlines
 from app.execution.executor import ExecutionConfig
-from app.execution.handler import TaskExecutionProcess
-from app.execution.handler import handle_cpu_bound_task
-from app.execution.handler import handle_long_cpu_bound_task
-from app.execution.storage import build_executor_task_data_storage
+from app.execution.executor import execute_long_task
+from app.execution.executor import execute_task
+from app.execution.handler import handle_task
+from app.execution.pool import WorkerPool
+from app.execution.pool import WorkerPoolConfig
+from app.execution.storage import build_async_executor_task_data_storage
+from app.execution.transport import INPUT_TRANSPORT_SHARED_MEMORY
+from app.execution.transport import start_shared_memory_tracker
 from app.logger import get_logger
 
 logger = get_logger(__name__)
@@ -21,134 +30,235 @@ __all__ = [
     "ListenerConfig"
 ]
 
+# tasks left unfinished by the previous run are looked up by pages of this size
+RECOVERY_PAGE_SIZE = 1000
+
+
 @dataclass
 class ListenerConfig:
     execution_config: ExecutionConfig
     max_running_tasks: int = 1
+    # worker process is recycled after this amount of tasks, `None` means never
+    max_tasks_per_worker: Optional[int] = None
+    # time given to a cancelled task to exit after SIGTERM before it is killed
+    cancel_grace_period: float = 5.0
 
 
 class RunningTasksObserver:
     def __init__(self, max_running_tasks: int):
         self._max_running_tasks = max_running_tasks
         self._current_running_tasks = 0
+        self._slot_returned = asyncio.Event()
 
     def has_available_slot(self) -> bool:
         return self._current_running_tasks < self._max_running_tasks
 
+    async def wait_for_available_slot(self):
+        while not self.has_available_slot():
+            self._slot_returned.clear()
+            await self._slot_returned.wait()
+
+    @property
+    def running_tasks_count(self) -> int:
+        return self._current_running_tasks
+
     def take_slot(self):
         self._current_running_tasks += 1
 
     def return_slot(self):
         self._current_running_tasks -= 1
+        self._slot_returned.set()
 
 
-class TaskQueueListener(ITaskQueueListener):
-    def __init__(self, task_repository: ITaskRepository, task_queue: ITaskQueue, config: ListenerConfig):
-        self._task_repository = task_repository
-        self._task_queue = task_queue
-        self._config = config
-        self._process_pool_executor = ProcessPoolExecutor(max_workers=self._config.max_running_tasks)
-        self._loop = asyncio.get_running_loop()
-        self._running_tasks_observer = RunningTasksObserver(self._config.max_running_tasks)
-        self._executor_task_data_storage = build_executor_task_data_storage(
-            self._config.execution_config.executor_task_data_storage_config
-        )
+def build_worker_pool(config: ListenerConfig) -> WorkerPool:
+    if config.execution_config.input_transport == INPUT_TRANSPORT_SHARED_MEMORY:
+        start_shared_memory_tracker()
 
-    async def listen(self):
+    worker_pool_config = WorkerPoolConfig(
+        max_workers=config.max_running_tasks,
+        max_tasks_per_worker=config.max_tasks_per_worker,
+        termination_grace_period=config.cancel_grace_period,
+    )
+    return WorkerPool(worker_pool_config)
+
+
+async def cancel_running_task(running_tasks: Dict[int, asyncio.Task], task_id: int) -> bool:
+    running_task = running_tasks.get(task_id)
+    if running_task is None or not running_task.cancel():
+        return False
+
+    # cancellation is propagated to `WorkerPool.submit` which stops the worker
+    await asyncio.wait({running_task})
+    return running_task.cancelled()
+
+
+async def cancel_running_tasks(running_tasks: Dict[int, asyncio.Task]):
+    # workers are stopped concurrently, so it takes at most one grace period
+    tasks = list(running_tasks.values())
+    for running_task in tasks:
+        running_task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def time_out_task(
+        task_repository: ITaskRepository,
+        worker_pool: WorkerPool,
+        running_tasks: Dict[int, asyncio.Task],
+        task_id: int
+):
+    # a task whose worker has already finished is storing its result, it isn't interrupted
+    if not worker_pool.is_task_running(task_id):
+        return
+    logger.warning(f"Task id=`{task_id}` has exceeded its deadline, its worker is stopped.")
+    if await cancel_running_task(running_tasks, task_id):
+        await task_repository.set_task_status(task_id, TaskStatus.TIMEOUT)
+
+
+async def enforce_deadlines(
+        task_repository: ITaskRepository,
+        worker_pool: WorkerPool,
+        running_tasks: Dict[int, asyncio.Task],
+        task_deadlines: TaskDeadlines
+):
+    loop = asyncio.get_running_loop()
+    timeouts = set()
+    try:
         while True:
-            if self._running_tasks_observer.has_available_slot():
-                task_id: int = await self._task_queue.get()
-                logger.info(f"Received task id=`{task_id}`.")
-
-                is_task_cancelled = self._task_queue.is_task_cancelled(task_id)
-                if is_task_cancelled:
-                    continue
-
-                self._running_tasks_observer.take_slot()
-                running_task = self._loop.create_task(
-                    handle_cpu_bound_task(
-                        self._task_repository,
-                        self._executor_task_data_storage,
-                        self._process_pool_executor,
-                        self._config.execution_config,
-                        task_id
-                    )
-                )
-                running_task.add_done_callback(lambda _: self._running_tasks_observer.return_slot())
-
-            else:
-                await asyncio.sleep(2.)
+            for task_id in await task_deadlines.get_expired():
+                timeout_task = loop.create_task(time_out_task(task_repository, worker_pool, running_tasks, task_id))
+                timeouts.add(timeout_task)
+                timeout_task.add_done_callback(timeouts.discard)
+    finally:
+        for timeout_task in timeouts:
+            timeout_task.cancel()
 
-    def stop(self):
-        self._process_pool_executor.shutdown(wait=True)
 
+async def find_tasks(task_repository: ITaskRepository, status: TaskStatus) -> List[int]:
+    task_ids: List[int] = []
+    cursor: Optional[int] = None
+    while True:
+        task_page = await task_repository.query_tasks(status, RECOVERY_PAGE_SIZE, cursor=cursor)
+        task_ids.extend(task_page.task_ids)
+        if task_page.next_cursor is None:
+            return task_ids
+        cursor = task_page.next_cursor
+
+
+async def recover_unfinished_tasks(task_repository: ITaskRepository, task_queue: ITaskQueue):
+    """
+    Queues again the tasks which were queued before the restart, running ones are failed,
+    their execution has been lost and it mightn't be safe to repeat it.
+    """
+    running_task_ids = await find_tasks(task_repository, TaskStatus.RUNNING)
+    if running_task_ids:
+        logger.warning(f"{len(running_task_ids)} tasks were running before the restart, they are failed.")
+        await task_repository.set_tasks_status(running_task_ids, TaskStatus.FAILURE)
+
+    queued_task_ids = await find_tasks(task_repository, TaskStatus.QUEUED)
+    if queued_task_ids:
+        tasks = await task_repository.get_tasks(sorted(queued_task_ids))
+        await task_queue.put_many([
+            TaskQueueItem(task.task_id, task.priority, task.tenant)
+            for task in tasks.values()
+        ])
+        logger.info(f"{len(tasks)} tasks queued before the restart are queued again.")
+
+
+class TaskQueueListener(ITaskQueueListener):
+    """
+    Executes queued tasks in workers of the pool, at most `max_running_tasks` at once.
+    """
 
-class LongTaskQueueListener(ITaskQueueListener):
-    def __init__(self, task_repository: ITaskRepository, task_queue: ITaskQueue, config: ListenerConfig):
+    # function executed in a worker, it returns `Result.FAILURE` when the task fails
+    execute = staticmethod(execute_task)
+
+    def __init__(
+            self,
+            task_repository: ITaskRepository,
+            task_queue: IConsumableTaskQueue,
+            config: ListenerConfig,
+            result_cache: Optional[ResultCache] = None
+    ):
         self._task_repository = task_repository
         self._task_queue = task_queue
         self._config = config
-        self._executor_task_data_storage = build_executor_task_data_storage(
+        self._result_cache = result_cache
+        self._loop = asyncio.get_running_loop()
+        self._executor_task_data_storage = build_async_executor_task_data_storage(
             self._config.execution_config.executor_task_data_storage_config
         )
+        self._worker_pool = build_worker_pool(self._config)
         self._running_tasks_observer = RunningTasksObserver(self._config.max_running_tasks)
-        self._running_tasks: List[TaskExecutionProcess] = []
+        self._running_tasks: Dict[int, asyncio.Task] = {}
+        self._task_deadlines = TaskDeadlines()
 
     async def listen(self):
-        while True:
-            if len(self._running_tasks) == 0 \
-                    or not self._task_queue.is_empty() and len(self._running_tasks) < self._config.max_running_tasks:
+        await recover_unfinished_tasks(self._task_repository, self._task_queue)
+        deadlines_task = self._loop.create_task(enforce_deadlines(
+            self._task_repository, self._worker_pool, self._running_tasks, self._task_deadlines
+        ))
+        try:
+            while True:
+                await self._running_tasks_observer.wait_for_available_slot()
                 await self._acquire_task()
+        finally:
+            deadlines_task.cancel()
+            await asyncio.wait({deadlines_task})
+            await cancel_running_tasks(self._running_tasks)
 
-            still_running_tasks = []
-            for task in self._running_tasks:
-                if task.process.is_alive():
-                    still_running_tasks.append(task)
-                else:
-                    if task.process.exitcode == 0:
-                        logger.info(f"Execution of task id=`{task.task_id}` is completed successfully.")
-                        await self._task_repository.set_task_status(task.task_id, TaskStatus.SUCCESS)
-                        output_data = self._executor_task_data_storage.get_output_data(task.task_id)
-                        await self._task_repository.add_task_output_data(task.task_id, output_data)
-                    else:
-                        logger.info(f"Execution of task id=`{task.task_id}` is failed.")
-                        await self._task_repository.set_task_status(task.task_id, TaskStatus.FAILURE)
+    def stop(self):
+        self._worker_pool.shutdown(wait=True)
+        self._executor_task_data_storage.close()
 
-            self._running_tasks = still_running_tasks
+    async def get_running_tasks_count(self) -> int:
+        return self._running_tasks_observer.running_tasks_count
 
-            await asyncio.sleep(2.0)
-
-    def stop(self):
-        for task in self._running_tasks:
-            if task.process.is_alive():
-                task.process.join()
+    async def cancel_task(self, task_id: int) -> bool:
+        # result of a task whose worker has already finished is being stored, the task can't be cancelled anymore
+        if not self._worker_pool.is_task_running(task_id):
+            return False
+        return await cancel_running_task(self._running_tasks, task_id)
 
     async def _acquire_task(self):
         task_id: int = await self._task_queue.get()
         logger.info(f"Received task id=`{task_id}`.")
 
-        is_task_cancelled = self._task_queue.is_task_cancelled(task_id)
-        if is_task_cancelled:
-            return
-
         self._running_tasks_observer.take_slot()
-        running_task = await handle_long_cpu_bound_task(
-            self._task_repository,
-            self._executor_task_data_storage,
-            self._config.execution_config,
-            task_id
+        running_task = self._loop.create_task(
+            handle_task(
+                self._task_repository,
+                self._executor_task_data_storage,
+                self._worker_pool,
+                self._config.execution_config,
+                self.execute,
+                task_id,
+                self._result_cache,
+                self._task_deadlines
+            )
         )
-        self._running_tasks.append(running_task)
+        self._running_tasks[task_id] = running_task
+        running_task.add_done_callback(lambda _: self._release_task(task_id))
+
+    def _release_task(self, task_id: int):
+        del self._running_tasks[task_id]
+        self._task_deadlines.remove(task_id)
+        self._running_tasks_observer.return_slot()
+
 
+class LongTaskQueueListener(TaskQueueListener):
+    # failed task raises in the worker, so its traceback is logged by the worker pool
+    execute = staticmethod(execute_long_task)
 
 
 def build_task_queue_listener(
     task_repository: ITaskRepository,
-    task_queue: ITaskQueue,
-    config: ListenerConfig
+    task_queue: IConsumableTaskQueue,
+    config: ListenerConfig,
+    result_cache: Optional[ResultCache] = None
 ) -> ITaskQueueListener:
     return LongTaskQueueListener(
         task_repository,
         task_queue,
-        config
+        config,
+        result_cache
     )
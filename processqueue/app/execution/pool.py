@@ -0,0 +1,323 @@
+import asyncio
+import multiprocessing
+import signal
+import time
+import traceback
+from collections import deque
+from dataclasses import dataclass
+from multiprocessing.connection import Connection
+from multiprocessing.process import BaseProcess
+from typing import Any
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Optional
+from typing import Set
+
+from app.domain.model import TaskResourceUsage
+from app.exceptions import TaskExecutionException
+from app.exceptions import WorkerExitedException
+from app.execution.usage import get_resource_usage
+from app.execution.usage import take_resource_usage_snapshot
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "ResourceUsageListener",
+    "WorkerPool",
+    "WorkerPoolConfig",
+]
+
+# pool process runs threads (storage I/O, sqlite writer), a child forked from it might inherit a held lock,
+# so workers are forked from a single-threaded server process instead
+WORKER_START_METHOD = "forkserver"
+# imported by the server process once, so a new worker doesn't import them again
+WORKER_PRELOADED_MODULES = ["app.execution.executor", "app.execution.pool", "app.execution.profiling"]
+
+# called with resources spent by the worker right before the result of the task is set
+ResourceUsageListener = Callable[[TaskResourceUsage], None]
+
+
+@dataclass
+class WorkerPoolConfig:
+    max_workers: int = 1
+    # worker is replaced by a fresh process after this amount of tasks, `None` means never
+    max_tasks_per_worker: Optional[int] = None
+    # time between SIGTERM and SIGKILL when a running task is stopped
+    termination_grace_period: float = 5.0
+
+
+def _worker_main(connection: Connection, max_tasks_per_worker: Optional[int]):
+    # SIGTERM has to terminate the worker whatever handlers it has got from the server process
+    signal.set_wakeup_fd(-1)
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    # shutdown on Ctrl+C is driven by the pool
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    executed_tasks = 0
+    while max_tasks_per_worker is None or executed_tasks < max_tasks_per_worker:
+        try:
+            # worker holds only its own end of the pipe, so it gets EOF as soon as the pool process dies
+            message = connection.recv()
+        except (EOFError, OSError):
+            return
+
+        if message is None:
+            return
+
+        function, args = message
+        snapshot = take_resource_usage_snapshot()
+        try:
+            result = function(*args)
+            connection.send((True, result, get_resource_usage(snapshot)))
+        except Exception:
+            connection.send((False, traceback.format_exc(), get_resource_usage(snapshot)))
+        executed_tasks += 1
+
+
+@dataclass(eq=False)
+class Worker:
+    process: BaseProcess
+    connection: Connection
+    exited: asyncio.Future
+    executed_tasks: int = 0
+    task_id: Optional[int] = None
+    result: Optional[asyncio.Future] = None
+    resource_usage_listener: Optional[ResourceUsageListener] = None
+    is_terminated: bool = False
+
+
+class WorkerPool:
+    """
+    Pool of pre-started worker processes.
+
+    Unlike `ProcessPoolExecutor` a worker that executes a task can be killed:
+    the task is failed and the worker is replaced without touching the rest of the pool.
+    """
+
+    def __init__(self, config: WorkerPoolConfig):
+        self._config = config
+        self._loop = asyncio.get_running_loop()
+        self._workers: Set[Worker] = set()
+        self._idle_workers: Deque[Worker] = deque()
+        self._busy_workers: Dict[int, Worker] = {}
+        self._worker_waiters: Deque[asyncio.Future] = deque()
+        self._is_shutdown = False
+        self._context = multiprocessing.get_context(WORKER_START_METHOD)
+        self._context.set_forkserver_preload(WORKER_PRELOADED_MODULES)
+
+        for _ in range(self._config.max_workers):
+            self._start_worker()
+
+    async def submit(
+            self,
+            task_id: int,
+            function: Callable,
+            *args,
+            resource_usage_listener: Optional[ResourceUsageListener] = None
+    ) -> Any:
+        """
+        Executes `function(*args)` in one of the workers and returns its result.
+
+        Resources spent by the worker are reported to `resource_usage_listener` whether the function raises or not,
+        they aren't reported when the worker dies during execution.
+
+        Raises `TaskExecutionException` when the function raises
+        and `WorkerExitedException` when the worker dies during execution.
+        Cancellation of the awaiting coroutine kills the worker executing the task.
+        """
+        worker = await self._acquire_worker()
+
+        worker.task_id = task_id
+        worker.result = self._loop.create_future()
+        worker.resource_usage_listener = resource_usage_listener
+        self._busy_workers[task_id] = worker
+        try:
+            worker.connection.send((function, args))
+        except (OSError, EOFError):
+            # worker has died after it was taken, its process is reaped by the sentinel callback
+            logger.warning(f"Worker pid={worker.process.pid} has exited before task id=`{task_id}` was sent.")
+            del self._busy_workers[task_id]
+            worker.task_id = None
+            worker.result = None
+            worker.resource_usage_listener = None
+            self._retire_worker(worker)
+            raise WorkerExitedException(task_id, worker.process.exitcode)
+
+        result = worker.result
+        try:
+            return await asyncio.shield(result)
+        except asyncio.CancelledError:
+            await self.kill(task_id)
+            # nobody awaits the result of the killed worker anymore
+            if result.done() and not result.cancelled():
+                result.exception()
+            raise
+
+    def is_task_running(self, task_id: int) -> bool:
+        return task_id in self._busy_workers
+
+    async def kill(self, task_id: int) -> bool:
+        """
+        Stops the worker executing the task: SIGTERM first and SIGKILL after the grace period.
+        """
+        worker = self._busy_workers.get(task_id)
+        if worker is None:
+            return False
+
+        logger.info(f"Terminating worker pid={worker.process.pid} executing task id=`{task_id}`.")
+        worker.is_terminated = True
+        worker.process.terminate()
+        try:
+            await asyncio.wait_for(asyncio.shield(worker.exited), self._config.termination_grace_period)
+        except asyncio.TimeoutError:
+            logger.info(f"Killing worker pid={worker.process.pid} executing task id=`{task_id}`.")
+            worker.process.kill()
+            await asyncio.shield(worker.exited)
+        return True
+
+    def shutdown(self, wait: bool = True):
+        self._is_shutdown = True
+
+        for waiter in self._worker_waiters:
+            if not waiter.done():
+                waiter.cancel()
+        self._worker_waiters.clear()
+
+        for worker in list(self._workers):
+            self._loop.remove_reader(worker.connection.fileno())
+            self._loop.remove_reader(worker.process.sentinel)
+            self._stop_worker(worker)
+            if worker.task_id is not None and not wait:
+                worker.process.kill()
+
+        # running tasks are waited for at most the grace period, so a hung task can't block the shutdown
+        deadline = time.monotonic() + self._config.termination_grace_period
+        for worker in list(self._workers):
+            worker.process.join(max(deadline - time.monotonic(), 0.))
+            if worker.process.is_alive():
+                logger.info(f"Killing worker pid={worker.process.pid} executing task id=`{worker.task_id}`.")
+                worker.process.kill()
+                worker.process.join()
+            if worker.task_id is not None and worker.connection.poll():
+                self._on_worker_message(worker)
+            if worker.result is not None and not worker.result.done():
+                worker.result.set_exception(WorkerExitedException(worker.task_id, worker.process.exitcode))
+            worker.connection.close()
+        self._workers.clear()
+        self._idle_workers.clear()
+        self._busy_workers.clear()
+
+    def _start_worker(self):
+        parent_connection, child_connection = self._context.Pipe()
+        process = self._context.Process(
+            target=_worker_main,
+            args=(child_connection, self._config.max_tasks_per_worker),
+            daemon=True
+        )
+        process.start()
+        child_connection.close()
+
+        worker = Worker(process, parent_connection, self._loop.create_future())
+        self._workers.add(worker)
+        self._loop.add_reader(parent_connection.fileno(), self._on_worker_message, worker)
+        self._loop.add_reader(process.sentinel, self._on_worker_exit, worker)
+        self._release_worker(worker)
+
+    def _stop_worker(self, worker: Worker):
+        try:
+            worker.connection.send(None)
+        except OSError:
+            pass
+
+    async def _acquire_worker(self) -> Worker:
+        while not self._idle_workers:
+            waiter = self._loop.create_future()
+            self._worker_waiters.append(waiter)
+            await waiter
+        return self._idle_workers.popleft()
+
+    def _release_worker(self, worker: Worker):
+        self._idle_workers.append(worker)
+        while self._worker_waiters:
+            waiter = self._worker_waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                break
+
+    def _on_worker_message(self, worker: Worker):
+        try:
+            is_success, payload, resource_usage = worker.connection.recv()
+        except (EOFError, OSError):
+            # worker has died, it is handled by sentinel callback
+            self._loop.remove_reader(worker.connection.fileno())
+            return
+
+        task_id = worker.task_id
+        if task_id is None:
+            logger.error(f"Worker pid={worker.process.pid} has sent a result without a task.")
+            return
+        result = worker.result
+        resource_usage_listener = worker.resource_usage_listener
+        worker.task_id = None
+        worker.result = None
+        worker.resource_usage_listener = None
+        worker.executed_tasks += 1
+        del self._busy_workers[task_id]
+
+        max_tasks_per_worker = self._config.max_tasks_per_worker
+        if worker.is_terminated \
+                or max_tasks_per_worker is not None and worker.executed_tasks >= max_tasks_per_worker:
+            # worker is about to exit, a replacement is started right away
+            self._retire_worker(worker)
+        else:
+            self._release_worker(worker)
+
+        if result.done():
+            return
+        if resource_usage_listener is not None:
+            try:
+                resource_usage_listener(resource_usage)
+            except Exception:
+                logger.exception(f"Resource usage listener has failed on task id=`{task_id}`.")
+        if is_success:
+            result.set_result(payload)
+        else:
+            logger.error(f"Task id=`{task_id}` has failed in worker pid={worker.process.pid}: {payload}")
+            result.set_exception(TaskExecutionException(task_id))
+
+    def _on_worker_exit(self, worker: Worker):
+        if worker.task_id is not None and worker.connection.poll():
+            # worker has sent the result right before exit
+            self._on_worker_message(worker)
+
+        self._loop.remove_reader(worker.process.sentinel)
+        self._loop.remove_reader(worker.connection.fileno())
+        worker.process.join()
+        worker.connection.close()
+
+        if worker.task_id is not None:
+            logger.info(f"Worker pid={worker.process.pid} executing task id=`{worker.task_id}` "
+                        f"has exited with code `{worker.process.exitcode}`.")
+            self._busy_workers.pop(worker.task_id, None)
+            if not worker.result.done():
+                worker.result.set_exception(WorkerExitedException(worker.task_id, worker.process.exitcode))
+            worker.task_id = None
+            worker.result = None
+            worker.resource_usage_listener = None
+
+        if worker in self._workers:
+            self._retire_worker(worker)
+        if not worker.exited.done():
+            worker.exited.set_result(worker.process.exitcode)
+
+    def _retire_worker(self, worker: Worker):
+        self._workers.discard(worker)
+        try:
+            self._idle_workers.remove(worker)
+        except ValueError:
+            pass
+
+        if not self._is_shutdown:
+            self._start_worker()
@@ -0,0 +1,52 @@
+import cProfile
+import io
+import marshal
+import pstats
+import random
+from pathlib import Path
+from typing import Any
+from typing import Callable
+
+from app.domain.model import Task
+from app.execution.executor import ExecutionConfig
+from app.execution.storage import build_executor_task_data_storage
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "is_profiling_enabled",
+    "render_profile",
+    "run_profiled",
+]
+
+PROFILE_SORT_KEY = "cumulative"
+
+
+def is_profiling_enabled(execution_config: ExecutionConfig, task: Task) -> bool:
+    sample_rate = execution_config.profiling_sample_rate
+    return task.profile or sample_rate > 0 and random.random() < sample_rate
+
+
+def run_profiled(function: Callable, execution_config: ExecutionConfig, task_id: int, *args) -> Any:
+    """
+    Executes `function(execution_config, task_id, *args)` under `cProfile` in a worker,
+    the profile is stored next to the output of the task even when the function raises.
+    """
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(function, execution_config, task_id, *args)
+    finally:
+        profiler.create_stats()
+        executor_task_data_storage = build_executor_task_data_storage(
+            execution_config.executor_task_data_storage_config
+        )
+        # it is the format of `Profile.dump_stats`
+        executor_task_data_storage.set_profile_data(task_id, marshal.dumps(profiler.stats))
+
+
+def render_profile(profile_path: Path, limit: int) -> str:
+    stream = io.StringIO()
+    stats = pstats.Stats(str(profile_path), stream=stream)
+    stats.sort_stats(PROFILE_SORT_KEY).print_stats(limit)
+    return stream.getvalue()
@@ -1,41 +1,255 @@
 import asyncio
-from typing import Set
+import heapq
+import itertools
+from bisect import bisect_left
+from bisect import insort
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
 
-from app.domain.queue import ITaskQueue
+from app.domain.queue import IConsumableTaskQueue
+from app.domain.queue import TaskQueueItem
 from app.logger import get_logger
 
 __all__ = [
-    "build_task_queue"
+    "build_task_queue",
+    "TaskQueueConfig",
 ]
 
 logger = get_logger(__name__)
 
+# heap is rebuilt when it has more cancelled entries than this and more than live ones
+MIN_TOMBSTONES_TO_COMPACT = 1024
+# size of sorted blocks of `RankIndex`
+RANK_INDEX_BLOCK_SIZE = 512
+
+
+@dataclass
+class TaskQueueConfig:
+    # share of a tenant is proportional to its weight
+    tenant_weights: Dict[str, float] = field(default_factory=dict)
+    default_tenant_weight: float = 1.0
+
+
+# (-priority, virtual finish tag, sequence number)
+EntryKey = Tuple[int, float, int]
+
+
+class QueueEntry:
+    __slots__ = ("key", "task_id", "is_cancelled")
+
+    def __init__(self, key: EntryKey, task_id: int):
+        self.key = key
+        self.task_id = task_id
+        self.is_cancelled = False
+
+    def __lt__(self, other: "QueueEntry") -> bool:
+        return self.key < other.key
+
+
+class RankIndex:
+    """
+    Sorted collection of keys which answers "how many keys are less than this one" in O(log n).
+
+    Keys are kept in sorted blocks of bounded size, a Fenwick tree over block sizes
+    gives the amount of keys before a block.
+    """
 
-class TaskQueue(ITaskQueue):
     def __init__(self):
-        self._queue = asyncio.Queue()
-        self._cancelled_tasks: Set[int] = set()
+        self._blocks: List[List[EntryKey]] = []
+        self._maxes: List[EntryKey] = []
+        self._tree: List[int] = [0]
+
+    def __len__(self) -> int:
+        return self._prefix_sum(len(self._blocks))
+
+    def add(self, key: EntryKey):
+        if not self._blocks:
+            self._blocks.append([key])
+            self._maxes.append(key)
+            self._rebuild_tree()
+            return
+
+        block_index = min(bisect_left(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[block_index]
+        insort(block, key)
+        self._maxes[block_index] = block[-1]
+
+        if len(block) > 2 * RANK_INDEX_BLOCK_SIZE:
+            self._blocks[block_index:block_index + 1] = [
+                block[:RANK_INDEX_BLOCK_SIZE],
+                block[RANK_INDEX_BLOCK_SIZE:]
+            ]
+            self._maxes[block_index:block_index + 1] = [block[RANK_INDEX_BLOCK_SIZE - 1], block[-1]]
+            self._rebuild_tree()
+        else:
+            self._update_tree(block_index, 1)
+
+    def remove(self, key: EntryKey):
+        block_index = bisect_left(self._maxes, key)
+        block = self._blocks[block_index]
+        del block[bisect_left(block, key)]
+
+        if block:
+            self._maxes[block_index] = block[-1]
+            self._update_tree(block_index, -1)
+        else:
+            del self._blocks[block_index]
+            del self._maxes[block_index]
+            self._rebuild_tree()
+
+    def rank(self, key: EntryKey) -> int:
+        block_index = bisect_left(self._maxes, key)
+        if block_index == len(self._blocks):
+            return len(self)
+        return self._prefix_sum(block_index) + bisect_left(self._blocks[block_index], key)
+
+    def _rebuild_tree(self):
+        tree = [0] * (len(self._blocks) + 1)
+        for index, block in enumerate(self._blocks, start=1):
+            tree[index] += len(block)
+            parent = index + (index & -index)
+            if parent < len(tree):
+                tree[parent] += tree[index]
+        self._tree = tree
 
-    async def put(self, task_id: int) -> None:
-        if task_id in self._cancelled_tasks:
-            self._cancelled_tasks.remove(task_id)
-        await self._queue.put(task_id)
+    def _update_tree(self, block_index: int, delta: int):
+        index = block_index + 1
+        while index < len(self._tree):
+            self._tree[index] += delta
+            index += index & -index
+
+    def _prefix_sum(self, block_count: int) -> int:
+        result = 0
+        index = block_count
+        while index > 0:
+            result += self._tree[index]
+            index -= index & -index
+        return result
+
+
+class TaskQueue(IConsumableTaskQueue):
+    """
+    Priority queue with weighted fair sharing between tenants.
+
+    Tasks with higher priority are always dequeued first.
+    Inside one priority tenants are served by self-clocked fair queueing:
+    every task gets a virtual finish tag `max(virtual time, previous tag of the tenant) + 1 / weight`
+    and tasks are dequeued in order of their tags, so a tenant with a huge backlog
+    can't delay tasks of other tenants for more than its share.
+
+    Queued tasks are indexed by id: cancellation marks the heap entry as a tombstone,
+    tombstones are skipped on `get` and dropped by periodic compaction of the heap.
+    """
+
+    def __init__(self, config: TaskQueueConfig):
+        self._config = config
+        self._heap: List[QueueEntry] = []
+        self._entries: Dict[int, QueueEntry] = {}
+        self._rank_index = RankIndex()
+        self._tombstones = 0
+        self._sequence = itertools.count()
+        # virtual time of every priority is the tag of the last dequeued task of that priority
+        self._virtual_times: Dict[int, float] = {}
+        self._tenant_finish_tags: Dict[Tuple[int, Optional[str]], float] = {}
+        self._not_empty = asyncio.Event()
+
+    async def put(self, task_id: int, priority: int = 0, tenant: Optional[str] = None) -> None:
+        self._push(task_id, priority, tenant)
+
+    async def put_many(self, items: List[TaskQueueItem]) -> None:
+        for item in items:
+            self._push(item.task_id, item.priority, item.tenant)
 
     async def get(self) -> int:
-        task_id: int = await self._queue.get()
-        self._queue.task_done()
-        return task_id
+        while not self._entries:
+            self._not_empty.clear()
+            await self._not_empty.wait()
+
+        entry = heapq.heappop(self._heap)
+        while entry.is_cancelled:
+            self._tombstones -= 1
+            entry = heapq.heappop(self._heap)
+
+        del self._entries[entry.task_id]
+        self._rank_index.remove(entry.key)
+
+        negative_priority, finish_tag, _ = entry.key
+        if self._entries:
+            self._virtual_times[-negative_priority] = finish_tag
+        else:
+            # nothing is backlogged, so tags of idle tenants don't need to be kept
+            self._heap.clear()
+            self._tombstones = 0
+            self._virtual_times.clear()
+            self._tenant_finish_tags.clear()
+        return entry.task_id
 
     async def cancel(self, task_id: int) -> None:
-        self._cancelled_tasks.add(task_id)
+        if task_id in self._entries:
+            self._cancel_entry(task_id)
+
+    async def get_position(self, task_id: int) -> Optional[int]:
+        entry = self._entries.get(task_id)
+        if entry is None:
+            return None
+        return self._rank_index.rank(entry.key)
+
+    async def size(self) -> int:
+        return len(self._entries)
+
+    async def is_empty(self) -> bool:
+        return not self._entries
+
+    def _push(self, task_id: int, priority: int, tenant: Optional[str]):
+        if task_id in self._entries:
+            # task is already queued, it is re-queued with new parameters
+            self._cancel_entry(task_id)
+
+        tenant_key = (priority, tenant)
+        start_tag = max(
+            self._virtual_times.get(priority, 0.0),
+            self._tenant_finish_tags.get(tenant_key, 0.0)
+        )
+        finish_tag = start_tag + 1.0 / self._get_tenant_weight(tenant)
+        self._tenant_finish_tags[tenant_key] = finish_tag
+
+        entry = QueueEntry((-priority, finish_tag, next(self._sequence)), task_id)
+        self._entries[task_id] = entry
+        self._rank_index.add(entry.key)
+        heapq.heappush(self._heap, entry)
+        self._not_empty.set()
+
+    def _cancel_entry(self, task_id: int):
+        entry = self._entries.pop(task_id)
+        entry.is_cancelled = True
+        self._tombstones += 1
+        self._rank_index.remove(entry.key)
+
+        if self._tombstones > MIN_TOMBSTONES_TO_COMPACT and self._tombstones > len(self._entries):
+            self._compact()
 
-    def is_task_cancelled(self, task_id: int) -> bool:
-        return task_id in self._cancelled_tasks
+    def _compact(self):
+        logger.info(f"Compacting task queue: {self._tombstones} cancelled of {len(self._heap)} entries.")
+        self._heap = list(self._entries.values())
+        heapq.heapify(self._heap)
+        self._tombstones = 0
 
-    def is_empty(self) -> bool:
-        return self._queue.empty()
+        # tags which are behind virtual time of their priority don't affect new tasks anymore
+        self._tenant_finish_tags = {
+            tenant_key: finish_tag
+            for tenant_key, finish_tag in self._tenant_finish_tags.items()
+            if finish_tag > self._virtual_times.get(tenant_key[0], 0.0)
+        }
 
+    def _get_tenant_weight(self, tenant: Optional[str]) -> float:
+        if tenant is None:
+            return self._config.default_tenant_weight
+        return self._config.tenant_weights.get(tenant, self._config.default_tenant_weight)
 
 
-def build_task_queue() -> ITaskQueue:
-    return TaskQueue()
+def build_task_queue(config: TaskQueueConfig) -> IConsumableTaskQueue:
+    return TaskQueue(config)
@@ -1,19 +1,46 @@
 import abc
+import asyncio
+import hashlib
+import os
+import secrets
+import shutil
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
+from typing import AsyncIterable
+from typing import BinaryIO
+from typing import Optional
+from typing import Union
 
+from app.exceptions import InputDataTooLargeException
 from app.exceptions import NoSuchTaskException
 from app.exceptions import NoTaskOutputDataException
+from app.exceptions import NoTaskProfileException
 from app.logger import get_logger
 
 logger = get_logger(__name__)
 
 __all__ = [
+    "AsyncExecutorTaskDataStorage",
+    "build_async_executor_task_data_storage",
     "build_executor_task_data_storage",
     "IExecutorTaskDataStorage",
-    "ExecutorTaskDataStorageConfig"
+    "ExecutorTaskDataStorageConfig",
+    "UploadedInput",
 ]
 
+DEFAULT_ROOT_DATA_FOLDER = Path(__file__).parent / "data"
+UPLOADS_FOLDER_NAME = "uploads"
+PROFILE_FILENAME = "profile.pstats"
+
+
+@dataclass(frozen=True)
+class UploadedInput:
+    path: str
+    size: int
+    # sha256 of the uploaded bytes
+    checksum: str
+
 
 class IExecutorTaskDataStorage(abc.ABC):
     @abc.abstractmethod
@@ -32,15 +59,75 @@ class IExecutorTaskDataStorage(abc.ABC):
     def set_output_data(self, task_id: int, output_data: str) -> None:
         pass
 
+    @abc.abstractmethod
+    def get_output_path(self, task_id: int) -> Path:
+        pass
+
+    @abc.abstractmethod
+    def link_output_data(self, task_id: int, source_path: Path) -> Path:
+        """
+        Makes the file the output of the task without copying when it is possible, returns the output path.
+        """
+        pass
+
+    @abc.abstractmethod
+    def delete_output_data(self, task_id: int) -> None:
+        pass
+
+    @abc.abstractmethod
+    def set_profile_data(self, task_id: int, profile_data: bytes) -> None:
+        """
+        Stores the profile of the task run in `pstats` format.
+        """
+        pass
+
+    @abc.abstractmethod
+    def get_profile_path(self, task_id: int) -> Path:
+        pass
+
+    @abc.abstractmethod
+    def link_input_data(self, task_id: int, source_path: Path) -> Path:
+        """
+        Makes the uploaded file the input of the task without copying when it is possible, returns the input path.
+        """
+        pass
+
+    @abc.abstractmethod
+    def open_upload(self) -> BinaryIO:
+        """
+        Opens a new file for input data which is uploaded before its task is created.
+        """
+        pass
+
+    @abc.abstractmethod
+    def complete_upload(self, file: BinaryIO) -> Path:
+        """
+        Closes the file opened by `open_upload` and returns the path of the uploaded input data.
+        """
+        pass
+
+    @abc.abstractmethod
+    def discard_upload(self, file: BinaryIO) -> None:
+        pass
+
 
 class FileExecutorTaskDataStorage(IExecutorTaskDataStorage):
-    def __init__(self, root_data_folder: Path):
+    """
+    Keeps data of every task in its own folder `<root>/<shard>/<task_id>`.
+
+    Shard is a prefix of the task id hash, so no folder grows with the amount of tasks.
+    Files are written to a temporary file and renamed, readers never see a partial file.
+    """
+
+    def __init__(self, root_data_folder: Path, shard_prefix_length: int = 2, fsync: bool = False):
         if root_data_folder.is_file():
             logger.error(f"{root_data_folder} is file, not directory")
             raise ValueError(f"Path `{root_data_folder} must be a directory, not a file.")
 
         root_data_folder.mkdir(exist_ok=True, parents=True)
         self._root_data_folder = root_data_folder
+        self._shard_prefix_length = shard_prefix_length
+        self._fsync = fsync
 
     def get_input_data(self, task_id: int) -> str:
         path_to_file = self._get_path_to_file(task_id, is_input_data=True)
@@ -76,8 +163,75 @@ class FileExecutorTaskDataStorage(IExecutorTaskDataStorage):
         except Exception:
             logger.exception(f'Unable to save output data for task id=`{task_id}`.')
 
+    def get_output_path(self, task_id: int) -> Path:
+        path_to_file = self._get_path_to_file(task_id, is_input_data=False)
+        if not path_to_file.is_file():
+            raise NoTaskOutputDataException(task_id)
+        return path_to_file
+
+    def link_output_data(self, task_id: int, source_path: Path) -> Path:
+        path_to_file = self._get_path_to_file(task_id, is_input_data=False)
+        try:
+            self._link_data(path_to_file, source_path)
+        except FileNotFoundError:
+            raise NoTaskOutputDataException(task_id)
+        return path_to_file
+
+    def delete_output_data(self, task_id: int) -> None:
+        path_to_file = self._get_path_to_file(task_id, is_input_data=False)
+        logger.info(f"Delete output data of task id={task_id} from {path_to_file}")
+        try:
+            self._remove_file(path_to_file)
+        except Exception:
+            logger.exception(f'Unable to delete output data for task id=`{task_id}`.')
+
+    def set_profile_data(self, task_id: int, profile_data: bytes) -> None:
+        path_to_file = self._get_data_folder(task_id) / PROFILE_FILENAME
+        logger.info(f"Save profile of task id={task_id} to {path_to_file}")
+        try:
+            self._save_data(path_to_file, profile_data)
+        except Exception:
+            logger.exception(f'Unable to save profile for task id=`{task_id}`.')
+
+    def get_profile_path(self, task_id: int) -> Path:
+        path_to_file = self._get_data_folder(task_id) / PROFILE_FILENAME
+        if not path_to_file.is_file():
+            raise NoTaskProfileException(task_id)
+        return path_to_file
+
+    def link_input_data(self, task_id: int, source_path: Path) -> Path:
+        path_to_file = self._get_path_to_file(task_id, is_input_data=True)
+        try:
+            self._link_data(path_to_file, source_path)
+        except FileNotFoundError:
+            logger.exception(f'Unable to find uploaded input data for task id=`{task_id}`.')
+            raise NoSuchTaskException(task_id)
+        return path_to_file
+
+    def open_upload(self) -> BinaryIO:
+        uploads_folder = self._root_data_folder / UPLOADS_FOLDER_NAME
+        uploads_folder.mkdir(exist_ok=True, parents=True)
+        return open(str(uploads_folder / f".{secrets.token_hex(16)}.tmp"), "wb")
+
+    def complete_upload(self, file: BinaryIO) -> Path:
+        path_to_tmp_file = Path(file.name)
+        try:
+            if self._fsync:
+                file.flush()
+                os.fsync(file.fileno())
+        finally:
+            file.close()
+        path_to_file = path_to_tmp_file.with_name(path_to_tmp_file.name[1:-len(".tmp")])
+        os.replace(str(path_to_tmp_file), str(path_to_file))
+        return path_to_file
+
+    def discard_upload(self, file: BinaryIO) -> None:
+        file.close()
+        self._remove_file(Path(file.name))
+
     def _get_data_folder(self, task_id: int) -> Path:
-        return self._root_data_folder / str(task_id)
+        shard = hashlib.md5(str(task_id).encode()).hexdigest()[:self._shard_prefix_length]
+        return self._root_data_folder / shard / str(task_id)
 
     def _get_path_to_file(self, task_id: int, is_input_data: bool) -> Path:
         if is_input_data:
@@ -88,10 +242,43 @@ class FileExecutorTaskDataStorage(IExecutorTaskDataStorage):
         data_folder = self._get_data_folder(task_id)
         return data_folder / filename
 
-    def _save_data(self, path_to_file: Path, data: str) -> None:
+    def _save_data(self, path_to_file: Path, data: Union[str, bytes]) -> None:
+        path_to_file.parent.mkdir(exist_ok=True, parents=True)
+        # threads of the same process may write the same file concurrently
+        path_to_tmp_file = path_to_file.with_name(f".{path_to_file.name}.{secrets.token_hex(16)}.tmp")
+        try:
+            with open(str(path_to_tmp_file), 'wb' if isinstance(data, bytes) else 'w') as file:
+                file.write(data)
+                if self._fsync:
+                    file.flush()
+                    os.fsync(file.fileno())
+            os.replace(str(path_to_tmp_file), str(path_to_file))
+        except BaseException:
+            self._remove_file(path_to_tmp_file)
+            raise
+
+    def _link_data(self, path_to_file: Path, source_path: Path) -> None:
         path_to_file.parent.mkdir(exist_ok=True, parents=True)
-        with open(str(path_to_file), 'w') as file:
-            file.write(data)
+        # threads of the same process may write the same file concurrently
+        path_to_tmp_file = path_to_file.with_name(f".{path_to_file.name}.{secrets.token_hex(16)}.tmp")
+        try:
+            try:
+                os.link(str(source_path), str(path_to_tmp_file))
+            except FileNotFoundError:
+                raise
+            except OSError:
+                # hard links don't work across file systems
+                shutil.copyfile(str(source_path), str(path_to_tmp_file))
+            os.replace(str(path_to_tmp_file), str(path_to_file))
+        except BaseException:
+            self._remove_file(path_to_tmp_file)
+            raise
+
+    def _remove_file(self, path_to_file: Path) -> None:
+        try:
+            path_to_file.unlink()
+        except FileNotFoundError:
+            pass
 
     def _load_data(self, path_to_file: Path) -> str:
         with open(str(path_to_file), 'r') as file:
@@ -99,11 +286,94 @@ class FileExecutorTaskDataStorage(IExecutorTaskDataStorage):
         return data
 
 
+class AsyncExecutorTaskDataStorage:
+    """
+    Runs operations of executor task data storage in a bounded thread pool,
+    so writing of large inputs doesn't block the event loop.
+    """
+
+    def __init__(self, storage: IExecutorTaskDataStorage, io_threads: int):
+        self._storage = storage
+        self._executor = ThreadPoolExecutor(max_workers=io_threads, thread_name_prefix="executor-storage")
+
+    async def get_input_data(self, task_id: int) -> str:
+        return await self._run(self._storage.get_input_data, task_id)
+
+    async def set_input_data(self, task_id: int, input_data: str) -> None:
+        await self._run(self._storage.set_input_data, task_id, input_data)
+
+    async def get_output_data(self, task_id: int) -> str:
+        return await self._run(self._storage.get_output_data, task_id)
+
+    async def set_output_data(self, task_id: int, output_data: str) -> None:
+        await self._run(self._storage.set_output_data, task_id, output_data)
+
+    async def get_output_path(self, task_id: int) -> Path:
+        return await self._run(self._storage.get_output_path, task_id)
+
+    async def link_output_data(self, task_id: int, source_path: Path) -> Path:
+        return await self._run(self._storage.link_output_data, task_id, source_path)
+
+    async def delete_output_data(self, task_id: int) -> None:
+        await self._run(self._storage.delete_output_data, task_id)
+
+    async def get_profile_path(self, task_id: int) -> Path:
+        return await self._run(self._storage.get_profile_path, task_id)
+
+    async def link_input_data(self, task_id: int, source_path: Path) -> Path:
+        return await self._run(self._storage.link_input_data, task_id, source_path)
+
+    async def upload_input_data(self, chunks: AsyncIterable[bytes], max_size: int) -> UploadedInput:
+        """
+        Writes chunks to a new file as they arrive, so the whole input is never kept in memory.
+        """
+        file = await self._run(self._storage.open_upload)
+        checksum = hashlib.sha256()
+        size = 0
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+                if size > max_size:
+                    raise InputDataTooLargeException(max_size)
+                await self._run(write_chunk, file, checksum, chunk)
+            path_to_file = await self._run(self._storage.complete_upload, file)
+        except BaseException:
+            # it mustn't be awaited, the request may be cancelled
+            self._executor.submit(self._storage.discard_upload, file)
+            # an abandoned async generator is finalized only by the garbage collector, maybe after the loop is closed
+            if hasattr(chunks, "aclose"):
+                await chunks.aclose()
+            raise
+        return UploadedInput(str(path_to_file), size, checksum.hexdigest())
+
+    def close(self) -> None:
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, function, *args)
+
+
+def write_chunk(file: BinaryIO, checksum, chunk: bytes) -> None:
+    # hashing of large chunks releases GIL, so it doesn't slow down the event loop as well
+    file.write(chunk)
+    checksum.update(chunk)
+
+
 @dataclass
 class ExecutorTaskDataStorageConfig:
-    pass
+    # `None` means `data` folder next to this module
+    root_data_folder: Optional[str] = None
+    # amount of hex digits of task id hash used as the shard folder name
+    shard_prefix_length: int = 2
+    fsync: bool = False
+    io_threads: int = 4
 
 
 def build_executor_task_data_storage(config: ExecutorTaskDataStorageConfig) -> IExecutorTaskDataStorage:
-    root_data_folder = Path(__file__).parent
-    return FileExecutorTaskDataStorage(root_data_folder)
+    root_data_folder = Path(config.root_data_folder) if config.root_data_folder else DEFAULT_ROOT_DATA_FOLDER
+    return FileExecutorTaskDataStorage(root_data_folder, config.shard_prefix_length, config.fsync)
+
+
+def build_async_executor_task_data_storage(config: ExecutorTaskDataStorageConfig) -> AsyncExecutorTaskDataStorage:
+    return AsyncExecutorTaskDataStorage(build_executor_task_data_storage(config), config.io_threads)
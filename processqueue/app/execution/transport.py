@@ -0,0 +1,99 @@
+import os
+import secrets
+from dataclasses import dataclass
+from multiprocessing import resource_tracker
+from multiprocessing.shared_memory import SharedMemory
+
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "INPUT_TRANSPORT_FILE",
+    "INPUT_TRANSPORT_SHARED_MEMORY",
+    "SharedMemoryInput",
+    "attach_shared_memory_input",
+    "create_shared_memory_input",
+    "create_shared_memory_input_from_file",
+    "release_shared_memory_input",
+    "start_shared_memory_tracker",
+]
+
+INPUT_TRANSPORT_FILE = "file"
+INPUT_TRANSPORT_SHARED_MEMORY = "shared_memory"
+
+
+@dataclass(frozen=True)
+class SharedMemoryInput:
+    """
+    Reference to the input data placed into a shared memory segment, it is sent to a worker instead of the data.
+    """
+    name: str
+    size: int
+
+
+def create_segment(task_id: int, size: int) -> SharedMemory:
+    # segment can't be empty
+    return SharedMemory(
+        name=f"processqueue-{task_id}-{secrets.token_hex(4)}",
+        create=True,
+        size=max(1, size)
+    )
+
+
+def create_shared_memory_input(task_id: int, input_data: str) -> SharedMemoryInput:
+    encoded_input_data = input_data.encode()
+    segment = create_segment(task_id, len(encoded_input_data))
+    try:
+        segment.buf[:len(encoded_input_data)] = encoded_input_data
+    finally:
+        segment.close()
+    return SharedMemoryInput(segment.name, len(encoded_input_data))
+
+
+def create_shared_memory_input_from_file(task_id: int, path_to_file: str) -> SharedMemoryInput:
+    size = os.path.getsize(path_to_file)
+    segment = create_segment(task_id, size)
+    try:
+        buffer = segment.buf[:size]
+        try:
+            # file is read right into the segment without an intermediate copy
+            with open(path_to_file, "rb") as file:
+                file.readinto(buffer)
+        finally:
+            buffer.release()
+    except BaseException:
+        segment.close()
+        segment.unlink()
+        raise
+    segment.close()
+    return SharedMemoryInput(segment.name, size)
+
+
+def release_shared_memory_input(shared_memory_input: SharedMemoryInput) -> None:
+    """
+    Removes the segment, it is called by the pool process when the task is completed, failed or cancelled.
+    """
+    try:
+        segment = SharedMemory(name=shared_memory_input.name)
+    except FileNotFoundError:
+        return
+    segment.close()
+    segment.unlink()
+
+
+def attach_shared_memory_input(shared_memory_input: SharedMemoryInput) -> SharedMemory:
+    """
+    Maps the segment into a worker process, input data is available as `segment.buf[:size]`.
+    """
+    return SharedMemory(name=shared_memory_input.name)
+
+
+def start_shared_memory_tracker() -> None:
+    """
+    Starts the resource tracker before workers are started, so they share it with the pool process.
+
+    Otherwise every worker starts its own tracker which unlinks attached segments when the worker exits.
+    The shared tracker removes segments left by a crashed pool process.
+    """
+    resource_tracker.ensure_running()
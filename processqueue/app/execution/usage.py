@@ -0,0 +1,104 @@
+import resource
+import time
+from dataclasses import dataclass
+from typing import Optional
+from typing import Tuple
+
+from app.domain.model import TaskResourceUsage
+
+__all__ = [
+    "ResourceUsageSnapshot",
+    "get_resource_usage",
+    "take_resource_usage_snapshot",
+]
+
+PROC_SELF_IO = "/proc/self/io"
+PROC_SELF_STATUS = "/proc/self/status"
+PROC_SELF_CLEAR_REFS = "/proc/self/clear_refs"
+# writing it to `clear_refs` resets the peak resident set size of the process, Linux 4.0+
+CLEAR_REFS_PEAK_RSS = "5"
+# `ru_inblock` and `ru_oublock` are counted in 512-byte blocks
+BLOCK_SIZE = 512
+
+
+@dataclass
+class ResourceUsageSnapshot:
+    wall_time: float
+    rusage: resource.struct_rusage
+    # `None` when `/proc/self/io` isn't available
+    io: Optional[Tuple[int, int]]
+    is_peak_rss_reset: bool
+
+
+def read_io() -> Optional[Tuple[int, int]]:
+    try:
+        with open(PROC_SELF_IO) as file:
+            counters = dict(line.split(": ") for line in file.read().splitlines())
+        return int(counters["read_bytes"]), int(counters["write_bytes"])
+    except (OSError, KeyError, ValueError):
+        return None
+
+
+def reset_peak_rss() -> bool:
+    try:
+        with open(PROC_SELF_CLEAR_REFS, "w") as file:
+            file.write(CLEAR_REFS_PEAK_RSS)
+        return True
+    except OSError:
+        return False
+
+
+def read_peak_rss() -> Optional[int]:
+    try:
+        with open(PROC_SELF_STATUS) as file:
+            for line in file:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+def take_resource_usage_snapshot() -> ResourceUsageSnapshot:
+    """
+    Is taken by a worker right before the task run.
+    """
+    is_peak_rss_reset = reset_peak_rss()
+    return ResourceUsageSnapshot(
+        wall_time=time.perf_counter(),
+        rusage=resource.getrusage(resource.RUSAGE_SELF),
+        io=read_io(),
+        is_peak_rss_reset=is_peak_rss_reset,
+    )
+
+
+def get_resource_usage(snapshot: ResourceUsageSnapshot) -> TaskResourceUsage:
+    """
+    Returns resources spent by the worker since the snapshot.
+
+    Peak RSS of a reused worker is the peak of its whole life when it can't be reset.
+    """
+    wall_time = time.perf_counter() - snapshot.wall_time
+    rusage = resource.getrusage(resource.RUSAGE_SELF)
+
+    io = read_io()
+    if io is not None and snapshot.io is not None:
+        read_bytes = io[0] - snapshot.io[0]
+        write_bytes = io[1] - snapshot.io[1]
+    else:
+        read_bytes = (rusage.ru_inblock - snapshot.rusage.ru_inblock) * BLOCK_SIZE
+        write_bytes = (rusage.ru_oublock - snapshot.rusage.ru_oublock) * BLOCK_SIZE
+
+    max_rss = read_peak_rss() if snapshot.is_peak_rss_reset else None
+    if max_rss is None:
+        # kilobytes on Linux
+        max_rss = rusage.ru_maxrss * 1024
+
+    return TaskResourceUsage(
+        wall_time=wall_time,
+        cpu_user_time=rusage.ru_utime - snapshot.rusage.ru_utime,
+        cpu_system_time=rusage.ru_stime - snapshot.rusage.ru_stime,
+        max_rss=max_rss,
+        read_bytes=read_bytes,
+        write_bytes=write_bytes,
+    )
@@ -0,0 +1,178 @@
+import asyncio
+import math
+import time
+from bisect import bisect_left
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Sequence
+from typing import Tuple
+
+__all__ = [
+    "CONTENT_TYPE_METRICS",
+    "Gauge",
+    "Histogram",
+    "HistogramFamily",
+    "LAG_BUCKETS",
+    "LATENCY_BUCKETS",
+    "MetricsRegistry",
+    "monitor_event_loop_lag",
+]
+
+CONTENT_TYPE_METRICS = "text/plain; version=0.0.4; charset=utf-8"
+
+# seconds, from a fast request to a long task
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+    1., 2.5, 5., 10., 30., 60., 120., 300., 600., 1800., 3600.,
+)
+
+# seconds, event loop lag is expected to be far below a second
+LAG_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.)
+
+Labels = Tuple[str, ...]
+
+
+def format_labels(label_names: Sequence[str], label_values: Sequence[str]) -> str:
+    # pairs without braces, so `le` label of histogram buckets can be appended
+    return ",".join(
+        f'{name}="{escape_label_value(value)}"'
+        for name, value in zip(label_names, label_values)
+    )
+
+
+def escape_label_value(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value))
+
+
+class Histogram:
+    """
+    Histogram with buckets allocated once.
+
+    Metrics are changed only in the event loop, so `observe` is a bisect and three increments without any lock.
+    """
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self._buckets = tuple(buckets)
+        # the last one is `+Inf`
+        self._counts = [0] * (len(self._buckets) + 1)
+        self._sum = 0.
+        self._count = 0
+
+    def observe(self, value: float) -> None:
+        self._counts[bisect_left(self._buckets, value)] += 1
+        self._sum += value
+        self._count += 1
+
+    def render(self, name: str, labels: str = "") -> List[str]:
+        lines = []
+        prefix = f"{labels}," if labels else ""
+        cumulative_count = 0
+        for upper_bound, count in zip(self._buckets + (math.inf,), self._counts):
+            cumulative_count += count
+            lines.append(f'{name}_bucket{{{prefix}le="{format_value(upper_bound)}"}} {cumulative_count}')
+        suffix = f"{{{labels}}}" if labels else ""
+        lines.append(f"{name}_sum{suffix} {format_value(self._sum)}")
+        lines.append(f"{name}_count{suffix} {self._count}")
+        return lines
+
+
+class HistogramFamily:
+    """
+    Histograms of one metric with different label values, a histogram is created on the first observation.
+    """
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str], buckets: Sequence[float]):
+        self.name = name
+        self.description = description
+        self._label_names = tuple(label_names)
+        self._buckets = tuple(buckets)
+        self._histograms: Dict[Labels, Histogram] = {}
+
+    def labels(self, *label_values: str) -> Histogram:
+        histogram = self._histograms.get(label_values)
+        if histogram is None:
+            histogram = self._histograms[label_values] = Histogram(self._buckets)
+        return histogram
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for label_values, histogram in sorted(self._histograms.items()):
+            lines.extend(histogram.render(self.name, format_labels(self._label_names, label_values)))
+        return lines
+
+
+class Gauge:
+    """
+    Values are set right before rendering by a collect callback of the registry.
+    """
+
+    def __init__(self, name: str, description: str, label_names: Sequence[str] = ()):
+        self.name = name
+        self.description = description
+        self._label_names = tuple(label_names)
+        self._values: Dict[Labels, float] = {}
+
+    def set(self, value: float, *label_values: str) -> None:
+        self._values[label_values] = value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} gauge"]
+        for label_values, value in sorted(self._values.items()):
+            labels = format_labels(self._label_names, label_values)
+            suffix = f"{{{labels}}}" if labels else ""
+            lines.append(f"{self.name}{suffix} {format_value(value)}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: List = []
+        self._collect_callbacks: List[Callable[[], Awaitable[None]]] = []
+
+    def histogram(
+            self,
+            name: str,
+            description: str,
+            label_names: Sequence[str] = (),
+            buckets: Sequence[float] = LATENCY_BUCKETS
+    ) -> HistogramFamily:
+        histogram_family = HistogramFamily(name, description, label_names, buckets)
+        self._metrics.append(histogram_family)
+        return histogram_family
+
+    def gauge(self, name: str, description: str, label_names: Sequence[str] = ()) -> Gauge:
+        gauge = Gauge(name, description, label_names)
+        self._metrics.append(gauge)
+        return gauge
+
+    def add_collect_callback(self, callback: Callable[[], Awaitable[None]]) -> None:
+        """
+        Callback sets values of gauges which are read from other components only when metrics are rendered.
+        """
+        self._collect_callbacks.append(callback)
+
+    async def render(self) -> str:
+        for callback in self._collect_callbacks:
+            await callback()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+async def monitor_event_loop_lag(histogram: Histogram, interval: float = 0.5) -> None:
+    """
+    Measures how much later than requested the loop wakes up a sleeping coroutine.
+    """
+    while True:
+        started_at = time.perf_counter()
+        await asyncio.sleep(interval)
+        histogram.observe(max(0., time.perf_counter() - started_at - interval))
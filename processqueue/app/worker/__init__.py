@@ -0,0 +1,9 @@
+from app.worker.client import TaskLeaseClient
+from app.worker.runner import RemoteWorker
+from app.worker.runner import RemoteWorkerConfig
+
+__all__ = [
+    "RemoteWorker",
+    "RemoteWorkerConfig",
+    "TaskLeaseClient",
+]
@@ -0,0 +1,41 @@
+import asyncio
+import os
+import signal
+
+from app.app import read_execution_config
+from app.app import read_executor_task_data_storage_config
+from app.logger import get_logger
+from app.worker.runner import RemoteWorker
+from app.worker.runner import RemoteWorkerConfig
+from app.worker.runner import get_default_worker_id
+
+logger = get_logger(__name__)
+
+
+async def work(config: RemoteWorkerConfig) -> None:
+    remote_worker = RemoteWorker(config)
+
+    loop = asyncio.get_running_loop()
+    run_task = loop.create_task(remote_worker.run())
+    for signal_number in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(signal_number, run_task.cancel)
+
+    logger.info(f"Worker `{config.worker_id}` is leasing tasks from `{config.server_url}`.")
+    try:
+        await run_task
+    except asyncio.CancelledError:
+        logger.info(f"Worker `{config.worker_id}` is stopping.")
+    finally:
+        remote_worker.stop()
+
+
+if __name__ == '__main__':
+    visibility_timeout = os.getenv("WORKER_VISIBILITY_TIMEOUT")
+    asyncio.run(work(RemoteWorkerConfig(
+        server_url=os.getenv("SERVER_URL", "http://localhost:8080"),
+        execution_config=read_execution_config(read_executor_task_data_storage_config()),
+        worker_id=os.getenv("WORKER_ID") or get_default_worker_id(),
+        concurrency=int(os.getenv("WORKER_CONCURRENCY", "1")),
+        visibility_timeout=float(visibility_timeout) if visibility_timeout else None,
+        poll_timeout=float(os.getenv("WORKER_POLL_TIMEOUT", "10")),
+    )))
@@ -0,0 +1,93 @@
+from typing import List
+from typing import Optional
+from typing import Type
+from typing import TypeVar
+
+import aiohttp
+
+from app.api.model import TaskInfo
+from app.api.model import TaskLeaseBatch
+from app.api.model import TaskLeaseCompletion
+from app.api.model import TaskLeaseFailure
+from app.api.model import TaskLeaseHeartbeat
+from app.api.model import TaskLeaseInfo
+from app.api.model import TaskLeaseRequest
+from app.api.serialization import JSON_CODEC
+from app.api.serialization import decode_body
+from app.api.serialization import encode_body
+from app.domain.model import TaskResourceUsage
+from app.exceptions import TaskLeaseExpiredException
+
+__all__ = [
+    "TaskLeaseClient",
+]
+
+T = TypeVar('T')
+
+HTTP_STATUS_CONFLICT = 409
+# time given to the server to answer on top of the long polling of a lease request
+REQUEST_TIMEOUT = 30.
+
+
+class TaskLeaseClient:
+    """
+    Client of `/workers/*` endpoints, `TaskLeaseExpiredException` is raised when the lease isn't held anymore.
+    """
+
+    def __init__(self, server_url: str, session: aiohttp.ClientSession):
+        self._server_url = server_url.rstrip("/")
+        self._session = session
+
+    async def lease(
+            self,
+            worker_id: str,
+            count: int,
+            visibility_timeout: Optional[float] = None,
+            wait: float = 0.
+    ) -> List[TaskLeaseInfo]:
+        task_lease_request = TaskLeaseRequest(
+            worker_id=worker_id,
+            count=count,
+            visibility_timeout=visibility_timeout,
+            wait=wait
+        )
+        task_lease_batch = await self._post("/workers/lease", task_lease_request, TaskLeaseBatch, wait)
+        return task_lease_batch.leases
+
+    async def heartbeat(self, lease_id: str, visibility_timeout: Optional[float] = None) -> TaskLeaseInfo:
+        task_lease_heartbeat = TaskLeaseHeartbeat(lease_id=lease_id, visibility_timeout=visibility_timeout)
+        return await self._post("/workers/heartbeat", task_lease_heartbeat, TaskLeaseInfo)
+
+    async def complete(
+            self,
+            lease_id: str,
+            output_data: str,
+            resource_usage: Optional[TaskResourceUsage] = None
+    ) -> TaskInfo:
+        task_lease_completion = TaskLeaseCompletion(
+            lease_id=lease_id,
+            output_data=output_data,
+            resource_usage=resource_usage
+        )
+        return await self._post("/workers/complete", task_lease_completion, TaskInfo)
+
+    async def fail(
+            self,
+            lease_id: str,
+            error: Optional[str] = None,
+            resource_usage: Optional[TaskResourceUsage] = None
+    ) -> TaskInfo:
+        task_lease_failure = TaskLeaseFailure(lease_id=lease_id, error=error, resource_usage=resource_usage)
+        return await self._post("/workers/fail", task_lease_failure, TaskInfo)
+
+    async def _post(self, path: str, data, response_type: Type[T], wait: float = 0.) -> T:
+        async with self._session.post(
+            self._server_url + path,
+            data=encode_body(data, JSON_CODEC),
+            headers={"content-type": JSON_CODEC.content_type},
+            timeout=aiohttp.ClientTimeout(total=wait + REQUEST_TIMEOUT)
+        ) as response:
+            if response.status == HTTP_STATUS_CONFLICT:
+                raise TaskLeaseExpiredException(data.lease_id)
+            response.raise_for_status()
+            return decode_body(response_type, await response.read(), JSON_CODEC)
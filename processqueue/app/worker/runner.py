@@ -0,0 +1,180 @@
+import asyncio
+import os
+import socket
+from dataclasses import dataclass
+from dataclasses import field
+from typing import List
+from typing import Optional
+from typing import Set
+
+import aiohttp
+
+from app.api.model import TaskLeaseInfo
+from app.domain.model import TaskResourceUsage
+from app.exceptions import TaskExecutionException
+from app.exceptions import TaskLeaseExpiredException
+from app.exceptions import WorkerExitedException
+from app.execution.executor import ExecutionConfig
+from app.execution.executor import execute_task
+from app.execution.listener import RunningTasksObserver
+from app.execution.pool import WorkerPool
+from app.execution.pool import WorkerPoolConfig
+from app.execution.result import Result
+from app.execution.storage import build_async_executor_task_data_storage
+from app.logger import get_logger
+from app.worker.client import TaskLeaseClient
+
+logger = get_logger(__name__)
+
+__all__ = [
+    "RemoteWorker",
+    "RemoteWorkerConfig",
+]
+
+# lease is extended after this share of its visibility timeout, so one lost heartbeat doesn't expire it
+HEARTBEAT_SHARE = 1 / 3
+
+
+def get_default_worker_id() -> str:
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+@dataclass
+class RemoteWorkerConfig:
+    server_url: str
+    execution_config: ExecutionConfig
+    worker_id: str = field(default_factory=get_default_worker_id)
+    # amount of tasks executed at once, every one in its own process
+    concurrency: int = 1
+    # `None` means the default of the server
+    visibility_timeout: Optional[float] = None
+    # seconds a lease request waits for a queued task
+    poll_timeout: float = 10.
+    # pause after a failed request to the server
+    retry_interval: float = 1.
+    # time given to a task to exit after SIGTERM when its lease is lost
+    termination_grace_period: float = 5.
+
+
+class RemoteWorker:
+    """
+    Leases tasks from the server and executes them with `execute_task` in pre-started worker processes.
+
+    Leases of running tasks are extended by heartbeats. A task whose lease is lost is killed,
+    the server has already queued it again or it has been cancelled.
+    """
+
+    def __init__(self, config: RemoteWorkerConfig):
+        self._config = config
+        self._loop = asyncio.get_running_loop()
+        self._worker_pool = WorkerPool(WorkerPoolConfig(
+            max_workers=config.concurrency,
+            termination_grace_period=config.termination_grace_period,
+        ))
+        self._executor_task_data_storage = build_async_executor_task_data_storage(
+            config.execution_config.executor_task_data_storage_config
+        )
+        self._running_tasks_observer = RunningTasksObserver(config.concurrency)
+        self._running_tasks: Set[asyncio.Task] = set()
+
+    async def run(self):
+        async with aiohttp.ClientSession() as session:
+            client = TaskLeaseClient(self._config.server_url, session)
+            try:
+                while True:
+                    await self._running_tasks_observer.wait_for_available_slot()
+                    await self._lease_tasks(client)
+            finally:
+                for running_task in self._running_tasks:
+                    running_task.cancel()
+                await asyncio.gather(*self._running_tasks, return_exceptions=True)
+
+    def stop(self):
+        self._worker_pool.shutdown(wait=True)
+        self._executor_task_data_storage.close()
+
+    async def _lease_tasks(self, client: TaskLeaseClient):
+        count = self._config.concurrency - self._running_tasks_observer.running_tasks_count
+        try:
+            leases = await client.lease(
+                self._config.worker_id,
+                count,
+                self._config.visibility_timeout,
+                self._config.poll_timeout
+            )
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            logger.exception(f"Unable to lease tasks from `{self._config.server_url}`.")
+            await asyncio.sleep(self._config.retry_interval)
+            return
+
+        for lease in leases:
+            logger.info(f"Received task id=`{lease.task_id}` with lease `{lease.lease_id}`.")
+            self._running_tasks_observer.take_slot()
+            running_task = self._loop.create_task(self._execute_task(client, lease))
+            self._running_tasks.add(running_task)
+            running_task.add_done_callback(self._release_task)
+
+    async def _execute_task(self, client: TaskLeaseClient, lease: TaskLeaseInfo):
+        task_id = lease.task_id
+        await self._executor_task_data_storage.set_input_data(task_id, lease.input_data)
+
+        resource_usages: List[TaskResourceUsage] = []
+        execution = self._loop.create_task(self._worker_pool.submit(
+            task_id,
+            execute_task,
+            self._config.execution_config,
+            task_id,
+            resource_usage_listener=resource_usages.append
+        ))
+        heartbeat = self._loop.create_task(self._heartbeat(client, lease, execution))
+        try:
+            result = await execution
+        except asyncio.CancelledError:
+            if not heartbeat.done() or heartbeat.cancelled():
+                raise
+            # the worker is already stopped by the pool
+            logger.info(f"Execution of task id=`{task_id}` is stopped, its lease is lost.")
+            await self._executor_task_data_storage.delete_output_data(task_id)
+            return
+        except (TaskExecutionException, WorkerExitedException):
+            result = Result.FAILURE
+        finally:
+            heartbeat.cancel()
+
+        resource_usage = resource_usages[-1] if resource_usages else None
+        try:
+            if result is Result.SUCCESS:
+                output_data = await self._executor_task_data_storage.get_output_data(task_id)
+                await client.complete(lease.lease_id, output_data, resource_usage)
+                logger.info(f"Execution of task id=`{task_id}` is completed successfully.")
+            else:
+                await client.fail(lease.lease_id, f"Execution of task id=`{task_id}` has failed.", resource_usage)
+                logger.info(f"Execution of task id=`{task_id}` is failed.")
+        except TaskLeaseExpiredException:
+            logger.warning(f"Result of task id=`{task_id}` is dropped, its lease is lost.")
+        except (aiohttp.ClientError, asyncio.TimeoutError):
+            # the lease expires and the task is executed again
+            logger.exception(f"Unable to report result of task id=`{task_id}`.")
+        finally:
+            await self._executor_task_data_storage.delete_output_data(task_id)
+
+    async def _heartbeat(self, client: TaskLeaseClient, lease: TaskLeaseInfo, execution: asyncio.Task):
+        """
+        Returns when the lease is lost, the execution is cancelled then.
+        """
+        visibility_timeout = lease.visibility_timeout
+        while True:
+            await asyncio.sleep(visibility_timeout * HEARTBEAT_SHARE)
+            try:
+                task_lease_info = await client.heartbeat(lease.lease_id, self._config.visibility_timeout)
+                visibility_timeout = task_lease_info.visibility_timeout
+            except TaskLeaseExpiredException:
+                logger.warning(f"Lease `{lease.lease_id}` of task id=`{lease.task_id}` is lost.")
+                execution.cancel()
+                return
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                logger.exception(f"Unable to extend lease `{lease.lease_id}` of task id=`{lease.task_id}`.")
+
+    def _release_task(self, running_task: asyncio.Task):
+        self._running_tasks.discard(running_task)
+        self._running_tasks_observer.return_slot()
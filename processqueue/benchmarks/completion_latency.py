@@ -0,0 +1,104 @@
+"""
+Measures the gap between the moment a worker process finishes a task and the moment
+the listener reports the task as `SUCCESS`.
+
+Usage:
+    python -m benchmarks.completion_latency --tasks 50 --max-running-tasks 2
+"""
+import argparse
+import asyncio
+import json
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict
+
+from app.data import TaskRepositoryConfig
+from app.data import build_task_repository
+from app.domain.model import TaskStatus
+from app.execution import executor
+from app.execution import handler
+from app.execution.executor import ExecutionConfig
+from app.execution.executor import WorkloadConfig
+from app.execution.listener import ListenerConfig
+from app.execution.listener import build_task_queue_listener
+from app.execution.queue import TaskQueueConfig
+from app.execution.queue import build_task_queue
+from app.execution.storage import ExecutorTaskDataStorageConfig
+
+FINISH_TIMESTAMPS_FOLDER = Path(tempfile.mkdtemp(prefix="completion-latency-"))
+
+original_execute_long_task = executor.execute_long_task
+
+
+def execute_long_task_and_record_finish(config: ExecutionConfig, task_id: int, *args):
+    original_execute_long_task(config, task_id, *args)
+
+    path_to_file = FINISH_TIMESTAMPS_FOLDER / str(task_id)
+    path_to_file.write_text(repr(time.time()))
+
+
+async def run(tasks: int, max_running_tasks: int) -> Dict[str, float]:
+    handler.execute_long_task = execute_long_task_and_record_finish
+
+    task_repository = build_task_repository(TaskRepositoryConfig())
+    task_queue = build_task_queue(TaskQueueConfig())
+    listener_config = ListenerConfig(
+        # the benchmark measures listener overhead, not the payload itself
+        execution_config=ExecutionConfig(ExecutorTaskDataStorageConfig(), workload=WorkloadConfig(sleep=0.)),
+        max_running_tasks=max_running_tasks,
+    )
+    listener = build_task_queue_listener(task_repository, task_queue, listener_config)
+
+    success_timestamps: Dict[int, float] = {}
+    set_task_status = task_repository.set_task_status
+
+    async def set_task_status_and_record(task_id: int, status: TaskStatus) -> None:
+        if status is TaskStatus.SUCCESS:
+            success_timestamps[task_id] = time.time()
+        await set_task_status(task_id, status)
+
+    task_repository.set_task_status = set_task_status_and_record
+
+    listen_task = asyncio.get_running_loop().create_task(listener.listen())
+    started_at = time.monotonic()
+    for index in range(tasks):
+        task = await task_repository.create_task(f"task {index}")
+        await task_queue.put(task.task_id)
+        await task_repository.set_task_status(task.task_id, TaskStatus.QUEUED)
+
+    while len(success_timestamps) < tasks:
+        await asyncio.sleep(0.01)
+    elapsed = time.monotonic() - started_at
+
+    listen_task.cancel()
+    listener.stop()
+
+    gaps = sorted(
+        (success_timestamps[task_id] - float((FINISH_TIMESTAMPS_FOLDER / str(task_id)).read_text())) * 1000.
+        for task_id in success_timestamps
+    )
+    return {
+        "tasks": tasks,
+        "max_running_tasks": max_running_tasks,
+        "elapsed_s": elapsed,
+        "finish_to_success_mean_ms": statistics.mean(gaps),
+        "finish_to_success_p50_ms": gaps[len(gaps) // 2],
+        "finish_to_success_p99_ms": gaps[min(len(gaps) - 1, int(len(gaps) * 0.99))],
+        "finish_to_success_max_ms": gaps[-1],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=50)
+    parser.add_argument("--max-running-tasks", type=int, default=2)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.tasks, args.max_running_tasks))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+"""
+Runs create/run/status/output scenarios against the service and reports throughput and latency as JSON.
+
+The service is started in-process by `startup_app()` or as a `main.py` subprocess, the latter keeps
+the load generator out of the event loop of the service. Tasks execute the synthetic workload given by
+`--sleep`, `--cpu-time` and `--io-bytes` instead of the default two seconds sleep.
+
+Arrival of scenarios is either closed (`--concurrency` clients start a new scenario when the previous one ends)
+or open (`fixed` or `poisson` arrivals at `--rate` scenarios per second whatever the service latency is).
+
+Usage:
+    python -m benchmarks.load --tasks 200 --arrival closed --concurrency 8
+    python -m benchmarks.load --tasks 200 --arrival poisson --rate 20 --cpu-time 0.05 --sleep 0 --server subprocess
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from aiohttp import ClientSession
+from aiohttp import TCPConnector
+from aiohttp import web
+
+from app import startup_app
+
+PACKAGE_FOLDER = Path(__file__).parent.parent
+TERMINAL_STATUSES = {"SUCCESS", "FAILURE", "CANCELLED", "TIMEOUT"}
+WAIT_TIMEOUT = 300.
+SERVER_START_TIMEOUT = 30.
+# `wait` is a long poll lasting as long as the task, it is left out of the aggregated request latency
+LONG_POLL_REQUESTS = {"wait"}
+BUCKET_LE_PATTERN = re.compile(r'le="([^"]+)"')
+
+
+class LoadStats:
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.errors: Dict[str, int] = defaultdict(int)
+        self.end_to_end: List[float] = []
+        self.statuses: Dict[str, int] = defaultdict(int)
+        self.slot_utilization: List[float] = []
+        self.queue_depth: List[float] = []
+
+
+def percentile(values: List[float], quantile: float) -> float:
+    values = sorted(values)
+    return values[max(0, math.ceil(quantile * len(values)) - 1)] if values else 0.
+
+
+def summarize(values: List[float]) -> Dict[str, float]:
+    # milliseconds
+    return {
+        "count": len(values),
+        "p50_ms": percentile(values, 0.5) * 1000.,
+        "p99_ms": percentile(values, 0.99) * 1000.,
+        "max_ms": max(values, default=0.) * 1000.,
+    }
+
+
+async def request(session: ClientSession, stats: LoadStats, name: str, method: str, url: str, **kwargs) -> Any:
+    started_at = time.perf_counter()
+    async with session.request(method, url, **kwargs) as response:
+        data = await response.json()
+    stats.latencies[name].append(time.perf_counter() - started_at)
+    if response.status >= 400:
+        stats.errors[name] += 1
+    return data
+
+
+async def run_scenario(session: ClientSession, base_url: str, stats: LoadStats, index: int):
+    started_at = time.perf_counter()
+    data = await request(
+        session, stats, "create", "POST", f"{base_url}/tasks/create", json={"input_data": f"task {index}"}
+    )
+    task_id = data["task_id"]
+    await request(session, stats, "run", "POST", f"{base_url}/tasks/run", json={"task_id": task_id})
+
+    status = None
+    while status not in TERMINAL_STATUSES:
+        data = await request(session, stats, "wait", "GET", f"{base_url}/tasks/{task_id}/wait?timeout={WAIT_TIMEOUT}")
+        status = data["status"]
+    await request(session, stats, "status", "GET", f"{base_url}/tasks/{task_id}/status")
+    if status == "SUCCESS":
+        await request(session, stats, "output", "GET", f"{base_url}/tasks/{task_id}/output")
+
+    stats.end_to_end.append(time.perf_counter() - started_at)
+    stats.statuses[status] += 1
+
+
+async def run_closed_loop(session: ClientSession, base_url: str, stats: LoadStats, tasks: int, concurrency: int):
+    indexes = iter(range(tasks))
+
+    async def client():
+        for index in indexes:
+            await run_scenario(session, base_url, stats, index)
+
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+
+
+async def run_open_loop(
+        session: ClientSession,
+        base_url: str,
+        stats: LoadStats,
+        tasks: int,
+        rate: float,
+        is_poisson: bool,
+        seed: int
+):
+    generator = random.Random(seed)
+    scenarios = []
+    # arrivals are scheduled on absolute time, so a slow iteration doesn't shift the rest of them
+    arrival_at = time.perf_counter()
+    for index in range(tasks):
+        delay = arrival_at - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        scenarios.append(asyncio.ensure_future(run_scenario(session, base_url, stats, index)))
+        arrival_at += generator.expovariate(rate) if is_poisson else 1. / rate
+    await asyncio.gather(*scenarios)
+
+
+def parse_metrics(text: str) -> List[Tuple[str, str, float]]:
+    samples = []
+    for line in text.splitlines():
+        if not line or line.startswith("#"):
+            continue
+        name_and_labels, value = line.rsplit(" ", 1)
+        name, _, labels = name_and_labels.partition("{")
+        samples.append((name, labels, float(value)))
+    return samples
+
+
+def estimate_quantile(buckets: List[Tuple[float, float]], quantile: float) -> Optional[float]:
+    """
+    Interpolates the quantile inside the bucket like `histogram_quantile` of Prometheus.
+    """
+    if not buckets or not buckets[-1][1]:
+        return None
+    rank = quantile * buckets[-1][1]
+    previous_bound, previous_count = 0., 0.
+    for bound, count in buckets:
+        if count >= rank:
+            if bound == math.inf:
+                return previous_bound
+            return previous_bound + (bound - previous_bound) * (rank - previous_count) / (count - previous_count)
+        previous_bound, previous_count = bound, count
+    return previous_bound
+
+
+def get_queue_wait(samples: List[Tuple[str, str, float]]) -> Dict[str, Optional[float]]:
+    name = "processqueue_task_queue_wait_seconds"
+    buckets = sorted(
+        (float(BUCKET_LE_PATTERN.search(labels).group(1)), value)
+        for sample_name, labels, value in samples
+        if sample_name == f"{name}_bucket"
+    )
+    totals = {
+        sample_name: value
+        for sample_name, _, value in samples
+        if sample_name in (f"{name}_sum", f"{name}_count")
+    }
+    count = totals.get(f"{name}_count", 0.)
+
+    def to_ms(value: Optional[float]) -> Optional[float]:
+        return value * 1000. if value is not None else None
+
+    return {
+        "mean_ms": to_ms(totals[f"{name}_sum"] / count) if count else None,
+        "p50_ms": to_ms(estimate_quantile(buckets, 0.5)),
+        "p99_ms": to_ms(estimate_quantile(buckets, 0.99)),
+    }
+
+
+async def sample_metrics(session: ClientSession, base_url: str, stats: LoadStats, interval: float):
+    while True:
+        async with session.get(f"{base_url}/metrics") as response:
+            samples = parse_metrics(await response.text())
+        slots = {labels: value for name, labels, value in samples if name == "processqueue_running_task_slots"}
+        used = slots.get('state="used"}', 0.)
+        free = slots.get('state="free"}', 0.)
+        if used + free:
+            stats.slot_utilization.append(used / (used + free))
+        stats.queue_depth.extend(value for name, _, value in samples if name == "processqueue_queue_depth")
+        await asyncio.sleep(interval)
+
+
+async def start_in_process() -> Tuple[str, Any]:
+    app = await startup_app()
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    host, port = runner.addresses[0][:2]
+    return f"http://{host}:{port}", runner.cleanup
+
+
+async def start_subprocess(port: int, env: Dict[str, str]) -> Tuple[str, Any]:
+    process = await asyncio.create_subprocess_exec(
+        sys.executable, "main.py",
+        cwd=str(PACKAGE_FOLDER),
+        env=dict(os.environ, PORT=str(port), **env),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    base_url = f"http://127.0.0.1:{port}"
+
+    async def stop():
+        process.terminate()
+        await process.wait()
+
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    async with ClientSession() as session:
+        while True:
+            try:
+                async with session.get(f"{base_url}/healthcheck") as response:
+                    if response.status == 200:
+                        return base_url, stop
+            except OSError:
+                pass
+            if time.monotonic() > deadline or process.returncode is not None:
+                await stop()
+                raise RuntimeError("Service hasn't started.")
+            await asyncio.sleep(0.1)
+
+
+def get_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=str(PACKAGE_FOLDER), capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def run(args: argparse.Namespace) -> Dict[str, Any]:
+    data_folder = tempfile.TemporaryDirectory(prefix="load-benchmark-")
+    env = {
+        "MAX_RUNNING_TASKS": str(args.max_running_tasks),
+        "TASK_DATA_FOLDER": data_folder.name,
+        "TASK_WORKLOAD_SLEEP": str(args.sleep),
+        "TASK_WORKLOAD_CPU_TIME": str(args.cpu_time),
+        "TASK_WORKLOAD_IO_BYTES": str(args.io_bytes),
+    }
+    if args.server == "subprocess":
+        base_url, stop = await start_subprocess(args.port, env)
+    else:
+        os.environ.update(env)
+        base_url, stop = await start_in_process()
+
+    stats = LoadStats()
+    try:
+        async with ClientSession(connector=TCPConnector(limit=0)) as session:
+            sampler = asyncio.ensure_future(sample_metrics(session, base_url, stats, args.sample_interval))
+            started_at = time.perf_counter()
+            if args.arrival == "closed":
+                await run_closed_loop(session, base_url, stats, args.tasks, args.concurrency)
+            else:
+                await run_open_loop(
+                    session, base_url, stats, args.tasks, args.rate, args.arrival == "poisson", args.seed
+                )
+            elapsed = time.perf_counter() - started_at
+            sampler.cancel()
+            await asyncio.gather(sampler, return_exceptions=True)
+
+            async with session.get(f"{base_url}/metrics") as response:
+                samples = parse_metrics(await response.text())
+    finally:
+        await stop()
+        data_folder.cleanup()
+
+    requests = sum(len(latencies) for latencies in stats.latencies.values())
+    short_latencies = [
+        latency
+        for name, latencies in stats.latencies.items() if name not in LONG_POLL_REQUESTS
+        for latency in latencies
+    ]
+    return {
+        "commit": get_commit(),
+        "config": vars(args),
+        "elapsed_s": elapsed,
+        "tasks_by_status": dict(stats.statuses),
+        "tasks_per_s": len(stats.end_to_end) / elapsed,
+        "requests": requests,
+        "requests_per_s": requests / elapsed,
+        "errors": dict(stats.errors),
+        "request_latency": summarize(short_latencies),
+        "request_latency_by_name": {name: summarize(latencies) for name, latencies in sorted(stats.latencies.items())},
+        "task_end_to_end": summarize(stats.end_to_end),
+        "queue_wait": get_queue_wait(samples),
+        "slot_utilization_mean": sum(stats.slot_utilization) / len(stats.slot_utilization)
+        if stats.slot_utilization else None,
+        "queue_depth_max": max(stats.queue_depth, default=0.),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--server", choices=("inprocess", "subprocess"), default="inprocess")
+    parser.add_argument("--port", type=int, default=8765, help="port of the subprocess service")
+    parser.add_argument("--tasks", type=int, default=100)
+    parser.add_argument("--arrival", choices=("closed", "fixed", "poisson"), default="closed")
+    parser.add_argument("--concurrency", type=int, default=4, help="clients of the closed loop")
+    parser.add_argument("--rate", type=float, default=10., help="scenarios per second of the open loop")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--max-running-tasks", type=int, default=2)
+    parser.add_argument("--sleep", type=float, default=0.05, help="seconds every task sleeps")
+    parser.add_argument("--cpu-time", type=float, default=0., help="seconds of CPU every task burns")
+    parser.add_argument("--io-bytes", type=int, default=0, help="bytes every task writes and reads back")
+    parser.add_argument("--sample-interval", type=float, default=0.1, help="seconds between scrapes of /metrics")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""
+Measures the cost of instrumentation on the hot path.
+
+Usage:
+    python -m benchmarks.metrics --repeat 100000
+"""
+import argparse
+import asyncio
+import json
+import time
+import timeit
+from typing import Dict
+
+from aiohttp import web
+from aiohttp.test_utils import make_mocked_request
+from aiohttp.web_urldispatcher import UrlMappingMatchInfo
+
+from app.api.middlewares import build_request_latency_middleware
+from app.data import TaskRepositoryConfig
+from app.data import build_task_repository
+from app.data.metrics import TaskMetrics
+from app.domain.model import TaskStatus
+from app.metrics import MetricsRegistry
+
+
+class IdleListener:
+    async def get_running_tasks_count(self) -> int:
+        return 0
+
+
+class EmptyQueue:
+    async def size(self) -> int:
+        return 0
+
+
+def measure(function, repeat: int) -> float:
+    return min(timeit.repeat(function, number=repeat, repeat=5)) / repeat * 1e9
+
+
+async def measure_async(function, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(5):
+        started_at = time.perf_counter()
+        for _ in range(repeat):
+            await function()
+        best = min(best, time.perf_counter() - started_at)
+    return best / repeat * 1e9
+
+
+async def run(repeat: int) -> Dict[str, float]:
+    metrics_registry = MetricsRegistry()
+    histogram_family = metrics_registry.histogram("request_seconds", "Request latency.", ("method", "route"))
+    histogram = histogram_family.labels()
+
+    task_repository = build_task_repository(TaskRepositoryConfig())
+    task_metrics = TaskMetrics(metrics_registry, task_repository, EmptyQueue(), IdleListener(), 2)
+
+    def track_task():
+        # the callback the repository calls on every status change of a task
+        task_metrics._on_task_status_changed(1, TaskStatus.QUEUED)
+        task_metrics._on_task_status_changed(1, TaskStatus.RUNNING)
+        task_metrics._on_task_status_changed(1, TaskStatus.SUCCESS)
+
+    app = web.Application()
+    route = app.router.add_get("/tasks/{task_id}/status", lambda request: None)
+    request = make_mocked_request("GET", "/tasks/1/status", app=app)
+    request._match_info = UrlMappingMatchInfo({"task_id": "1"}, route)
+    response = web.Response()
+
+    async def handler(_):
+        return response
+
+    middleware = build_request_latency_middleware(histogram_family)
+
+    return {
+        "histogram_observe_ns": measure(lambda: histogram.observe(0.01), repeat),
+        "labeled_histogram_observe_ns": measure(
+            lambda: histogram_family.labels("GET", "/tasks/{task_id}/status").observe(0.01), repeat
+        ),
+        "task_status_changes_per_task_ns": measure(track_task, repeat),
+        "handler_ns": await measure_async(lambda: handler(request), repeat),
+        "handler_with_middleware_ns": await measure_async(lambda: middleware(request, handler), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=100000)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.repeat))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""
+Compares `dataclasses-json` schema based serialization with cached codecs of `app.api.serialization`.
+
+Usage:
+    python -m benchmarks.serialization --items 1000 --repeat 200
+"""
+import argparse
+import json
+import timeit
+from typing import Callable
+from typing import Dict
+
+from app.api.model import TaskBatchItemInfo
+from app.api.model import TaskInfo
+from app.api.model import TaskInfoBatch
+from app.api.model import TaskInputData
+from app.api.serialization import decode_body
+from app.api.serialization import encode_body
+
+
+def measure(function: Callable, repeat: int) -> float:
+    # the best run is the least affected by the rest of the system
+    return min(timeit.repeat(function, number=repeat, repeat=5)) / repeat * 1e6
+
+
+def run(items: int, repeat: int) -> Dict[str, float]:
+    task_info = TaskInfo(task_id=1, status="QUEUED")
+    task_info_batch = TaskInfoBatch(tasks=[
+        TaskBatchItemInfo(task_id=task_id, status="QUEUED")
+        for task_id in range(items)
+    ])
+    task_input_data_body = json.dumps({"input_data": "data", "priority": 1, "tenant": "team"})
+
+    return {
+        "encode_task_info_schema_us": measure(lambda: TaskInfo.schema().dumps(task_info), repeat),
+        "encode_task_info_codec_us": measure(lambda: encode_body(task_info), repeat),
+        "encode_batch_schema_us": measure(lambda: TaskInfoBatch.schema().dumps(task_info_batch), repeat),
+        "encode_batch_codec_us": measure(lambda: encode_body(task_info_batch), repeat),
+        # previous `create_task` decoded the body with `request.json()` and then the schema
+        "decode_task_input_data_schema_us": measure(
+            lambda: TaskInputData.schema().loads(json.loads(json.dumps(task_input_data_body))),
+            repeat
+        ),
+        "decode_task_input_data_codec_us": measure(
+            lambda: decode_body(TaskInputData, task_input_data_body.encode()),
+            repeat
+        ),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--items", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    report = run(args.items, args.repeat)
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
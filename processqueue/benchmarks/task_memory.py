@@ -0,0 +1,59 @@
+"""
+Measures memory taken by finished tasks in the in-memory repository storage.
+
+Usage:
+    python -m benchmarks.task_memory --tasks 1000000 --payload-size 100
+"""
+import argparse
+import asyncio
+import json
+import tracemalloc
+from typing import Dict
+from typing import Optional
+
+from app.data.storage import InMemoryRepositoryTaskDataStorage
+from app.data.storage import RetentionConfig
+from app.domain.model import Task
+from app.domain.model import TaskStatus
+
+BATCH_SIZE = 10000
+
+
+async def measure(tasks: int, payload_size: int, retention_config: Optional[RetentionConfig]) -> float:
+    tracemalloc.start()
+    storage = InMemoryRepositoryTaskDataStorage(retention_config)
+    for first_task_id in range(0, tasks, BATCH_SIZE):
+        await storage.put_tasks([
+            Task(
+                task_id=task_id,
+                status=TaskStatus.SUCCESS,
+                input_data="x" * payload_size,
+                output_path=f"/data/{task_id}/output.txt",
+                tenant="tenant",
+            )
+            for task_id in range(first_task_id, min(first_task_id + BATCH_SIZE, tasks))
+        ])
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / tasks
+
+
+async def run(tasks: int, payload_size: int) -> Dict[str, float]:
+    return {
+        "retained_bytes_per_task": await measure(tasks, payload_size, None),
+        "evicted_bytes_per_task": await measure(tasks, payload_size, RetentionConfig(ttl=0.)),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--tasks", type=int, default=1000000)
+    parser.add_argument("--payload-size", type=int, default=100)
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args.tasks, args.payload_size))
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,37 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+
+# with `BROKER_SOCKET` the repository, the queue and the listener live in one broker process
+# shared by all workers, so the limit of running tasks is global
+broker_process = None
+is_stopping = False
+
+
+def watch_broker(server, arbiter_pid: int):
+    # workers are useless without the broker, so gunicorn exits with an error and the container is restarted
+    exitcode = broker_process.wait()
+    if not is_stopping:
+        server.log.error(f"Broker has exited with code `{exitcode}`, shutting down.")
+        os.kill(arbiter_pid, signal.SIGTERM)
+
+
+def on_starting(server):
+    global broker_process
+    if os.getenv("BROKER_SOCKET"):
+        broker_process = subprocess.Popen([sys.executable, "-m", "app.broker"])
+        threading.Thread(target=watch_broker, args=(server, os.getpid()), name="broker-watcher", daemon=True).start()
+
+
+def on_exit(server):
+    global is_stopping
+    if broker_process is None:
+        return
+    is_stopping = True
+    if broker_process.poll() is not None:
+        # it is raised from `Arbiter.halt`, so gunicorn exits with this code
+        raise SystemExit(1)
+    broker_process.terminate()
+    broker_process.wait()
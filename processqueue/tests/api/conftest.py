@@ -18,3 +18,25 @@ def client(
         app: web.Application
 ) -> TestClient:
     return loop.run_until_complete(aiohttp_client(app))
+
+
+@pytest.fixture
+def small_upload_client(
+        loop,  # fixture from pytest-aiohttp plugin
+        aiohttp_client,  # fixture from pytest-aiohttp plugin
+        monkeypatch
+) -> TestClient:
+    monkeypatch.setenv("MAX_INPUT_DATA_SIZE", "10")
+    app = loop.run_until_complete(startup_app())
+    return loop.run_until_complete(aiohttp_client(app))
+
+
+@pytest.fixture
+def small_batch_client(
+        loop,  # fixture from pytest-aiohttp plugin
+        aiohttp_client,  # fixture from pytest-aiohttp plugin
+        monkeypatch
+) -> TestClient:
+    monkeypatch.setenv("MAX_BATCH_SIZE", "2")
+    app = loop.run_until_complete(startup_app())
+    return loop.run_until_complete(aiohttp_client(app))
@@ -1,6 +1,8 @@
 import asyncio
 import json
+import os
 
+import aiohttp
 import pytest
 from typing import Dict
 
@@ -69,3 +71,386 @@ async def test_create_and_run_task(client, first_task_input_data):
     )
     data = await resp.json()
     assert data["output_data"] == f"{first_task_input_data['input_data']} - successfully executed"
+
+
+async def test_cancel_running_task(client, first_task_input_data):
+    resp = await client.post(
+        "/tasks/create",
+        json=json.dumps(first_task_input_data)
+    )
+    data = await resp.json()
+    task_id = data["task_id"]
+
+    await client.post(
+        "/tasks/run",
+        json={"task_id": task_id}
+    )
+
+    while True:
+        resp = await client.get(
+            f"/tasks/{task_id}/status"
+        )
+        data = await resp.json()
+        if data["status"] == "RUNNING":
+            break
+        await asyncio.sleep(0.05)
+
+    resp = await client.post(
+        "/tasks/cancel",
+        json={"task_id": task_id}
+    )
+    assert resp.status == 200
+    data = await resp.json()
+    assert data["status"] == "CANCELLED"
+
+    resp = await client.get(
+        f"/tasks/{task_id}/status"
+    )
+    data = await resp.json()
+    assert data["status"] == "CANCELLED"
+
+    resp = await client.post(
+        "/tasks/cancel",
+        json={"task_id": task_id}
+    )
+    assert resp.status == 400
+
+
+async def test_batch_create_run_and_status(client):
+    resp = await client.post(
+        "/tasks/create_batch",
+        json={"tasks": [{"input_data": f"Task {index}"} for index in range(3)]}
+    )
+    assert resp.status == 201
+    data = await resp.json()
+    task_ids = [item["task_id"] for item in data["tasks"]]
+    assert [item["status"] for item in data["tasks"]] == ["CREATED"] * 3
+
+    unknown_task_id = max(task_ids) + 100
+    resp = await client.post(
+        "/tasks/run_batch",
+        json={"task_ids": task_ids + [task_ids[0], unknown_task_id]}
+    )
+    assert resp.status == 200
+    data = await resp.json()
+    assert [item["status"] for item in data["tasks"]] == ["QUEUED"] * 3 + [None, None]
+    assert data["tasks"][3]["error"] is not None
+    assert data["tasks"][4]["error"] is not None
+
+    resp = await client.post(
+        "/tasks/status",
+        json={"task_ids": task_ids + [unknown_task_id]}
+    )
+    assert resp.status == 200
+    data = await resp.json()
+    assert [item["task_id"] for item in data["tasks"]] == task_ids + [unknown_task_id]
+    assert all(item["status"] in ("QUEUED", "RUNNING") for item in data["tasks"][:3])
+    assert data["tasks"][3]["status"] is None
+
+
+async def test_too_large_batch(small_batch_client):
+    resp = await small_batch_client.post(
+        "/tasks/create_batch",
+        json={"tasks": [{"input_data": f"Task {index}"} for index in range(3)]}
+    )
+    assert resp.status == 400
+
+    resp = await small_batch_client.post(
+        "/tasks/create_batch",
+        json={"tasks": [{"input_data": f"Task {index}"} for index in range(2)]}
+    )
+    assert resp.status == 201
+    task_ids = [item["task_id"] for item in (await resp.json())["tasks"]]
+
+    resp = await small_batch_client.post("/tasks/run_batch", json={"task_ids": task_ids + [task_ids[0]]})
+    assert resp.status == 400
+    resp = await small_batch_client.post("/tasks/run_batch", json={"task_ids": task_ids})
+    assert resp.status == 200
+
+    resp = await small_batch_client.post("/tasks/status", json={"task_ids": task_ids + [task_ids[0]]})
+    assert resp.status == 400
+    resp = await small_batch_client.post("/tasks/status", json={"task_ids": task_ids})
+    assert resp.status == 200
+
+
+async def test_position_of_not_queued_task(client, first_task_input_data):
+    resp = await client.post(
+        "/tasks/create",
+        json=json.dumps(first_task_input_data)
+    )
+    data = await resp.json()
+
+    resp = await client.get(f"/tasks/{data['task_id']}/position")
+    assert resp.status == 400
+
+    resp = await client.get(f"/tasks/{data['task_id'] + 100}/position")
+    assert resp.status == 404
+
+
+async def test_wait_for_task_completion(client, first_task_input_data):
+    resp = await client.post(
+        "/tasks/create",
+        json=json.dumps(first_task_input_data)
+    )
+    data = await resp.json()
+    task_id = data["task_id"]
+
+    resp = await client.get(f"/tasks/{task_id}/wait?timeout=0.1")
+    assert resp.status == 200
+    data = await resp.json()
+    assert data["status"] == "CREATED"
+
+    await client.post(
+        "/tasks/run",
+        json={"task_id": task_id}
+    )
+
+    resp = await client.get(f"/tasks/{task_id}/wait?timeout=30")
+    assert resp.status == 200
+    data = await resp.json()
+    assert data["status"] == "SUCCESS"
+
+    resp = await client.get(f"/tasks/{task_id}/wait?timeout=nan")
+    assert resp.status == 400
+
+
+async def test_stream_task_status_events(client, first_task_input_data):
+    resp = await client.post(
+        "/tasks/create",
+        json=json.dumps(first_task_input_data)
+    )
+    data = await resp.json()
+    task_id = data["task_id"]
+
+    stream = await client.get(f"/tasks/events?task_ids={task_id}&statuses=RUNNING,SUCCESS")
+    assert stream.status == 200
+    assert stream.headers["content-type"] == "text/event-stream"
+
+    await client.post(
+        "/tasks/run",
+        json={"task_id": task_id}
+    )
+
+    statuses = []
+    while "SUCCESS" not in statuses:
+        line = await asyncio.wait_for(stream.content.readline(), 30)
+        if line.startswith(b"data: "):
+            statuses.append(json.loads(line[len(b"data: "):])["status"])
+    stream.close()
+
+    assert statuses[-1] == "SUCCESS"
+    assert set(statuses) <= {"RUNNING", "SUCCESS"}
+
+    resp = await client.get("/tasks/events?statuses=UNKNOWN")
+    assert resp.status == 400
+
+
+async def test_raw_output_supports_range(client, first_task_input_data):
+    resp = await client.post(
+        "/tasks/create",
+        json=json.dumps(first_task_input_data)
+    )
+    data = await resp.json()
+    task_id = data["task_id"]
+
+    resp = await client.get(f"/tasks/{task_id}/output?format=raw")
+    assert resp.status == 400
+
+    await client.post(
+        "/tasks/run",
+        json={"task_id": task_id}
+    )
+    await client.get(f"/tasks/{task_id}/wait?timeout=30")
+
+    expected_output_data = f"{first_task_input_data['input_data']} - successfully executed"
+    resp = await client.get(f"/tasks/{task_id}/output?format=raw")
+    assert resp.status == 200
+    assert resp.headers.get("Content-Type").startswith("text/plain")
+    assert await resp.text() == expected_output_data
+
+    resp = await client.get(
+        f"/tasks/{task_id}/output?format=raw",
+        headers={"Range": "bytes=0-3"}
+    )
+    assert resp.status == 206
+    assert await resp.text() == expected_output_data[:4]
+
+
+async def test_incorrect_body(client):
+    # client adds `application/octet-stream` to bytes, the body without the header must still be decoded as JSON
+    resp = await client.post("/tasks/create", data=b"{", skip_auto_headers=["Content-Type"])
+    assert resp.status == 400
+
+    resp = await client.post("/tasks/create", data=b'{"input_data": "Task"}', skip_auto_headers=["Content-Type"])
+    assert resp.status == 201
+
+    resp = await client.post("/tasks/run", json={"task_id": "first"})
+    assert resp.status == 400
+
+
+async def test_upload_task_input_data(client):
+    resp = await client.post(
+        "/tasks/create?priority=1",
+        data=b"Uploaded Task",
+        headers={"Content-Type": "application/octet-stream"}
+    )
+    assert resp.status == 201
+    task_id = (await resp.json())["task_id"]
+
+    resp = await client.post("/tasks/run", json={"task_id": task_id})
+    assert resp.status == 200
+    resp = await client.get(f"/tasks/{task_id}/wait?timeout=10")
+    assert (await resp.json())["status"] == "SUCCESS"
+
+    resp = await client.get(f"/tasks/{task_id}/output")
+    assert (await resp.json())["output_data"] == "Uploaded Task - successfully executed"
+
+
+async def test_upload_task_input_data_as_form(client):
+    form = aiohttp.FormData()
+    form.add_field("input_data", b"Uploaded Task", filename="input.txt")
+    resp = await client.post("/tasks/create", data=form)
+    assert resp.status == 201
+
+    form = aiohttp.FormData()
+    form.add_field("other", b"Uploaded Task", filename="input.txt")
+    resp = await client.post("/tasks/create", data=form)
+    assert resp.status == 400
+
+
+async def test_task_with_lost_upload_fails(client):
+    resp = await client.post(
+        "/tasks/create",
+        data=b"Uploaded Task",
+        headers={"Content-Type": "application/octet-stream"}
+    )
+    task_id = (await resp.json())["task_id"]
+    task = await client.server.app["task_repository"].get_task(task_id)
+    os.unlink(task.input_path)
+
+    await client.post("/tasks/run", json={"task_id": task_id})
+    resp = await client.get(f"/tasks/{task_id}/wait?timeout=10")
+    assert (await resp.json())["status"] == "FAILURE"
+
+
+async def test_upload_too_large_input_data(small_upload_client):
+    resp = await small_upload_client.post(
+        "/tasks/create",
+        data=b"x" * 11,
+        headers={"Content-Type": "application/octet-stream"}
+    )
+    assert resp.status == 413
+
+
+async def test_list_tasks_by_status(client, first_task_input_data):
+    task_ids = []
+    for _ in range(3):
+        resp = await client.post("/tasks/create", json=first_task_input_data)
+        task_ids.append((await resp.json())["task_id"])
+
+    resp = await client.get("/tasks?status=CREATED&limit=2")
+    assert resp.status == 200
+    data = await resp.json()
+    assert [task["task_id"] for task in data["tasks"]] == task_ids[:0:-1]
+
+    resp = await client.get(f"/tasks?status=CREATED&limit=2&cursor={data['next_cursor']}")
+    data = await resp.json()
+    assert [task["task_id"] for task in data["tasks"]] == task_ids[:1]
+    assert data["next_cursor"] is None
+
+    resp = await client.get("/tasks/counts")
+    assert (await resp.json())["counts"]["CREATED"] == 3
+
+    resp = await client.get("/tasks?status=UNKNOWN")
+    assert resp.status == 400
+
+
+async def test_metrics(client, first_task_input_data):
+    resp = await client.post("/tasks/create", json=first_task_input_data)
+    task_id = (await resp.json())["task_id"]
+    await client.post("/tasks/run", json={"task_id": task_id})
+    await client.get(f"/tasks/{task_id}/wait?timeout=10")
+
+    resp = await client.get("/metrics")
+    assert resp.status == 200
+    metrics = await resp.text()
+    assert 'processqueue_tasks{status="SUCCESS"} 1.0' in metrics
+    assert "processqueue_queue_depth 0.0" in metrics
+    assert 'processqueue_running_task_slots{state="used"} 0.0' in metrics
+    assert 'processqueue_task_end_to_end_seconds_count{status="SUCCESS"} 1' in metrics
+    assert 'processqueue_http_request_duration_seconds_count{method="POST",route="/tasks/run"} 1' in metrics
+
+
+async def test_task_stats(client, first_task_input_data):
+    resp = await client.post("/tasks/create", json=first_task_input_data)
+    task_id = (await resp.json())["task_id"]
+
+    resp = await client.get(f"/tasks/{task_id}/stats")
+    assert resp.status == 404
+
+    await client.post("/tasks/run", json={"task_id": task_id})
+    await client.get(f"/tasks/{task_id}/wait?timeout=30")
+
+    resp = await client.get(f"/tasks/{task_id}/stats")
+    assert resp.status == 200
+    data = await resp.json()
+    assert data["status"] == "SUCCESS"
+    # the task sleeps for two seconds
+    assert data["wall_time"] >= 2.
+    assert data["max_rss"] > 0
+
+    resp = await client.get("/tasks/stats")
+    assert resp.status == 200
+    data = await resp.json()
+    assert data["task_count"] == 1
+    assert data["wall_time"]["p50"] == data["wall_time"]["max"] >= 2.
+    assert data["cpu_utilization"]["max"] < 1.
+
+    resp = await client.get("/tasks/stats?limit=0")
+    assert resp.status == 400
+
+
+async def test_task_profile(client, first_task_input_data):
+    resp = await client.post("/tasks/create", json=first_task_input_data)
+    task_id = (await resp.json())["task_id"]
+
+    resp = await client.get(f"/tasks/{task_id}/profile")
+    assert resp.status == 404
+
+    await client.post("/tasks/run", json={"task_id": task_id, "profile": True})
+    await client.get(f"/tasks/{task_id}/wait?timeout=30")
+
+    resp = await client.get(f"/tasks/{task_id}/profile?limit=10")
+    assert resp.status == 200
+    assert "process_input_data" in await resp.text()
+
+    resp = await client.get(f"/tasks/{task_id}/profile?format=pstats")
+    assert resp.status == 200
+    assert resp.headers["content-type"] == "application/octet-stream"
+    assert len(await resp.read()) > 0
+
+    resp = await client.get(f"/tasks/{task_id}/profile?format=svg")
+    assert resp.status == 400
+
+
+async def test_workers_endpoints_are_disabled_by_default(client):
+    resp = await client.post("/workers/lease", json={"worker_id": "worker"})
+    assert resp.status == 503
+
+
+async def test_task_timeout(client, first_task_input_data):
+    resp = await client.post("/tasks/create", json=first_task_input_data)
+    task_id = (await resp.json())["task_id"]
+
+    resp = await client.post("/tasks/run", json={"task_id": task_id, "timeout": 0})
+    assert resp.status == 400
+
+    resp = await client.post("/tasks/run", json={"task_id": task_id, "timeout": 0.5})
+    assert resp.status == 200
+    resp = await client.get(f"/tasks/{task_id}/wait?timeout=30")
+    assert (await resp.json())["status"] == "TIMEOUT"
+
+    resp = await client.get("/metrics")
+    metrics = await resp.text()
+    assert 'processqueue_tasks{status="TIMEOUT"} 1.0' in metrics
+    assert 'processqueue_running_task_slots{state="used"} 0.0' in metrics
@@ -0,0 +1,66 @@
+import json
+
+import pytest
+
+from app.api.model import TaskBatchItemInfo
+from app.api.model import TaskInfoBatch
+from app.api.model import TaskInputData
+from app.api.model import TaskInputDataBatch
+from app.api.model import TaskRunData
+from app.api.serialization import DecodingError
+from app.api.serialization import MSGPACK_CODEC
+from app.api.serialization import decode_body
+from app.api.serialization import encode_body
+from app.api.serialization import get_request_codec
+from app.api.serialization import get_response_codec
+
+
+def test_encoded_dataclass_matches_dataclasses_json():
+    task_info_batch = TaskInfoBatch(tasks=[
+        TaskBatchItemInfo(task_id=1, status="QUEUED"),
+        TaskBatchItemInfo(task_id=2, error="There is no task"),
+    ])
+    assert json.loads(encode_body(task_info_batch)) == task_info_batch.to_dict()
+
+
+def test_body_is_decoded_into_dataclass():
+    body = json.dumps({"tasks": [{"input_data": "first"}, {"input_data": "second", "priority": 2}]}).encode()
+    assert decode_body(TaskInputDataBatch, body) == TaskInputDataBatch(tasks=[
+        TaskInputData(input_data="first"),
+        TaskInputData(input_data="second", priority=2),
+    ])
+
+    # json document encoded as json string is still accepted
+    body = json.dumps(json.dumps({"input_data": "data", "tenant": "team"})).encode()
+    assert decode_body(TaskInputData, body) == TaskInputData(input_data="data", tenant="team")
+
+
+def test_integer_is_decoded_into_float_field():
+    task_run_data = decode_body(TaskRunData, b'{"task_id": 1, "timeout": 5}')
+    assert task_run_data == TaskRunData(task_id=1, timeout=5.)
+    assert isinstance(task_run_data.timeout, float)
+
+    with pytest.raises(DecodingError):
+        decode_body(TaskRunData, b'{"task_id": 1, "timeout": true}')
+
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b"[]",
+    b"{}",
+    b'{"input_data": 1}',
+    b'{"input_data": "data", "priority": "high"}',
+    b'{"input_data": "data", "priority": true}',
+])
+def test_incorrect_body_is_rejected(body):
+    with pytest.raises(DecodingError):
+        decode_body(TaskInputData, body)
+
+
+def test_msgpack_is_negotiated():
+    pytest.importorskip("msgpack")
+    assert get_response_codec("application/msgpack, application/json") is MSGPACK_CODEC
+    assert get_request_codec("application/msgpack") is MSGPACK_CODEC
+
+    body = encode_body(TaskInputData(input_data="data"), MSGPACK_CODEC)
+    assert decode_body(TaskInputData, body, MSGPACK_CODEC) == TaskInputData(input_data="data")
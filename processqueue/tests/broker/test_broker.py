@@ -0,0 +1,103 @@
+import asyncio
+import os
+import stat
+
+import pytest
+
+from app.broker.client import BrokerConnection
+from app.broker.client import RemoteTaskQueue
+from app.broker.client import RemoteTaskQueueListener
+from app.broker.client import RemoteTaskRepository
+from app.broker.server import BrokerServer
+from app.data import TaskRepositoryConfig
+from app.data import build_task_repository
+from app.domain.model import TaskStatus
+from app.exceptions import BrokerUnavailableException
+from app.exceptions import NoSuchTaskException
+from app.execution.executor import ExecutionConfig
+from app.execution.executor import WorkloadConfig
+from app.execution.listener import ListenerConfig
+from app.execution.listener import build_task_queue_listener
+from app.execution.queue import TaskQueueConfig
+from app.execution.queue import build_task_queue
+from app.execution.storage import ExecutorTaskDataStorageConfig
+
+
+@pytest.fixture
+async def broker(tmp_path):
+    task_repository = build_task_repository(TaskRepositoryConfig())
+    task_queue = build_task_queue(TaskQueueConfig())
+    execution_config = ExecutionConfig(
+        ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path / "data")),
+        workload=WorkloadConfig(sleep=0.),
+    )
+    task_queue_listener = build_task_queue_listener(
+        task_repository,
+        task_queue,
+        ListenerConfig(execution_config=execution_config)
+    )
+    socket_path = str(tmp_path / "broker.sock")
+    broker_server = BrokerServer(task_repository, task_queue, task_queue_listener, socket_path)
+    await broker_server.start()
+    listen_task = asyncio.get_running_loop().create_task(task_queue_listener.listen())
+
+    yield socket_path
+
+    await broker_server.close()
+    listen_task.cancel()
+    await asyncio.wait({listen_task})
+    task_queue_listener.stop()
+    task_repository.close()
+
+
+def connect(socket_path: str):
+    broker_connection = BrokerConnection(socket_path)
+    task_repository = RemoteTaskRepository(broker_connection)
+    task_queue = RemoteTaskQueue(broker_connection)
+    task_queue_listener = RemoteTaskQueueListener(task_repository, task_queue, broker_connection)
+    return broker_connection, task_repository, task_queue, task_queue_listener
+
+
+async def test_workers_share_tasks(broker):
+    assert stat.S_IMODE(os.stat(broker).st_mode) == 0o600
+    first_connection, first_repository, _, _ = connect(broker)
+    second_connection, second_repository, _, _ = connect(broker)
+
+    task = await first_repository.create_task("input")
+    assert (await second_repository.get_task(task.task_id)).input_data == "input"
+
+    with pytest.raises(NoSuchTaskException):
+        await second_repository.get_task(task.task_id + 1)
+
+    await first_connection.close()
+    await second_connection.close()
+
+
+async def test_task_is_executed_by_broker(broker):
+    first_connection, first_repository, task_queue, _ = connect(broker)
+    second_connection, second_repository, _, task_queue_listener = connect(broker)
+    await second_connection.connect()
+    statuses = []
+    second_repository.subscribe(lambda task_id, status: statuses.append(status))
+
+    task = await first_repository.create_task("input")
+    await first_repository.set_task_status(task.task_id, TaskStatus.QUEUED)
+    await task_queue.put(task.task_id)
+    for _ in range(500):
+        if await second_repository.get_task_status(task.task_id) is TaskStatus.SUCCESS:
+            break
+        await asyncio.sleep(0.01)
+
+    assert await second_repository.get_task_output_data(task.task_id) == "input - successfully executed"
+    assert TaskStatus.QUEUED in statuses and statuses[-1] is TaskStatus.SUCCESS
+    assert await task_queue_listener.get_running_tasks_count() == 0
+    assert await task_queue.is_empty()
+
+    await first_connection.close()
+    await second_connection.close()
+
+
+async def test_broker_unavailable(tmp_path):
+    broker_connection = BrokerConnection(str(tmp_path / "missing.sock"))
+    with pytest.raises(BrokerUnavailableException):
+        await broker_connection.connect(timeout=0.2)
@@ -0,0 +1,43 @@
+import asyncio
+
+import pytest
+
+from app.data import TaskRepositoryConfig
+from app.data import build_task_repository
+from app.data.events import TaskStatusEventBroadcaster
+from app.domain.model import TaskStatus
+from app.exceptions import TaskEventsOverflowException
+
+
+async def test_events_are_filtered_and_coalesced():
+    task_repository = build_task_repository(TaskRepositoryConfig())
+    broadcaster = TaskStatusEventBroadcaster(task_repository)
+    first_task = await task_repository.create_task("first")
+    second_task = await task_repository.create_task("second")
+
+    subscription = broadcaster.subscribe(task_ids={first_task.task_id})
+    terminal_subscription = broadcaster.subscribe(statuses={TaskStatus.SUCCESS})
+
+    await task_repository.set_task_status(second_task.task_id, TaskStatus.QUEUED)
+    await task_repository.set_task_status(first_task.task_id, TaskStatus.QUEUED)
+    await task_repository.set_task_status(first_task.task_id, TaskStatus.RUNNING)
+    await task_repository.set_task_status(first_task.task_id, TaskStatus.SUCCESS)
+
+    assert await subscription.get() == [(first_task.task_id, TaskStatus.SUCCESS)]
+    assert await terminal_subscription.get() == [(first_task.task_id, TaskStatus.SUCCESS)]
+
+    broadcaster.close()
+    assert await subscription.get() == []
+    assert subscription.is_closed
+
+
+async def test_slow_subscriber_is_dropped():
+    task_repository = build_task_repository(TaskRepositoryConfig())
+    broadcaster = TaskStatusEventBroadcaster(task_repository, max_buffered_events=2)
+    subscription = broadcaster.subscribe()
+
+    for index in range(3):
+        await task_repository.create_task(f"task {index}")
+
+    with pytest.raises(TaskEventsOverflowException):
+        await asyncio.wait_for(subscription.get(), 1)
@@ -0,0 +1,36 @@
+from app.data.index import TaskStatusIndex
+from app.domain.model import TaskStatus
+
+
+def test_tasks_are_paginated_by_cursor():
+    index = TaskStatusIndex()
+    for task_id in range(10):
+        index.set_status(task_id, TaskStatus.FAILURE, changed_at=float(task_id))
+    index.set_status(5, TaskStatus.QUEUED, changed_at=10.)
+
+    first_page = index.query(TaskStatus.FAILURE, limit=4)
+    assert first_page.task_ids == [9, 8, 7, 6]
+    second_page = index.query(TaskStatus.FAILURE, limit=4, cursor=first_page.next_cursor)
+    assert second_page.task_ids == [4, 3, 2, 1]
+    last_page = index.query(TaskStatus.FAILURE, limit=4, cursor=second_page.next_cursor)
+    assert last_page.task_ids == [0]
+    assert last_page.next_cursor is None
+
+    assert index.query(TaskStatus.FAILURE, limit=100, since=7.).task_ids == [9, 8, 7]
+    assert index.query(TaskStatus.QUEUED, limit=100).task_ids == [5]
+
+
+def test_counts_follow_status_changes():
+    index = TaskStatusIndex()
+    for task_id in range(3000):
+        index.set_status(task_id, TaskStatus.CREATED, changed_at=0.)
+    for task_id in range(2900):
+        index.set_status(task_id, TaskStatus.SUCCESS, changed_at=1.)
+    index.remove(0)
+    index.remove(2999)
+
+    counts = index.count()
+    assert counts[TaskStatus.CREATED] == 99
+    assert counts[TaskStatus.SUCCESS] == 2899
+    # stale entries are compacted
+    assert index.query(TaskStatus.CREATED, limit=1000).task_ids == list(range(2998, 2899, -1))
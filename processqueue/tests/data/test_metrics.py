@@ -0,0 +1,57 @@
+from app.data import TaskRepositoryConfig
+from app.data import build_task_repository
+from app.data.metrics import TaskMetrics
+from app.domain.model import TaskStatus
+from app.execution.executor import ExecutionConfig
+from app.execution.listener import ListenerConfig
+from app.execution.listener import build_task_queue_listener
+from app.execution.queue import TaskQueueConfig
+from app.execution.queue import build_task_queue
+from app.execution.storage import ExecutorTaskDataStorageConfig
+from app.metrics import MetricsRegistry
+
+
+async def test_histogram_is_rendered_cumulatively():
+    metrics_registry = MetricsRegistry()
+    histogram = metrics_registry.histogram("latency_seconds", "Latency.", ("route",), buckets=(0.1, 1.))
+    for value in (0.05, 0.1, 0.5, 2.):
+        histogram.labels("/tasks").observe(value)
+    gauge = metrics_registry.gauge("depth", "Depth.")
+    gauge.set(3)
+
+    assert (await metrics_registry.render()).splitlines() == [
+        "# HELP latency_seconds Latency.",
+        "# TYPE latency_seconds histogram",
+        'latency_seconds_bucket{route="/tasks",le="0.1"} 2',
+        'latency_seconds_bucket{route="/tasks",le="1.0"} 3',
+        'latency_seconds_bucket{route="/tasks",le="+Inf"} 4',
+        'latency_seconds_sum{route="/tasks"} 2.65',
+        'latency_seconds_count{route="/tasks"} 4',
+        "# HELP depth Depth.",
+        "# TYPE depth gauge",
+        "depth 3.0",
+    ]
+
+
+async def test_task_metrics_are_recorded_from_status_changes(tmp_path):
+    task_repository = build_task_repository(TaskRepositoryConfig())
+    task_queue = build_task_queue(TaskQueueConfig())
+    execution_config = ExecutionConfig(ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path)))
+    task_queue_listener = build_task_queue_listener(task_repository, task_queue, ListenerConfig(execution_config))
+    metrics_registry = MetricsRegistry()
+    TaskMetrics(metrics_registry, task_repository, task_queue, task_queue_listener, max_running_tasks=2)
+
+    task = await task_repository.create_task("input")
+    await task_repository.create_task("input")
+    for status in (TaskStatus.QUEUED, TaskStatus.RUNNING, TaskStatus.SUCCESS):
+        await task_repository.set_task_status(task.task_id, status)
+
+    lines = (await metrics_registry.render()).splitlines()
+    task_queue_listener.stop()
+    assert "processqueue_task_queue_wait_seconds_count 1" in lines
+    assert 'processqueue_task_execution_seconds_count{status="SUCCESS"} 1' in lines
+    assert 'processqueue_task_end_to_end_seconds_count{status="SUCCESS"} 1' in lines
+    assert "processqueue_queue_depth 0.0" in lines
+    assert 'processqueue_running_task_slots{state="free"} 2.0' in lines
+    assert 'processqueue_tasks{status="CREATED"} 1.0' in lines
+    assert 'processqueue_tasks{status="SUCCESS"} 1.0' in lines
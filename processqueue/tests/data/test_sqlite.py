@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from app.data import TaskRepositoryConfig
+from app.data import build_task_repository
+from app.data.sqlite import SqliteRepositoryTaskDataStorageConfig
+from app.domain.model import Task
+from app.domain.model import TaskResourceUsage
+from app.domain.model import TaskStatus
+from app.exceptions import NoSuchTaskException
+from app.execution.listener import recover_unfinished_tasks
+from app.execution.queue import TaskQueueConfig
+from app.execution.queue import build_task_queue
+
+
+@pytest.fixture
+def task_repository_config(tmp_path) -> TaskRepositoryConfig:
+    return TaskRepositoryConfig(
+        storage_type="sqlite",
+        sqlite_config=SqliteRepositoryTaskDataStorageConfig(database_path=str(tmp_path / "tasks.sqlite3"))
+    )
+
+
+async def test_tasks_survive_restart(task_repository_config):
+    task_repository = build_task_repository(task_repository_config)
+    task = await task_repository.create_task("First Task", priority=3, tenant="tenant")
+    await task_repository.add_task_output_data(task.task_id, "output")
+    await task_repository.set_task_resource_usage(task.task_id, TaskResourceUsage(wall_time=2., max_rss=1024))
+    await task_repository.set_task_status(task.task_id, TaskStatus.SUCCESS)
+    status_changed_at = (await task_repository.get_task(task.task_id)).status_changed_at
+    task_repository.close()
+
+    task_repository = build_task_repository(task_repository_config)
+    try:
+        restored_task = await task_repository.get_task(task.task_id)
+        assert restored_task == Task(
+            task_id=task.task_id,
+            status=TaskStatus.SUCCESS,
+            status_changed_at=status_changed_at,
+            input_data="First Task",
+            output_data="output",
+            priority=3,
+            tenant="tenant",
+            resource_usage=TaskResourceUsage(wall_time=2., max_rss=1024)
+        )
+
+        # index of statuses is restored as well
+        assert (await task_repository.query_tasks(TaskStatus.SUCCESS, 10)).task_ids == [task.task_id]
+
+        next_task = await task_repository.create_task("Second Task")
+        assert next_task.task_id == task.task_id + 1
+        assert (await task_repository.count_tasks())[TaskStatus.CREATED] == 1
+
+        with pytest.raises(NoSuchTaskException):
+            await task_repository.get_task(next_task.task_id + 1)
+    finally:
+        task_repository.close()
+
+
+async def test_concurrent_writes_are_committed(task_repository_config):
+    task_repository = build_task_repository(task_repository_config)
+    try:
+        tasks = await task_repository.create_tasks([Task(input_data=str(index)) for index in range(1000)])
+        task_ids = [task.task_id for task in tasks]
+
+        await asyncio.gather(*(
+            task_repository.set_task_status(task_id, TaskStatus.QUEUED)
+            for task_id in task_ids
+        ))
+
+        statuses = await task_repository.get_tasks_statuses(task_ids + [len(task_ids)])
+        assert statuses == {task_id: TaskStatus.QUEUED for task_id in task_ids}
+    finally:
+        task_repository.close()
+
+
+async def test_concurrent_updates_of_task_are_not_lost(task_repository_config):
+    task_repository = build_task_repository(task_repository_config)
+    try:
+        tasks = await task_repository.create_tasks([Task(input_data=str(index)) for index in range(50)])
+        await asyncio.gather(*(
+            coroutine
+            for task in tasks
+            for coroutine in (
+                task_repository.add_task_output_path(task.task_id, f"output {task.task_id}"),
+                task_repository.set_task_status(task.task_id, TaskStatus.SUCCESS),
+                task_repository.set_task_profile(task.task_id, True),
+            )
+        ))
+
+        for task in (await task_repository.get_tasks([task.task_id for task in tasks])).values():
+            assert task.output_path == f"output {task.task_id}"
+            assert task.status is TaskStatus.SUCCESS
+            assert task.profile
+    finally:
+        task_repository.close()
+
+
+async def test_unfinished_tasks_are_recovered_after_restart(task_repository_config):
+    task_repository = build_task_repository(task_repository_config)
+    queued_task = await task_repository.create_task("Queued Task", priority=2)
+    running_task = await task_repository.create_task("Running Task")
+    await task_repository.set_task_status(queued_task.task_id, TaskStatus.QUEUED)
+    await task_repository.set_task_status(running_task.task_id, TaskStatus.RUNNING)
+    task_repository.close()
+
+    task_repository = build_task_repository(task_repository_config)
+    task_queue = build_task_queue(TaskQueueConfig())
+    try:
+        await recover_unfinished_tasks(task_repository, task_queue)
+        assert await task_repository.get_task_status(running_task.task_id) is TaskStatus.FAILURE
+        assert await task_repository.get_task_status(queued_task.task_id) is TaskStatus.QUEUED
+        assert await task_queue.get() == queued_task.task_id
+        assert await task_queue.is_empty()
+    finally:
+        task_repository.close()
@@ -0,0 +1,150 @@
+import pytest
+
+from app.api.controller import run_task
+from app.data import TaskRepositoryConfig
+from app.data import build_task_repository
+from app.data.storage import InMemoryRepositoryTaskDataStorage
+from app.data.storage import RetentionConfig
+from app.domain.model import Task
+from app.domain.model import TaskResourceUsage
+from app.domain.model import TaskStatus
+from app.exceptions import NoSuchTaskException
+from app.execution.queue import TaskQueueConfig
+from app.execution.queue import build_task_queue
+
+
+def make_task(task_id: int, status: TaskStatus) -> Task:
+    return Task(
+        task_id=task_id,
+        status=status,
+        input_data=f"input {task_id}",
+        output_data=f"output {task_id}",
+        priority=task_id,
+        tenant="tenant"
+    )
+
+
+async def test_tasks_are_restored_from_columns():
+    storage = InMemoryRepositoryTaskDataStorage()
+    task = make_task(3, TaskStatus.QUEUED)
+    task.input_checksum = "checksum"
+    await storage.put_tasks([make_task(0, TaskStatus.CREATED), task])
+
+    assert await storage.get_task(3) == task
+    assert set(await storage.get_tasks([0, 1, 3, 100])) == {0, 3}
+    assert await storage.get_last_task_id() == 3
+    with pytest.raises(NoSuchTaskException):
+        await storage.get_task(1)
+
+
+async def test_payload_of_finished_tasks_is_evicted_over_budget():
+    # every payload takes 15 bytes
+    storage = InMemoryRepositoryTaskDataStorage(RetentionConfig(max_payload_bytes=40))
+    await storage.put_tasks([make_task(task_id, TaskStatus.SUCCESS) for task_id in range(4)])
+    await storage.put_task(make_task(4, TaskStatus.RUNNING))
+
+    assert (await storage.get_task(0)).input_data == ""
+    assert (await storage.get_task(0)).status is TaskStatus.SUCCESS
+    assert (await storage.get_task(1)).input_data == ""
+    assert (await storage.get_task(2)).input_data == ""
+    assert (await storage.get_task(3)).output_data == "output 3"
+    # unfinished tasks keep payload whatever the budget is
+    assert (await storage.get_task(4)).input_data == "input 4"
+
+
+async def test_evicted_payload_is_spilled(tmp_path):
+    storage = InMemoryRepositoryTaskDataStorage(RetentionConfig(ttl=0., spill_folder=str(tmp_path)))
+    tasks = [make_task(task_id, TaskStatus.SUCCESS) for task_id in range(3)]
+    tasks[1].resource_usage = TaskResourceUsage(wall_time=2., cpu_user_time=0.5, max_rss=1024)
+    await storage.put_tasks(tasks)
+
+    assert len(list(tmp_path.glob("*/*.json"))) == 3
+    assert await storage.get_task(1) == tasks[1]
+    assert (await storage.get_tasks([0, 2]))[2] == make_task(2, TaskStatus.SUCCESS)
+
+
+async def test_oldest_finished_tasks_are_removed():
+    storage = InMemoryRepositoryTaskDataStorage(RetentionConfig(max_tasks=2))
+    await storage.put_tasks([
+        make_task(0, TaskStatus.RUNNING),
+        make_task(1, TaskStatus.SUCCESS),
+        make_task(2, TaskStatus.FAILURE),
+        make_task(3, TaskStatus.CREATED),
+    ])
+
+    assert set(await storage.get_tasks([0, 1, 2, 3])) == {0, 3}
+
+
+async def test_removed_tasks_are_dropped_from_index():
+    task_repository = build_task_repository(TaskRepositoryConfig(retention_config=RetentionConfig(max_tasks=1)))
+    for _ in range(4):
+        task = await task_repository.create_task("input")
+        await task_repository.set_task_status(task.task_id, TaskStatus.SUCCESS)
+
+    assert (await task_repository.count_tasks())[TaskStatus.SUCCESS] == 1
+    task_page = await task_repository.query_tasks(TaskStatus.SUCCESS, limit=10)
+    assert task_page.task_ids == [3]
+
+
+async def test_tasks_finished_after_creation_are_removed():
+    storage = InMemoryRepositoryTaskDataStorage(RetentionConfig(max_tasks=2))
+    await storage.put_tasks([make_task(task_id, TaskStatus.CREATED) for task_id in range(10)])
+    for task_id in (5, 0, 9, 3):
+        await storage.put_task(make_task(task_id, TaskStatus.SUCCESS))
+
+    assert len(await storage.get_task_statuses()) == 6
+    assert set(await storage.get_tasks([0, 3, 5, 9])) == set()
+
+    await storage.put_tasks([make_task(task_id, TaskStatus.FAILURE) for task_id in (1, 2, 4, 6, 7, 8)])
+    assert set(await storage.get_tasks(list(range(10)))) == {7, 8}
+
+
+async def test_spilled_payload_is_deleted_when_task_is_put_again(tmp_path):
+    storage = InMemoryRepositoryTaskDataStorage(RetentionConfig(ttl=0., spill_folder=str(tmp_path)))
+    await storage.put_task(make_task(0, TaskStatus.SUCCESS))
+    assert len(list(tmp_path.glob("*/*.json"))) == 1
+
+    await storage.put_task(make_task(0, TaskStatus.RUNNING))
+    assert list(tmp_path.glob("*/*.json")) == []
+    assert (await storage.get_task(0)).input_data == "input 0"
+
+
+async def test_uploads_of_dropped_tasks_are_deleted(tmp_path):
+    uploads = [tmp_path / f"upload-{task_id}" for task_id in range(3)]
+    tasks = []
+    for task_id, upload in enumerate(uploads):
+        upload.write_text("input")
+        tasks.append(make_task(task_id, TaskStatus.SUCCESS))
+        tasks[-1].input_path = str(upload)
+    spill_folder = tmp_path / "spill"
+    storage = InMemoryRepositoryTaskDataStorage(RetentionConfig(ttl=0., max_tasks=2, spill_folder=str(spill_folder)))
+    await storage.put_tasks(tasks[:2])
+    # payloads are spilled, so uploads are kept until tasks are removed
+    assert all(upload.exists() for upload in uploads)
+
+    await storage.put_task(tasks[2])
+    assert [upload.exists() for upload in uploads] == [False, True, True]
+    assert len(list(spill_folder.glob("*/*.json"))) == 2
+
+    storage = InMemoryRepositoryTaskDataStorage(RetentionConfig(ttl=0.))
+    await storage.put_task(tasks[1])
+    assert not uploads[1].exists()
+
+
+async def test_cancelled_task_keeps_its_input_for_rerun(tmp_path):
+    upload = tmp_path / "upload"
+    upload.write_text("uploaded input")
+    task_repository = build_task_repository(TaskRepositoryConfig(
+        retention_config=RetentionConfig(ttl=0., max_tasks=1)
+    ))
+    task_queue = build_task_queue(TaskQueueConfig())
+    cancelled_task = make_task(0, TaskStatus.CREATED)
+    cancelled_task.input_path = str(upload)
+    cancelled_task, other_task = await task_repository.create_tasks([cancelled_task, make_task(0, TaskStatus.CREATED)])
+    await task_repository.set_task_status(cancelled_task.task_id, TaskStatus.CANCELLED)
+    await task_repository.set_task_status(other_task.task_id, TaskStatus.SUCCESS)
+
+    await run_task(task_repository, task_queue, cancelled_task.task_id)
+    task = await task_repository.get_task(cancelled_task.task_id)
+    assert (task.status, task.input_data, task.input_path) == (TaskStatus.QUEUED, "input 0", str(upload))
+    assert upload.exists()
@@ -0,0 +1,89 @@
+import os
+
+from app.execution.cache import ResultCache
+from app.execution.cache import ResultCacheConfig
+from app.execution.storage import ExecutorTaskDataStorageConfig
+from app.execution.storage import build_executor_task_data_storage
+
+
+def build_cache(tmp_path, **options) -> ResultCache:
+    storage = build_executor_task_data_storage(ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path / "data")))
+    config = ResultCacheConfig(enabled=True, cache_folder=str(tmp_path / "cache"), **options)
+    return ResultCache(config, storage)
+
+
+def write_output(tmp_path, name: str, output_data: str):
+    path_to_file = tmp_path / name
+    path_to_file.write_text(output_data)
+    return path_to_file
+
+
+async def test_cached_output_is_restored(tmp_path):
+    cache = build_cache(tmp_path)
+    small_key = await cache.get_key("small")
+    large_key = await cache.get_key("large")
+    assert small_key != large_key
+    assert small_key == await cache.get_key("small")
+
+    assert await cache.restore(1, small_key) is None
+    await cache.put(small_key, write_output(tmp_path, "small", "out"))
+    await cache.put(large_key, write_output(tmp_path, "large", "large output"))
+
+    assert (await cache.restore(2, small_key)).read_text() == "out"
+    assert (await cache.restore(3, large_key)).read_text() == "large output"
+    assert (cache.stats.hits, cache.stats.misses) == (2, 1)
+    cache.close()
+
+    # cache survives a restart
+    cache = build_cache(tmp_path)
+    assert (await cache.restore(4, large_key)).read_text() == "large output"
+    cache.close()
+
+
+async def test_least_recently_used_output_is_evicted(tmp_path):
+    cache = build_cache(tmp_path, disk_max_bytes=10)
+    keys = [await cache.get_key(str(index)) for index in range(3)]
+    await cache.put(keys[0], write_output(tmp_path, "0", "aaaa"))
+    await cache.put(keys[1], write_output(tmp_path, "1", "bbbb"))
+    assert await cache.restore(1, keys[0]) is not None
+
+    await cache.put(keys[2], write_output(tmp_path, "2", "cccc"))
+    assert await cache.restore(2, keys[1]) is None
+    assert await cache.restore(3, keys[0]) is not None
+    assert cache.stats.evictions == 1
+    cache.close()
+
+
+async def test_cache_is_evicted_to_its_limit_on_start(tmp_path):
+    cache = build_cache(tmp_path)
+    keys = [await cache.get_key(str(index)) for index in range(3)]
+    for index, key in enumerate(keys):
+        await cache.put(key, write_output(tmp_path, str(index), "aaaa"))
+        os.utime(str(cache._get_path(key)), (index, index))
+    cache.close()
+
+    cache = build_cache(tmp_path, disk_max_bytes=8)
+    assert cache.stats.evictions == 1
+    assert not cache._get_path(keys[0]).exists()
+    assert await cache.restore(1, keys[0]) is None
+    assert await cache.restore(2, keys[1]) is not None
+    assert await cache.restore(3, keys[2]) is not None
+    cache.close()
+
+
+async def test_expired_output_is_not_restored(tmp_path):
+    cache = build_cache(tmp_path, ttl=0.)
+    key = await cache.get_key("input")
+    await cache.put(key, write_output(tmp_path, "output", "output"))
+    assert await cache.restore(1, key) is None
+    cache.close()
+
+
+async def test_expired_output_is_evicted_after_close(tmp_path):
+    cache = build_cache(tmp_path, ttl=0.)
+    key = await cache.get_key("input")
+    await cache.put(key, write_output(tmp_path, "output", "output"))
+    cache.close()
+
+    assert await cache.restore(1, key) is None
+    assert not cache._get_path(key).exists()
@@ -0,0 +1,129 @@
+import asyncio
+
+import pytest
+
+from app.api.controller import hash_task_input
+from app.api.controller import run_task
+from app.api.controller import run_tasks
+from app.api.model import TaskIdBatch
+from app.data import TaskRepositoryConfig
+from app.data import build_task_repository
+from app.domain.model import TaskStatus
+from app.execution.coalescing import build_task_coalescer
+from app.execution.queue import TaskQueueConfig
+from app.execution.queue import build_task_queue
+from app.execution.storage import ExecutorTaskDataStorageConfig
+from app.execution.storage import build_async_executor_task_data_storage
+
+
+@pytest.fixture
+async def components(tmp_path):
+    task_repository = build_task_repository(TaskRepositoryConfig())
+    task_queue = build_task_queue(TaskQueueConfig())
+    executor_task_data_storage = build_async_executor_task_data_storage(
+        ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path))
+    )
+    task_coalescer = build_task_coalescer(task_repository, task_queue, executor_task_data_storage)
+
+    yield task_repository, task_queue, task_coalescer
+
+    executor_task_data_storage.close()
+
+
+async def create_tasks(task_repository, task_coalescer, count: int):
+    tasks = []
+    for _ in range(count):
+        task = await task_repository.create_task("same input")
+        task.input_hash = await task_coalescer.get_key(task.input_data)
+        tasks.append(task)
+    return tasks
+
+
+async def wait_for_status(task_repository, task_id: int, status: TaskStatus):
+    for _ in range(100):
+        if await task_repository.get_task_status(task_id) is status:
+            return
+        await asyncio.sleep(0.01)
+    raise AssertionError(f"Task id=`{task_id}` has not reached status {status}.")
+
+
+async def test_output_of_leader_is_shared_with_followers(components, tmp_path):
+    task_repository, task_queue, task_coalescer = components
+    leader, first_follower, second_follower = await create_tasks(task_repository, task_coalescer, 3)
+
+    assert task_coalescer.attach(leader) is None
+    assert task_coalescer.attach(first_follower) is TaskStatus.QUEUED
+    assert task_coalescer.attach(second_follower) is TaskStatus.QUEUED
+    assert task_coalescer.detach(second_follower.task_id)
+    assert not task_coalescer.detach(leader.task_id)
+
+    await task_repository.set_task_status(leader.task_id, TaskStatus.RUNNING)
+    await wait_for_status(task_repository, first_follower.task_id, TaskStatus.RUNNING)
+
+    output_path = tmp_path / "output.txt"
+    output_path.write_text("output")
+    await task_repository.add_task_output_path(leader.task_id, str(output_path))
+    await task_repository.set_task_status(leader.task_id, TaskStatus.SUCCESS)
+    await wait_for_status(task_repository, first_follower.task_id, TaskStatus.SUCCESS)
+    assert await task_repository.get_task_output_data(first_follower.task_id) == "output"
+    assert await task_repository.get_task_status(second_follower.task_id) is TaskStatus.CREATED
+
+
+async def test_follower_of_running_leader_is_running(components):
+    task_repository, task_queue, task_coalescer = components
+    leader = await task_repository.create_task("same input")
+    follower = await task_repository.create_task("same input")
+
+    await run_task(task_repository, task_queue, leader.task_id, task_coalescer=task_coalescer)
+    await task_repository.set_task_status(leader.task_id, TaskStatus.RUNNING)
+    await run_task(task_repository, task_queue, follower.task_id, task_coalescer=task_coalescer)
+    assert await task_repository.get_task_status(follower.task_id) is TaskStatus.RUNNING
+    assert await task_queue.size() == 1
+
+
+async def test_failure_of_leader_fails_followers(components):
+    task_repository, task_queue, task_coalescer = components
+    leader, follower = await create_tasks(task_repository, task_coalescer, 2)
+    task_coalescer.attach(leader)
+    task_coalescer.attach(follower)
+
+    await task_repository.set_task_status(leader.task_id, TaskStatus.FAILURE)
+    await wait_for_status(task_repository, follower.task_id, TaskStatus.FAILURE)
+
+
+async def test_cancelled_leader_is_replaced_by_follower(components):
+    task_repository, task_queue, task_coalescer = components
+    leader, first_follower, second_follower = await create_tasks(task_repository, task_coalescer, 3)
+    for task in (leader, first_follower, second_follower):
+        task_coalescer.attach(task)
+
+    await task_repository.set_task_status(leader.task_id, TaskStatus.CANCELLED)
+    await wait_for_status(task_repository, second_follower.task_id, TaskStatus.QUEUED)
+
+    assert await asyncio.wait_for(task_queue.get(), 1) == first_follower.task_id
+    assert task_coalescer.detach(second_follower.task_id)
+
+
+async def test_input_hashes_of_batch_are_stored_at_once(components, monkeypatch):
+    task_repository, task_queue, task_coalescer = components
+    leader = await task_repository.create_task("same input")
+    follower = await task_repository.create_task("same input")
+
+    writes = []
+    set_tasks_input_hash = task_repository.set_tasks_input_hash
+
+    async def record_write(input_hashes):
+        writes.append(input_hashes)
+        await set_tasks_input_hash(input_hashes)
+
+    monkeypatch.setattr(task_repository, "set_tasks_input_hash", record_write)
+    monkeypatch.setattr(task_repository, "set_task_input_hash", None)
+    task_id_batch = TaskIdBatch(task_ids=[leader.task_id, follower.task_id])
+    await run_tasks(task_repository, task_queue, task_id_batch, task_coalescer=task_coalescer)
+    assert len(writes) == 1 and sorted(writes[0]) == [leader.task_id, follower.task_id]
+    assert await task_repository.get_task_status(follower.task_id) is TaskStatus.QUEUED
+
+    # stored hash isn't written again when the task is run once more
+    task = await task_repository.get_task(leader.task_id)
+    assert task.input_hash is not None
+    assert not await hash_task_input(None, task_coalescer, task)
@@ -0,0 +1,38 @@
+import asyncio
+
+from app.domain.model import Task
+from app.domain.model import TaskStatus
+from app.execution.deadlines import TaskDeadlines
+from app.execution.deadlines import get_task_timeout
+from app.execution.executor import ExecutionConfig
+from app.execution.storage import ExecutorTaskDataStorageConfig
+
+
+async def test_expired_tasks_are_returned_in_order_of_deadlines():
+    task_deadlines = TaskDeadlines()
+    task_deadlines.add(1, 0.2)
+    task_deadlines.add(2, 0.05)
+    task_deadlines.add(3, 0.1)
+    task_deadlines.remove(3)
+
+    assert await asyncio.wait_for(task_deadlines.get_expired(), 1.) == [2]
+    assert await asyncio.wait_for(task_deadlines.get_expired(), 1.) == [1]
+
+
+async def test_waiting_is_woken_up_by_earlier_deadline():
+    task_deadlines = TaskDeadlines()
+    task_deadlines.add(1, 60.)
+    get_expired = asyncio.ensure_future(task_deadlines.get_expired())
+    await asyncio.sleep(0.01)
+    task_deadlines.add(2, 0.05)
+
+    assert await asyncio.wait_for(get_expired, 1.) == [2]
+
+
+def test_task_timeout_overrides_default():
+    execution_config = ExecutionConfig(ExecutorTaskDataStorageConfig(), default_timeout=10.)
+    task = Task(task_id=1, status=TaskStatus.QUEUED, input_data="")
+    assert get_task_timeout(execution_config, task) == 10.
+
+    task.timeout = 0.5
+    assert get_task_timeout(execution_config, task) == 0.5
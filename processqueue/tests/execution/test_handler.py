@@ -0,0 +1,86 @@
+import asyncio
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import List
+
+import pytest
+
+from app.data import TaskRepositoryConfig
+from app.data import build_task_repository
+from app.domain.model import TaskStatus
+from app.execution.executor import ExecutionConfig
+from app.execution.executor import execute_task
+from app.execution.handler import create_shared_memory_input_in_executor
+from app.execution.handler import handle_task
+from app.execution.handler import store_output
+from app.execution.storage import ExecutorTaskDataStorageConfig
+from app.execution.storage import build_async_executor_task_data_storage
+from app.execution.transport import SharedMemoryInput
+from app.execution.transport import create_shared_memory_input
+
+
+async def test_task_with_missing_output_is_failed(tmp_path):
+    task_repository = build_task_repository(TaskRepositoryConfig())
+    executor_task_data_storage = build_async_executor_task_data_storage(
+        ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path))
+    )
+    try:
+        missing_output_task = await task_repository.create_task("input")
+        await store_output(task_repository, executor_task_data_storage, None, missing_output_task)
+        assert await task_repository.get_task_status(missing_output_task.task_id) is TaskStatus.FAILURE
+
+        task = await task_repository.create_task("input")
+        await executor_task_data_storage.set_output_data(task.task_id, "output")
+        await store_output(task_repository, executor_task_data_storage, None, task)
+        assert await task_repository.get_task_status(task.task_id) is TaskStatus.SUCCESS
+        assert await task_repository.get_task_output_data(task.task_id) == "output"
+    finally:
+        executor_task_data_storage.close()
+
+
+async def test_input_created_after_cancellation_is_released():
+    shared_memory_inputs: List[SharedMemoryInput] = []
+
+    def create_slowly(task_id: int, input_data: str) -> SharedMemoryInput:
+        time.sleep(0.1)
+        shared_memory_inputs.append(create_shared_memory_input(task_id, input_data))
+        return shared_memory_inputs[-1]
+
+    creation = asyncio.ensure_future(create_shared_memory_input_in_executor(create_slowly, 1, "input"))
+    await asyncio.sleep(0.01)
+    creation.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await creation
+
+    await asyncio.sleep(0.3)
+    assert len(shared_memory_inputs) == 1
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=shared_memory_inputs[0].name)
+
+
+async def test_task_cancelled_while_its_input_is_passed_is_not_run(tmp_path):
+    task_repository = build_task_repository(TaskRepositoryConfig())
+    storage_config = ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path))
+    executor_task_data_storage = build_async_executor_task_data_storage(storage_config)
+    task = await task_repository.create_task("input")
+    await task_repository.set_task_status(task.task_id, TaskStatus.QUEUED)
+    set_input_data = executor_task_data_storage.set_input_data
+
+    async def set_input_data_and_cancel(task_id: int, input_data: str):
+        await set_input_data(task_id, input_data)
+        await task_repository.set_task_status(task_id, TaskStatus.CANCELLED)
+
+    executor_task_data_storage.set_input_data = set_input_data_and_cancel
+    try:
+        # there is no worker pool, the task must not reach it
+        await handle_task(
+            task_repository,
+            executor_task_data_storage,
+            None,
+            ExecutionConfig(storage_config),
+            execute_task,
+            task.task_id
+        )
+        assert await task_repository.get_task_status(task.task_id) is TaskStatus.CANCELLED
+    finally:
+        executor_task_data_storage.close()
@@ -0,0 +1,95 @@
+import asyncio
+
+import pytest
+
+from app.data import TaskRepositoryConfig
+from app.data import build_task_repository
+from app.domain.model import TaskStatus
+from app.exceptions import TaskLeaseExpiredException
+from app.execution.lease import TaskLeaseConfig
+from app.execution.lease import build_task_lease_manager
+from app.execution.queue import TaskQueueConfig
+from app.execution.queue import build_task_queue
+from app.execution.storage import ExecutorTaskDataStorageConfig
+
+
+@pytest.fixture
+async def components(tmp_path):
+    task_repository = build_task_repository(TaskRepositoryConfig())
+    task_queue = build_task_queue(TaskQueueConfig())
+    task_lease_manager = build_task_lease_manager(
+        task_repository,
+        task_queue,
+        ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path)),
+        TaskLeaseConfig(default_visibility_timeout=0.2)
+    )
+    expire_task = asyncio.get_running_loop().create_task(task_lease_manager.expire_leases())
+
+    yield task_repository, task_queue, task_lease_manager
+
+    expire_task.cancel()
+    await asyncio.wait({expire_task})
+    task_lease_manager.close()
+
+
+async def queue_tasks(task_repository, task_queue, count: int):
+    tasks = []
+    for index in range(count):
+        task = await task_repository.create_task(f"input {index}")
+        await task_queue.put(task.task_id)
+        await task_repository.set_task_status(task.task_id, TaskStatus.QUEUED)
+        tasks.append(task)
+    return tasks
+
+
+async def test_lease_and_complete(components):
+    task_repository, task_queue, task_lease_manager = components
+    first_task, second_task, third_task = await queue_tasks(task_repository, task_queue, 3)
+
+    leases = await task_lease_manager.lease("worker", 2)
+    assert [lease.task.task_id for lease in leases] == [first_task.task_id, second_task.task_id]
+    assert leases[0].task.input_data == "input 0"
+    assert await task_repository.get_task_status(first_task.task_id) is TaskStatus.RUNNING
+    assert await task_queue.get_position(third_task.task_id) == 0
+
+    await task_lease_manager.complete(leases[0].lease_id, "output")
+    assert await task_repository.get_task_status(first_task.task_id) is TaskStatus.SUCCESS
+    assert await task_repository.get_task_output_data(first_task.task_id) == "output"
+
+    await task_lease_manager.fail(leases[1].lease_id, "error")
+    assert await task_repository.get_task_status(second_task.task_id) is TaskStatus.FAILURE
+
+    with pytest.raises(TaskLeaseExpiredException):
+        await task_lease_manager.complete(leases[0].lease_id, "output")
+
+
+async def test_expired_lease_is_queued_again(components):
+    task_repository, task_queue, task_lease_manager = components
+    first_task, second_task = await queue_tasks(task_repository, task_queue, 2)
+
+    first_lease, second_lease = await task_lease_manager.lease("worker", 2)
+    for _ in range(3):
+        await asyncio.sleep(0.1)
+        task_lease_manager.heartbeat(first_lease.lease_id)
+    assert await task_repository.get_task_status(first_task.task_id) is TaskStatus.RUNNING
+    assert await task_repository.get_task_status(second_task.task_id) is TaskStatus.QUEUED
+    assert await task_queue.get_position(second_task.task_id) == 0
+
+    with pytest.raises(TaskLeaseExpiredException):
+        task_lease_manager.heartbeat(second_lease.lease_id)
+    assert [lease.task.task_id for lease in await task_lease_manager.lease("other", 1)] == [second_task.task_id]
+
+
+async def test_lease_waits_for_queued_task(components):
+    task_repository, task_queue, task_lease_manager = components
+
+    assert await task_lease_manager.lease("worker", 1, wait=0.05) == []
+
+    lease_task = asyncio.get_running_loop().create_task(task_lease_manager.lease("worker", 1, wait=1.))
+    await asyncio.sleep(0.05)
+    task, = await queue_tasks(task_repository, task_queue, 1)
+    leases = await lease_task
+    assert [lease.task.task_id for lease in leases] == [task.task_id]
+
+    assert task_lease_manager.revoke(task.task_id)
+    assert not task_lease_manager.revoke(task.task_id)
@@ -0,0 +1,122 @@
+import asyncio
+import os
+import threading
+import time
+
+import pytest
+
+from app.exceptions import TaskExecutionException
+from app.exceptions import WorkerExitedException
+from app.execution.pool import WorkerPool
+from app.execution.pool import WorkerPoolConfig
+
+
+def get_pid() -> int:
+    return os.getpid()
+
+
+def sleep(seconds: float) -> None:
+    time.sleep(seconds)
+
+
+def fail() -> None:
+    raise RuntimeError("failed")
+
+
+LOCK = threading.Lock()
+
+
+def acquire_lock() -> bool:
+    return LOCK.acquire(timeout=1.)
+
+
+@pytest.fixture
+async def worker_pool() -> WorkerPool:
+    worker_pool = WorkerPool(WorkerPoolConfig(max_workers=2, max_tasks_per_worker=3))
+    yield worker_pool
+    worker_pool.shutdown(wait=False)
+
+
+async def test_submit_returns_result(worker_pool):
+    pid = await worker_pool.submit(0, get_pid)
+    assert pid != os.getpid()
+
+
+async def test_failed_task_raises(worker_pool):
+    with pytest.raises(TaskExecutionException):
+        await worker_pool.submit(0, fail)
+
+
+async def test_resource_usage_is_reported(worker_pool):
+    resource_usages = []
+    await worker_pool.submit(0, sleep, 0.1, resource_usage_listener=resource_usages.append)
+    with pytest.raises(TaskExecutionException):
+        await worker_pool.submit(1, fail, resource_usage_listener=resource_usages.append)
+
+    assert len(resource_usages) == 2
+    assert resource_usages[0].wall_time >= 0.1
+    assert resource_usages[0].cpu_user_time < 0.1
+    assert resource_usages[0].max_rss > 0
+
+
+async def test_worker_is_recycled():
+    worker_pool = WorkerPool(WorkerPoolConfig(max_workers=1, max_tasks_per_worker=3))
+    try:
+        pids = [await worker_pool.submit(task_id, get_pid) for task_id in range(4)]
+    finally:
+        worker_pool.shutdown(wait=False)
+
+    assert pids[0] == pids[1] == pids[2]
+    assert pids[3] != pids[0]
+
+
+async def test_killed_worker_is_replaced(worker_pool):
+    running_task = asyncio.ensure_future(worker_pool.submit(0, sleep, 60.))
+    while not worker_pool.is_task_running(0):
+        await asyncio.sleep(0.01)
+
+    assert await worker_pool.kill(0)
+    with pytest.raises(WorkerExitedException):
+        await running_task
+
+    results = await asyncio.gather(*(worker_pool.submit(task_id, get_pid) for task_id in range(1, 5)))
+    assert len(results) == 4
+
+
+async def test_shutdown_kills_hung_worker():
+    worker_pool = WorkerPool(WorkerPoolConfig(max_workers=1, termination_grace_period=0.2))
+    running_task = asyncio.ensure_future(worker_pool.submit(0, sleep, 60.))
+    while not worker_pool.is_task_running(0):
+        await asyncio.sleep(0.01)
+
+    started_at = time.monotonic()
+    worker_pool.shutdown(wait=True)
+    assert time.monotonic() - started_at < 5.
+    running_task.cancel()
+    await asyncio.gather(running_task, return_exceptions=True)
+
+
+async def test_task_sent_to_dead_worker_fails():
+    worker_pool = WorkerPool(WorkerPoolConfig(max_workers=1))
+    try:
+        # worker dies before the event loop notices it
+        process = worker_pool._idle_workers[0].process
+        process.kill()
+        process.join()
+        with pytest.raises(WorkerExitedException):
+            await worker_pool.submit(0, get_pid)
+        assert not worker_pool.is_task_running(0)
+
+        assert await worker_pool.submit(1, get_pid) != process.pid
+    finally:
+        worker_pool.shutdown(wait=False)
+
+
+async def test_worker_does_not_inherit_locks_of_pool_process():
+    # another thread of the pool process holds the lock while a worker is started
+    with LOCK:
+        worker_pool = WorkerPool(WorkerPoolConfig(max_workers=1))
+        try:
+            assert await worker_pool.submit(0, acquire_lock)
+        finally:
+            worker_pool.shutdown(wait=False)
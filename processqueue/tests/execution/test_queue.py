@@ -0,0 +1,71 @@
+from typing import List
+
+from app.domain.queue import TaskQueueItem
+from app.execution.queue import TaskQueueConfig
+from app.execution.queue import build_task_queue
+
+
+async def get_all(task_queue, count: int) -> List[int]:
+    return [await task_queue.get() for _ in range(count)]
+
+
+async def test_tasks_are_dequeued_in_fifo_order():
+    task_queue = build_task_queue(TaskQueueConfig())
+    await task_queue.put_many([TaskQueueItem(task_id) for task_id in range(5)])
+
+    assert await get_all(task_queue, 5) == [0, 1, 2, 3, 4]
+    assert await task_queue.is_empty()
+
+
+async def test_higher_priority_is_dequeued_first():
+    task_queue = build_task_queue(TaskQueueConfig())
+    await task_queue.put(0)
+    await task_queue.put(1, priority=10)
+    await task_queue.put(2, priority=5)
+
+    assert await get_all(task_queue, 3) == [1, 2, 0]
+
+
+async def test_tenants_share_queue_fairly():
+    task_queue = build_task_queue(TaskQueueConfig())
+    await task_queue.put_many([TaskQueueItem(task_id, tenant="bulk") for task_id in range(100)])
+    await task_queue.put(100, tenant="interactive")
+
+    assert 100 in await get_all(task_queue, 2)
+
+
+async def test_tenant_weights_are_respected():
+    task_queue = build_task_queue(TaskQueueConfig(tenant_weights={"heavy": 3.0}))
+    await task_queue.put_many([TaskQueueItem(task_id, tenant="heavy") for task_id in range(100)])
+    await task_queue.put_many([TaskQueueItem(task_id, tenant="light") for task_id in range(100, 200)])
+
+    first_task_ids = await get_all(task_queue, 40)
+    heavy_tasks = sum(1 for task_id in first_task_ids if task_id < 100)
+    assert heavy_tasks == 30
+
+
+async def test_cancelled_task_is_removed():
+    task_queue = build_task_queue(TaskQueueConfig())
+    await task_queue.put_many([TaskQueueItem(task_id) for task_id in range(3)])
+    await task_queue.cancel(1)
+
+    assert await task_queue.get_position(1) is None
+    assert await get_all(task_queue, 2) == [0, 2]
+    assert await task_queue.is_empty()
+
+
+async def test_position_follows_dequeue_order():
+    task_queue = build_task_queue(TaskQueueConfig())
+    await task_queue.put_many([TaskQueueItem(task_id, tenant="bulk") for task_id in range(3000)])
+    await task_queue.put(3000, tenant="interactive")
+    await task_queue.put(3001, priority=1)
+    for task_id in range(0, 3000, 2):
+        await task_queue.cancel(task_id)
+
+    positions = {
+        task_id: await task_queue.get_position(task_id)
+        for task_id in list(range(1, 3000, 2)) + [3000, 3001]
+    }
+    dequeued_task_ids = await get_all(task_queue, len(positions))
+    assert [positions[task_id] for task_id in dequeued_task_ids] == list(range(len(positions)))
+    assert await task_queue.is_empty()
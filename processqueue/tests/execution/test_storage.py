@@ -0,0 +1,84 @@
+import asyncio
+import hashlib
+import os
+from pathlib import Path
+
+import pytest
+
+from app.exceptions import InputDataTooLargeException
+from app.execution.storage import ExecutorTaskDataStorageConfig
+from app.execution.storage import build_async_executor_task_data_storage
+from app.execution.storage import build_executor_task_data_storage
+
+
+def test_data_is_sharded_and_written_atomically(tmp_path):
+    config = ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path))
+    storage = build_executor_task_data_storage(config)
+
+    for task_id in range(1, 101):
+        storage.set_input_data(task_id, f"input {task_id}")
+        storage.set_output_data(task_id, f"output {task_id}")
+
+    shards = list(tmp_path.iterdir())
+    assert 1 < len(shards) <= 256
+    assert all(len(shard.name) == 2 for shard in shards)
+    assert not list(tmp_path.glob("**/*.tmp"))
+
+    assert storage.get_input_data(42) == "input 42"
+    output_path = storage.get_output_path(42)
+    assert output_path.parent.parent.parent == tmp_path
+    assert output_path.read_text() == "output 42"
+
+
+def test_same_data_is_written_concurrently(tmp_path, monkeypatch):
+    storage = build_executor_task_data_storage(ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path)))
+    replace = os.replace
+
+    def replace_after_another_write(source, destination):
+        # another thread writes the same output right before this write is completed
+        monkeypatch.setattr(os, "replace", replace)
+        storage.set_output_data(1, "another output")
+        replace(source, destination)
+
+    monkeypatch.setattr(os, "replace", replace_after_another_write)
+    storage.set_output_data(1, "output")
+
+    assert storage.get_output_data(1) == "output"
+    assert not list(tmp_path.glob("**/*.tmp"))
+
+
+async def test_async_storage_runs_in_thread_pool(tmp_path):
+    config = ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path), io_threads=2)
+    storage = build_async_executor_task_data_storage(config)
+
+    await asyncio.gather(*(
+        storage.set_input_data(task_id, "x" * 1_000_000)
+        for task_id in range(1, 11)
+    ))
+    await storage.delete_output_data(1)
+    storage.close()
+
+    assert build_executor_task_data_storage(config).get_input_data(10) == "x" * 1_000_000
+
+
+async def test_input_data_is_uploaded_in_chunks(tmp_path):
+    config = ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path))
+    storage = build_async_executor_task_data_storage(config)
+
+    async def chunks(count: int):
+        for _ in range(count):
+            yield b"x" * 1024
+
+    uploaded_input = await storage.upload_input_data(chunks(10), max_size=10 * 1024)
+    assert uploaded_input.size == 10 * 1024
+    assert uploaded_input.checksum == hashlib.sha256(b"x" * 10 * 1024).hexdigest()
+
+    input_path = await storage.link_input_data(1, Path(uploaded_input.path))
+    assert input_path.read_bytes() == b"x" * 10 * 1024
+
+    with pytest.raises(InputDataTooLargeException):
+        await storage.upload_input_data(chunks(11), max_size=10 * 1024)
+    storage.close()
+
+    # partially uploaded data is removed
+    assert [path.name for path in (tmp_path / "uploads").iterdir()] == [Path(uploaded_input.path).name]
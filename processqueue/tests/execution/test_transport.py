@@ -0,0 +1,52 @@
+import pytest
+from multiprocessing.shared_memory import SharedMemory
+
+from app.execution.pool import WorkerPool
+from app.execution.pool import WorkerPoolConfig
+from app.execution.transport import SharedMemoryInput
+from app.execution.transport import attach_shared_memory_input
+from app.execution.transport import create_shared_memory_input
+from app.execution.transport import create_shared_memory_input_from_file
+from app.execution.transport import release_shared_memory_input
+from app.execution.transport import start_shared_memory_tracker
+
+
+def read_shared_memory_input(shared_memory_input: SharedMemoryInput) -> bytes:
+    segment = attach_shared_memory_input(shared_memory_input)
+    try:
+        return bytes(segment.buf[:shared_memory_input.size])
+    finally:
+        segment.close()
+
+
+async def test_worker_reads_input_from_shared_memory():
+    start_shared_memory_tracker()
+    worker_pool = WorkerPool(WorkerPoolConfig(max_workers=1, max_tasks_per_worker=1))
+    input_data = "входные данные " * 1000
+    shared_memory_input = create_shared_memory_input(1, input_data)
+    try:
+        result = await worker_pool.submit(1, read_shared_memory_input, shared_memory_input)
+        assert result.decode() == input_data
+    finally:
+        release_shared_memory_input(shared_memory_input)
+        worker_pool.shutdown(wait=True)
+
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=shared_memory_input.name)
+
+
+def test_empty_input():
+    shared_memory_input = create_shared_memory_input(1, "")
+    assert read_shared_memory_input(shared_memory_input) == b""
+    release_shared_memory_input(shared_memory_input)
+    release_shared_memory_input(shared_memory_input)
+
+
+def test_input_is_read_from_file(tmp_path):
+    path_to_file = tmp_path / "input"
+    path_to_file.write_bytes(bytes(range(256)) * 100)
+    shared_memory_input = create_shared_memory_input_from_file(1, str(path_to_file))
+    try:
+        assert read_shared_memory_input(shared_memory_input) == bytes(range(256)) * 100
+    finally:
+        release_shared_memory_input(shared_memory_input)
@@ -0,0 +1,57 @@
+import asyncio
+
+from app import startup_app
+from app.execution.executor import ExecutionConfig
+from app.execution.executor import WorkloadConfig
+from app.execution.storage import ExecutorTaskDataStorageConfig
+from app.worker import RemoteWorker
+from app.worker import RemoteWorkerConfig
+
+
+async def test_tasks_are_executed_by_remote_workers(aiohttp_client, monkeypatch, tmp_path):
+    monkeypatch.setenv("REMOTE_WORKERS", "enabled")
+    # nothing is executed by the server itself
+    monkeypatch.setenv("MAX_RUNNING_TASKS", "0")
+    monkeypatch.setenv("TASK_DATA_FOLDER", str(tmp_path / "server"))
+    client = await aiohttp_client(await startup_app())
+
+    task_ids = []
+    for index in range(4):
+        resp = await client.post("/tasks/create", json={"input_data": f"input {index}"})
+        task_id = (await resp.json())["task_id"]
+        resp = await client.post("/tasks/run", json={"task_id": task_id})
+        assert resp.status == 200
+        task_ids.append(task_id)
+
+    remote_workers = [
+        RemoteWorker(RemoteWorkerConfig(
+            server_url=str(client.make_url("")),
+            execution_config=ExecutionConfig(
+                ExecutorTaskDataStorageConfig(root_data_folder=str(tmp_path / f"worker-{index}")),
+                workload=WorkloadConfig(sleep=0.1),
+            ),
+            worker_id=f"worker-{index}",
+            concurrency=2,
+            poll_timeout=0.5,
+        ))
+        for index in range(2)
+    ]
+    loop = asyncio.get_running_loop()
+    run_tasks = [loop.create_task(remote_worker.run()) for remote_worker in remote_workers]
+    try:
+        for task_id in task_ids:
+            resp = await client.get(f"/tasks/{task_id}/wait", params={"timeout": "10"})
+            assert (await resp.json())["status"] == "SUCCESS"
+    finally:
+        for run_task in run_tasks:
+            run_task.cancel()
+        await asyncio.wait(run_tasks)
+        for remote_worker in remote_workers:
+            remote_worker.stop()
+
+    for index, task_id in enumerate(task_ids):
+        resp = await client.get(f"/tasks/{task_id}/output")
+        assert (await resp.json())["output_data"] == f"input {index} - successfully executed"
+        resp = await client.get(f"/tasks/{task_id}/stats")
+        assert (await resp.json())["wall_time"] > 0.
+